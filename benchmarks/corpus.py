@@ -0,0 +1,164 @@
+""" Inputs of the microbenchmarks, shaped like what scans run into: real
+style.css headers from the test fixtures plus variants of them, and index
+pages of a given size built out of typical WordPress markup.
+
+Everything is derived from a seed, hence the corpus is the same on every
+run and comparable between commits.
+
+`pathological_corpus` holds the inputs hostile pages could throw at the
+scanners instead, each built to make a backtracking regex blow up.
+"""
+import os
+import random
+from typing import Dict, List
+
+FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "tests",
+    "fixtures",
+    "crawlers",
+    "theme",
+)
+HTML_SIZES = {
+    "10kb": 10 * 1024,
+    "100kb": 100 * 1024,
+    "1mb": 1024 ** 2,
+    "5mb": 5 * 1024 ** 2,
+}
+SITE = "https://www.example-blog.com"
+THIRD_PARTIES = (
+    "https://fonts.googleapis.com/css?family=Open+Sans:400,700",
+    "https://www.googletagmanager.com/gtag/js?id=UA-1234567-1",
+    "https://connect.facebook.net/en_US/sdk.js#xfbml=1&version=v3.2",
+    "https://cdn.jsdelivr.net/npm/slick-carousel@1.8.1/slick/slick.min.js",
+)
+
+
+def read_fixture(*path: str) -> str:
+    with open(os.path.join(FIXTURES, *path), encoding="utf8") as fd:
+        return fd.read()
+
+
+def css_corpus() -> Dict[str, str]:
+    """ style.css bodies, cut at 8 KB as the crawler does """
+    sozpic = read_fixture("css", "sites", "sozpic.com.css")
+    normal = read_fixture("css", "normal.css")
+    return {
+        "normal": normal,
+        "child": read_fixture("css", "child_theme.css"),
+        "crlf": normal.replace("\n", "\r\n"),
+        # Real world header followed by rules, up to the size fetched
+        "site": sozpic[:8192],
+        # Header fields missing, every pattern scanning the whole file
+        "sparse": ("/*\nTheme Name: Sparse\n*/\n" + sozpic)[:8192],
+    }
+
+
+def _block(rnd: random.Random, theme: str) -> str:
+    kind = rnd.random()
+    if kind < 0.5:
+        words = " ".join(
+            rnd.choice(("lorem", "ipsum", "dolor", "sit", "amet", "wordpress", "theme"))
+            for _ in range(60)
+        )
+        return (
+            f'<article class="post-{rnd.randint(1, 9999)} post type-post status-publish">'
+            f'<h2 class="entry-title"><a href="{SITE}/{rnd.randint(2000, 2020)}/'
+            f'post-{rnd.randint(1, 9999)}/" rel="bookmark">Post</a></h2>'
+            f'<div class="entry-content"><p>{words}</p>'
+            f'<img src="{SITE}/wp-content/uploads/2019/0{rnd.randint(1, 9)}/'
+            f'image-{rnd.randint(1, 999)}-300x200.jpg" alt="" /></div></article>\n'
+        )
+    if kind < 0.7:
+        return (
+            '<script type="text/javascript">\n/* <![CDATA[ */\nvar wpData = '
+            f'{{"ajaxurl":"{SITE}\\/wp-admin\\/admin-ajax.php",'
+            f'"themeUrl":"{SITE}\\/wp-content\\/themes\\/{theme}",'
+            f'"nonce":"{rnd.getrandbits(40):x}"}};\n/* ]]> */\n</script>\n'
+        )
+    if kind < 0.85:
+        return f'<link rel="stylesheet" href="{rnd.choice(THIRD_PARTIES)}" />\n'
+    if kind < 0.95:
+        return (
+            f"<!-- generated in {rnd.random():.3f} seconds, "
+            f"{rnd.randint(10, 99)} queries -->\n"
+        )
+    return (
+        f'<script src="{SITE}/wp-content/themes/{theme}/js/scripts.js'
+        f'?ver={rnd.randint(1, 9)}.0"></script>\n'
+    )
+
+
+def html_page(size: int, seed: int = 0, theme: str = "twentynineteen") -> str:
+    """ Index page of about `size` characters """
+    rnd = random.Random(f"{seed}:{size}")
+    head = (
+        '<!DOCTYPE html>\n<html lang="en-US"><head>\n'
+        '<meta name="generator" content="WordPress 5.4.2" />\n'
+        f'<link rel="https://api.w.org/" href="{SITE}/wp-json/" />\n'
+        f"<link rel='stylesheet' id='{theme}-style-css' href='{SITE}/wp-content/"
+        f"themes/{theme}/style.css?ver=1.5' type='text/css' media='all' />\n"
+        f"<link rel='stylesheet' href='{SITE}/wp-content/themes/{theme}-child/"
+        "style.css?ver=1.0' type='text/css' media='all' />\n"
+        f"<script src='{SITE}/wp-includes/js/jquery/jquery.js?ver=1.12.4'></script>\n"
+        '</head><body class="home blog">\n'
+    )
+    tail = "</body></html>\n"
+    parts: List[str] = [head]
+    length = len(head) + len(tail)
+    while length < size:
+        block = _block(rnd, theme)
+        parts.append(block)
+        length += len(block)
+    parts.append(tail)
+    return "".join(parts)
+
+
+def html_corpus(seed: int = 0) -> Dict[str, str]:
+    return {name: html_page(size, seed) for name, size in HTML_SIZES.items()}
+
+
+def theme_urls(count: int = 200, seed: int = 0) -> List[str]:
+    """ Asset urls as found in index pages, a few themes referenced many
+    times over """
+    rnd = random.Random(seed)
+    themes = [f"theme-{index}" for index in range(5)]
+    return [
+        f"{SITE}/wp-content/themes/{rnd.choice(themes)}/assets/"
+        f"{rnd.choice(('css/main.css', 'js/app.min.js', 'fonts/icons.woff2'))}"
+        f"?ver={rnd.randint(1, 20)}"
+        for _ in range(count)
+    ]
+
+
+def url_corpus() -> Dict[str, str]:
+    return {
+        "domain": f"{SITE}/",
+        "long_path": f"{SITE}/{'/'.join('segment' for _ in range(50))}?query=1#top",
+        "ipv4": "http://93.184.216.34/blog/",
+        "ipv6": "http://[2606:2800:220:1:248:1893:25c8:1946]/",
+    }
+
+
+def pathological_corpus(size: int = 1024 ** 2) -> Dict[str, str]:
+    """ Documents of about `size` characters meant to trigger worst cases """
+    marker = "/wp-content/themes/"
+    return {
+        # A single line of url starts, none of them ever completed
+        "slashes": "/" * size,
+        "http": "http" * (size // 4),
+        # Theme directories missing their theme name
+        "markers": (marker + "!") * (size // (len(marker) + 1)),
+        # A url start, then a theme directory per line far away from it
+        "far_marker": "//" + "a" * size + marker + "theme/",
+        "nested": "<div>" * (size // 5),
+        "long_url": f"{SITE}/{'a' * size}{marker}theme/style.css",
+    }
+
+
+def pathological_urls(size: int = 64 * 1024) -> Dict[str, str]:
+    return {
+        "colons": "http://" + ":" * size,
+        "at_signs": "http://" + "a:@" * (size // 3) + "example.com/",
+        "long_host": "http://" + "a-" * (size // 2) + ".com/",
+    }
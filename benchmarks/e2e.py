@@ -0,0 +1,234 @@
+""" End to end benchmark of batch scans against a local farm of synthetic
+WordPress sites:
+
+    python -m benchmarks.e2e --hosts 2000 --concurrency 100 -o after.json
+    python -m benchmarks.e2e --hosts 2000 --concurrency 100 --baseline before.json
+
+Reports targets per second, latency percentiles, requests per target and
+peak RSS of the scanning process, as JSON. Given a baseline report, exits
+with status 1 when any figure regressed beyond the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, fields
+from typing import Dict, List, Optional
+
+from aiohttp import TraceConfig
+
+from wpoke import set_event_loop_policy
+from wpoke.batch import poke_many
+from wpoke.client import make_session
+from wpoke.conf import settings
+from wpoke.fingers import get_installed_fingers
+from wpoke.hand import Hand
+from wpoke.limiter import percentile
+from wpoke.tls import tls_stats
+from wpoke.tracing import start_tracing, stop_tracing
+
+from .farm import FarmConfig, FarmProcesses, FarmResolver
+
+# Figures compared against a baseline, and whether higher is better
+COMPARED_FIGURES = {
+    "targets_per_second": True,
+    "latency.p50": False,
+    "latency.p95": False,
+    "latency.p99": False,
+    "requests_per_target": False,
+    "peak_rss_mb": False,
+}
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+def request_counter(counts: Counter) -> TraceConfig:
+    async def on_request_start(session, context, params):
+        counts["requests"] += 1
+
+    trace_config = TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    return trace_config
+
+
+async def scan_round(targets: List[str], fingers: List[str], concurrency: int):
+    """ Scans every target once, through a session of its own, as a new
+    batch scan of the same sites would """
+    counts = Counter()
+    latencies = []
+    statuses = Counter()
+    specs = get_installed_fingers(fingers).values()
+    tls_before = tls_stats()
+    session = make_session(
+        resolver=FarmResolver(), trace_configs=[request_counter(counts)]
+    )
+    started_at = time.perf_counter()
+    async with session:
+        hand = Hand(session=session)
+        for spec in specs:
+            hand.add_finger_spec(spec)
+        async for result in poke_many(hand, targets, concurrency):
+            latencies.append(result.runtime)
+            statuses[result.status] += 1
+    elapsed = time.perf_counter() - started_at
+    tls_after = tls_stats()
+
+    latencies.sort()
+    report = {
+        "targets": len(targets),
+        "seconds": round(elapsed, 3),
+        "targets_per_second": round(len(targets) / elapsed, 2),
+        "latency": {
+            name: round(percentile(latencies, rank), 4)
+            for name, rank in (("p50", 50), ("p95", 95), ("p99", 99))
+        },
+        "requests_per_target": round(counts["requests"] / len(targets), 2),
+        "statuses": {str(status): count for status, count in statuses.items()},
+    }
+    if tls_after.handshakes:
+        handshakes = tls_after.handshakes - tls_before.handshakes
+        resumed = tls_after.resumed - tls_before.resumed
+        report["tls"] = {
+            "handshakes": handshakes,
+            "resumed": resumed,
+            "time_saved": round(tls_after.time_saved - tls_before.time_saved, 4),
+        }
+    return report
+
+
+async def run(config: FarmConfig, args) -> Dict:
+    with FarmProcesses(config, args.farm_workers) as farm:
+        targets = farm.targets()
+        rounds = []
+        for _ in range(args.rounds):
+            rounds.append(await scan_round(targets, args.fingers, args.concurrency))
+    first = rounds[0]
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "farm": asdict(config),
+        "fingers": args.fingers,
+        "concurrency": args.concurrency,
+        "targets_per_second": first["targets_per_second"],
+        "latency": first["latency"],
+        "requests_per_target": first["requests_per_target"],
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rounds": rounds,
+    }
+
+
+def _figure(report: Dict, name: str) -> Optional[float]:
+    value = report
+    for part in name.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(baseline: Dict, report: Dict, tolerance: float) -> List[str]:
+    """ Figures of the report which are worse than those of the baseline by
+    more than `tolerance`, e.g 0.1 for 10% """
+    regressions = []
+    for name, higher_is_better in COMPARED_FIGURES.items():
+        before, after = _figure(baseline, name), _figure(report, name)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{name}: {before} -> {after} ({change:+.1%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    defaults = FarmConfig()
+    for field in fields(FarmConfig):
+        flag = "--" + field.name.replace("_", "-")
+        if field.type is bool:
+            parser.add_argument(flag, action="store_true")
+        else:
+            parser.add_argument(
+                flag, type=field.type, default=getattr(defaults, field.name)
+            )
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument(
+        "--fingers",
+        type=lambda value: [name for name in value.split(",") if name],
+        default=list(settings.installed_fingers),
+        help="Comma separated fingers to run. All installed ones by default",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=1,
+        help="Times the farm is scanned. Rescans measure TLS session resumption",
+    )
+    parser.add_argument(
+        "--farm-workers",
+        type=int,
+        default=1,
+        help="Processes serving the farm, so that it is not the bottleneck",
+    )
+    parser.add_argument(
+        "--trace", help="Trace the scans into this file, to measure its overhead"
+    )
+    parser.add_argument("-o", "--output", help="File the JSON report is saved to")
+    parser.add_argument("--baseline", help="Report to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Relative change of a figure considered a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config = FarmConfig(
+        **{field.name: getattr(args, field.name) for field in fields(FarmConfig)}
+    )
+    settings.concurrency = args.concurrency
+    set_event_loop_policy()
+    if args.trace:
+        start_tracing(args.trace)
+    try:
+        report = asyncio.get_event_loop().run_until_complete(run(config, args))
+    finally:
+        stop_tracing()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fd:
+            fd.write(output + "\n")
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as fd:
+            regressions = compare(json.load(fd), report, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return int(bool(regressions))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+""" A farm of synthetic WordPress sites served by a local aiohttp server.
+
+Every site is a virtual host, `site-<n>.wp.test`, told apart by the Host
+header. How each of them behaves (theme, plugins, latency, redirects,
+failures) derives from the farm seed, so that two runs against the same
+configuration face the very same sites.
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import ssl
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from aiohttp import web
+from aiohttp.abc import AbstractResolver
+
+DOMAIN = "wp.test"
+TLS_FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "tests",
+    "fixtures",
+    "tls",
+)
+PLUGINS = (
+    "akismet",
+    "contact-form-7",
+    "elementor",
+    "jetpack",
+    "woocommerce",
+    "wordfence",
+    "wordpress-seo",
+    "wp-super-cache",
+)
+FILLER = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n"
+
+
+@dataclass
+class FarmConfig:
+    hosts: int = 1000
+    # Seconds every response is delayed by, give or take `jitter` of it
+    latency: float = 0.02
+    jitter: float = 0.5
+    # Size in bytes index pages are padded to
+    body_size: int = 32 * 1024
+    # Share of sites redirecting their index, through up to `redirects` hops.
+    # Chains longer than `settings.max_redirects` make scans fail
+    redirect_rate: float = 0.1
+    redirects: int = 2
+    # Number of distinct themes sites are built with
+    themes: int = 50
+    # Share of sites failing, either answering 500 or dropping connections
+    failure_rate: float = 0.02
+    tls: bool = False
+    seed: int = 0
+
+
+@dataclass
+class Site:
+    theme: str
+    plugins: List[str]
+    version: str
+    latency: float
+    redirects: int
+    failure: Optional[str]
+
+
+def site_name(index: int) -> str:
+    return f"site-{index}.{DOMAIN}"
+
+
+def site_index(host: str) -> Optional[int]:
+    name = host.split(":", 1)[0]
+    if not name.startswith("site-") or not name.endswith(f".{DOMAIN}"):
+        return None
+    try:
+        return int(name.split(".", 1)[0].replace("site-", "", 1))
+    except ValueError:
+        return None
+
+
+def make_site(config: FarmConfig, index: int) -> Site:
+    rnd = random.Random(f"{config.seed}:{index}")
+    failure = None
+    if rnd.random() < config.failure_rate:
+        failure = rnd.choice(("error", "drop"))
+    redirects = 0
+    if config.redirects and rnd.random() < config.redirect_rate:
+        redirects = rnd.randint(1, config.redirects)
+    return Site(
+        theme=f"theme-{rnd.randrange(max(1, config.themes))}",
+        plugins=rnd.sample(PLUGINS, rnd.randint(0, len(PLUGINS))),
+        version=f"5.{rnd.randint(0, 9)}.{rnd.randint(0, 3)}",
+        latency=max(0.0, config.latency * (1 + rnd.uniform(-1, 1) * config.jitter)),
+        redirects=redirects,
+        failure=failure,
+    )
+
+
+def render_index(host: str, site: Site, body_size: int) -> str:
+    root = f"//{host}"
+    plugins = "".join(
+        f'<link rel="stylesheet" href="{root}/wp-content/plugins/{slug}/'
+        f'assets/style.css?ver=1.0" />\n'
+        for slug in site.plugins
+    )
+    head = (
+        "<!DOCTYPE html>\n<html><head>\n"
+        f'<meta name="generator" content="WordPress {site.version}" />\n'
+        f'<link rel="https://api.w.org/" href="{root}/wp-json/" />\n'
+        f'<link rel="stylesheet" href="{root}/wp-content/themes/{site.theme}/'
+        f'style.css?ver={site.version}" />\n'
+        f'<script src="{root}/wp-includes/js/wp-embed.min.js?ver={site.version}">'
+        "</script>\n"
+        f"{plugins}</head><body>\n"
+    )
+    tail = "</body></html>\n"
+    padding = max(0, body_size - len(head) - len(tail))
+    filler = FILLER * (padding // len(FILLER) + 1)
+    return head + filler[:padding] + tail
+
+
+def render_style_css(theme: str) -> str:
+    return (
+        f"/*\nTheme Name: {theme.replace('-', ' ').title()}\n"
+        f"Theme URI: https://wordpress.org/themes/{theme}/\n"
+        "Author: the WordPress team\nVersion: 1.0\n"
+        f"Text Domain: {theme}\n*/\nbody {{ margin: 0; }}\n"
+    )
+
+
+def render_api_index() -> Dict:
+    return {
+        "name": "A synthetic site",
+        "description": "Just another WordPress site",
+        "namespaces": ["oembed/1.0", "wp/v2"],
+        "routes": {
+            "/": {"methods": ["GET"]},
+            "/wp/v2/posts": {"methods": ["GET", "POST"]},
+            "/wp/v2/users": {"methods": ["GET", "POST"]},
+        },
+    }
+
+
+def render_users() -> List[Dict]:
+    return [
+        {"id": 1, "slug": "admin", "name": "admin"},
+        {"id": 2, "slug": "editor", "name": "Editor"},
+    ]
+
+
+class Farm:
+    def __init__(self, config: FarmConfig):
+        self.config = config
+        self._sites: Dict[int, Site] = {}
+
+    def site(self, index: int) -> Site:
+        site = self._sites.get(index)
+        if site is None:
+            site = self._sites[index] = make_site(self.config, index)
+        return site
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        index = site_index(request.host)
+        if index is None or index >= self.config.hosts:
+            raise web.HTTPNotFound()
+        site = self.site(index)
+        if site.latency:
+            await asyncio.sleep(site.latency)
+        path = request.path
+        if site.failure == "drop":
+            request.transport.close()
+            raise web.HTTPInternalServerError()
+        if path == "/" and site.redirects:
+            raise web.HTTPFound("/r/1/")
+        if path.startswith("/r/"):
+            hop = int(path.split("/")[2])
+            if hop < site.redirects:
+                raise web.HTTPFound(f"/r/{hop + 1}/")
+            path = "/"
+        if path == "/":
+            if site.failure == "error":
+                raise web.HTTPInternalServerError()
+            body = render_index(request.host, site, self.config.body_size)
+            return web.Response(text=body, content_type="text/html")
+        if path == f"/wp-content/themes/{site.theme}/style.css":
+            # Served as a static file, with a validator
+            etag = f'"{site.theme}-1.0"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.Response(
+                text=render_style_css(site.theme),
+                content_type="text/css",
+                headers={"ETag": etag},
+            )
+        if path == f"/wp-content/themes/{site.theme}/screenshot.png":
+            return web.Response(body=b"\x89PNG", content_type="image/png")
+        if path.startswith("/wp-content/plugins/") and path.endswith("/readme.txt"):
+            if path.split("/")[3] in site.plugins:
+                return web.Response(text="=== Plugin ===\nStable tag: 1.0\n")
+        if path == "/wp-json/":
+            return web.json_response(render_api_index())
+        if path == "/wp-json/wp/v2/users":
+            headers = {"X-WP-Total": "2", "X-WP-TotalPages": "1"}
+            return web.json_response(render_users(), headers=headers)
+        raise web.HTTPNotFound()
+
+
+def server_ssl_context() -> ssl.SSLContext:
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(
+        os.path.join(TLS_FIXTURES, "cert.pem"), os.path.join(TLS_FIXTURES, "key.pem")
+    )
+    return context
+
+
+async def start_farm(config: FarmConfig, port: int = 0, reuse_port: bool = False):
+    """ Serves the farm on the running loop. Returns its runner and port """
+    app = web.Application()
+    app.router.add_route("*", "/{path:.*}", Farm(config).handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(
+        runner,
+        "127.0.0.1",
+        port,
+        ssl_context=server_ssl_context() if config.tls else None,
+        reuse_port=reuse_port or None,
+        backlog=4096,
+    )
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+def _serve(config: Dict, port: int, reuse_port: bool, ready, stop) -> None:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runner, port = loop.run_until_complete(
+        start_farm(FarmConfig(**config), port, reuse_port)
+    )
+    ready.put(port)
+    try:
+        loop.run_until_complete(loop.run_in_executor(None, stop.wait))
+    finally:
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+
+class FarmProcesses:
+    """ Runs the farm on `workers` processes sharing a port, away from the
+    process being benchmarked """
+
+    def __init__(self, config: FarmConfig, workers: int = 1):
+        self.config = config
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.port: Optional[int] = None
+        self._stop = self.context.Event()
+        self._processes = []
+
+    def _spawn(self, port: int) -> int:
+        ready = self.context.Queue()
+        process = self.context.Process(
+            target=_serve,
+            args=(asdict(self.config), port, self.workers > 1, ready, self._stop),
+            daemon=True,
+        )
+        process.start()
+        self._processes.append(process)
+        return ready.get(timeout=30)
+
+    def __enter__(self) -> "FarmProcesses":
+        self.port = self._spawn(0)
+        for _ in range(self.workers - 1):
+            self._spawn(self.port)
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        for process in self._processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+
+    def targets(self) -> List[str]:
+        scheme = "https" if self.config.tls else "http"
+        return [
+            f"{scheme}://{site_name(index)}:{self.port}/"
+            for index in range(self.config.hosts)
+        ]
+
+
+class FarmResolver(AbstractResolver):
+    """ Resolves every host name of the farm to the loopback address """
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET):
+        return [
+            {
+                "hostname": host,
+                "host": "127.0.0.1",
+                "port": port,
+                "family": socket.AF_INET,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST,
+            }
+        ]
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,238 @@
+""" Microbenchmarks of the theme extraction hot functions:
+
+    python -m benchmarks.micro -o after.json
+    python -m benchmarks.micro --baseline before.json --threshold 0.2
+    python -m benchmarks.micro -k global_regex
+
+Every case reports operations per second, the best of `--repeat` runs of
+at least `--min-time` seconds each, and the peak memory allocated by a
+single operation, as traced by tracemalloc (libxml2 buffers are not).
+Given a baseline report, exits with status 1 when any case got slower or
+allocates more beyond the threshold.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from wpoke.client import URL
+from wpoke.exceptions import ValidationError
+from wpoke.fingers.theme.crawler import (
+    WPThemeMetadataCrawler,
+    extract_info_from_css,
+    extract_theme_path_by_global_regex,
+    remove_duplicated_theme_urls,
+    truncate_theme_url,
+)
+from wpoke.store import DataStore, pop_store, push_store
+from wpoke.validators.url import validate_url
+
+from . import corpus
+
+
+@dataclass
+class Case:
+    name: str
+    func: Callable[[], Any]
+
+
+def _candidates(html: str) -> Callable[[], Any]:
+    canonical_url = URL(f"{corpus.SITE}/")
+
+    def run():
+        # A new scan every time, so that the document is parsed again
+        push_store(DataStore())
+        try:
+            crawler = WPThemeMetadataCrawler(None, canonical_url=canonical_url)
+            return crawler.extract_theme_path_candidates(html)
+        finally:
+            pop_store()
+
+    return run
+
+
+def build_cases(seed: int = 0) -> List[Case]:
+    cases = []
+    for name, css in corpus.css_corpus().items():
+        cases.append(
+            Case(
+                f"extract_info_from_css[{name}]",
+                lambda css=css: extract_info_from_css(css),
+            )
+        )
+    canonical_url = URL(f"{corpus.SITE}/")
+    for name, html in corpus.html_corpus(seed).items():
+        cases.append(Case(f"extract_theme_path_candidates[{name}]", _candidates(html)))
+        cases.append(
+            Case(
+                f"extract_theme_path_by_global_regex[{name}]",
+                lambda html=html: extract_theme_path_by_global_regex(
+                    canonical_url, html
+                ),
+            )
+        )
+    urls = corpus.theme_urls(seed=seed)
+    cases.append(
+        Case(
+            f"remove_duplicated_theme_urls[{len(urls)}]",
+            lambda: remove_duplicated_theme_urls(urls),
+        )
+    )
+    cases.append(Case("truncate_theme_url", lambda: truncate_theme_url(urls[0])))
+    for name, url in corpus.url_corpus().items():
+        cases.append(
+            Case(f"URLValidator.__call__[{name}]", lambda url=url: validate_url(url))
+        )
+    for name, html in corpus.pathological_corpus().items():
+        cases.append(
+            Case(
+                f"extract_theme_path_by_global_regex[pathological:{name}]",
+                lambda html=html: extract_theme_path_by_global_regex(
+                    canonical_url, html
+                ),
+            )
+        )
+    for name, url in corpus.pathological_urls().items():
+        cases.append(
+            Case(
+                f"URLValidator.__call__[pathological:{name}]",
+                lambda url=url: _rejected(url),
+            )
+        )
+    return cases
+
+
+def _rejected(url: str) -> None:
+    try:
+        validate_url(url)
+    except ValidationError:
+        pass
+
+
+def _time(func: Callable[[], Any], min_time: float) -> float:
+    """ Operations per second of a run lasting at least `min_time` """
+    ops = 0
+    started_at = time.perf_counter()
+    while True:
+        func()
+        ops += 1
+        elapsed = time.perf_counter() - started_at
+        if elapsed >= min_time:
+            return ops / elapsed
+
+
+def _peak_allocated(func: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(case: Case, min_time: float = 0.5, repeat: int = 3) -> Dict[str, Any]:
+    # Warm up caches, e.g compiled regular expressions
+    case.func()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        ops_per_second = max(_time(case.func, min_time) for _ in range(repeat))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "ops_per_second": round(ops_per_second, 2),
+        "alloc_peak_kb": round(_peak_allocated(case.func) / 1024, 1),
+    }
+
+
+def run_cases(
+    cases: List[Case], min_time: float = 0.5, repeat: int = 3, log=None
+) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for case in cases:
+        results[case.name] = measure(case, min_time, repeat)
+        if log is not None:
+            figures = results[case.name]
+            print(
+                f"{case.name:<55} {figures['ops_per_second']:>12.2f} ops/s "
+                f"{figures['alloc_peak_kb']:>10.1f} KB",
+                file=log,
+            )
+    return results
+
+
+def compare(baseline: Dict, report: Dict, threshold: float) -> List[str]:
+    """ Cases of the report slower, or allocating more, than in the baseline
+    by more than `threshold`, e.g 0.2 for 20% """
+    regressions = []
+    for name, after in report["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if not before:
+            continue
+        slowdown = 1 - after["ops_per_second"] / before["ops_per_second"]
+        if slowdown > threshold:
+            regressions.append(
+                f"{name}: {before['ops_per_second']} -> {after['ops_per_second']} "
+                f"ops/s ({-slowdown:+.1%})"
+            )
+        if before["alloc_peak_kb"]:
+            growth = after["alloc_peak_kb"] / before["alloc_peak_kb"] - 1
+            if growth > threshold:
+                regressions.append(
+                    f"{name}: {before['alloc_peak_kb']} -> {after['alloc_peak_kb']} "
+                    f"KB allocated ({growth:+.1%})"
+                )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", "--filter", help="Run only cases whose name has this")
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="File the JSON report is saved to")
+    parser.add_argument("--baseline", help="Report to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative slowdown or allocation growth considered a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    from .e2e import git_commit
+
+    args = parse_args(argv)
+    cases = build_cases(args.seed)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case.name]
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "cases": run_cases(cases, args.min_time, args.repeat, log=sys.stderr),
+    }
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(report, fd, indent=2)
+            fd.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as fd:
+            regressions = compare(json.load(fd), report, args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return int(bool(regressions))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,3 +29,13 @@ def read_fixture():
         return content
 
     return inner
+
+
+@pytest.fixture(autouse=True)
+def fresh_fingerprints():
+    """ Themes seen by a test must not spare others their parsing """
+    from wpoke.fingers.theme.fingerprints import close_fingerprints
+
+    close_fingerprints()
+    yield
+    close_fingerprints()
@@ -28,7 +28,7 @@ setup(
     maintainer_email="marsanben92@gmail.com",
     description="WordPress information gathering tool",
     long_description=readme,
-    packages=find_packages(),
+    packages=find_packages(exclude=("benchmarks", "benchmarks.*")),
     include_package_data=True,
     zip_safe=False,
     platforms="any",
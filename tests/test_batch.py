@@ -0,0 +1,109 @@
+import asyncio
+import io
+import os
+import tempfile
+
+import json
+
+import pytest
+
+from benchmarks.farm import FarmConfig, FarmResolver, start_farm
+from wpoke.batch import iter_targets, poke_many, skip_finished, STATUS_ERROR
+from wpoke.cli import batch_scan, extract_cli_options
+from wpoke.client import make_session
+from wpoke.conf import settings
+from wpoke.fingers import get_installed_fingers
+from wpoke.hand import Hand
+from wpoke.journal import CheckpointJournal, JOURNAL_STATUS_ERROR
+from wpoke.models import HandResult
+
+
+class FakeHand:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def poke(self, target):
+        if target.endswith("crash"):
+            raise ValueError(target)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        result = HandResult()
+        result.target = target
+        result.status = 0
+        return result
+
+
+def test_iter_targets_skips_blanks_and_comments():
+    fd = io.StringIO("https://a.wp.com\n\n# comment\n  https://b.wp.com  \n")
+    assert ["https://a.wp.com", "https://b.wp.com"] == list(iter_targets(fd))
+
+
+@pytest.mark.asyncio
+async def test_poke_many_bounds_concurrency():
+    hand = FakeHand()
+    targets = [f"https://{i}.wp.com" for i in range(20)]
+    results = [result async for result in poke_many(hand, targets, concurrency=4)]
+    assert 20 == len(results)
+    assert 4 == hand.max_in_flight
+    assert set(targets) == {result.target for result in results}
+
+
+@pytest.mark.asyncio
+async def test_poke_many_isolates_crashing_targets_and_journals_them():
+    hand = FakeHand()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "scan.journal")
+        with CheckpointJournal(path) as journal:
+            targets = ["https://a.wp.com", "https://crash"]
+            results = [
+                result async for result in poke_many(hand, targets, 2, journal=journal)
+            ]
+            statuses = {result.target: result.status for result in results}
+            assert STATUS_ERROR == statuses["https://crash"]
+            assert JOURNAL_STATUS_ERROR == journal.status("https://crash")
+
+        with CheckpointJournal(path) as journal:
+            remaining = skip_finished(targets + ["https://b.wp.com"], journal)
+            assert ["https://b.wp.com"] == list(remaining)
+
+
+@pytest.fixture
+def short_timeout():
+    previous = settings.timeout
+    settings.timeout = 0.1
+    yield
+    settings.timeout = previous
+
+
+@pytest.mark.asyncio
+async def test_batch_output_is_json_lines_when_targets_time_out(
+    short_timeout, tmp_path, capsys
+):
+    hosts = 3
+    config = FarmConfig(
+        hosts=hosts, latency=0.5, jitter=0, failure_rate=0, redirect_rate=0
+    )
+    runner, port = await start_farm(config)
+    try:
+        input_file = tmp_path / "targets.txt"
+        input_file.write_text(
+            "".join(f"http://site-{i}.wp.test:{port}/\n" for i in range(hosts))
+        )
+        fingers = get_installed_fingers(["theme"])
+        _, cli_options = extract_cli_options(fingers, ["--input", str(input_file)])
+        async with make_session(resolver=FarmResolver()) as session:
+            hand = Hand(session=session)
+            for spec in fingers.values():
+                hand.add_finger_spec(spec)
+            await batch_scan(hand, cli_options)
+    finally:
+        await runner.cleanup()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert hosts == len(lines)
+    results = [json.loads(line) for line in lines]
+    assert {1} == {result["status"] for result in results}
@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks import micro
+from benchmarks.corpus import html_page
+from benchmarks.e2e import compare, scan_round
+from benchmarks.farm import FarmConfig, make_site, start_farm
+
+
+def test_sites_are_reproducible():
+    config = FarmConfig(seed=1, failure_rate=0.5, redirect_rate=0.5)
+    assert make_site(config, 7) == make_site(config, 7)
+    assert make_site(config, 7) != make_site(FarmConfig(seed=2), 7)
+
+
+@pytest.mark.asyncio
+async def test_scan_round_against_farm():
+    config = FarmConfig(hosts=20, latency=0, failure_rate=0, body_size=1024)
+    runner, port = await start_farm(config)
+    try:
+        targets = [f"http://site-{i}.wp.test:{port}/" for i in range(config.hosts)]
+        report = await scan_round(targets, ["theme", "core_version"], 5)
+    finally:
+        await runner.cleanup()
+
+    assert {"0": 20} == report["statuses"]
+    assert report["requests_per_target"] >= 3
+    assert report["latency"]["p50"] <= report["latency"]["p99"]
+
+
+def test_compare_reports_regressions():
+    baseline = {"targets_per_second": 100, "latency": {"p95": 1.0}}
+    report = {"targets_per_second": 80, "latency": {"p95": 1.05}}
+    assert 1 == len(compare(baseline, report, tolerance=0.1))
+    assert [] == compare(baseline, report, tolerance=0.25)
+
+
+def test_html_pages_are_sized_and_reproducible():
+    page = html_page(20 * 1024, seed=3)
+    assert 20 * 1024 <= len(page) < 22 * 1024
+    assert page == html_page(20 * 1024, seed=3)
+
+
+def test_microbenchmarks_run_and_compare():
+    cases = [case for case in micro.build_cases() if "10kb" in case.name]
+    report = {"cases": micro.run_cases(cases, min_time=0, repeat=1)}
+
+    assert 2 == len(report["cases"])
+    for figures in report["cases"].values():
+        assert figures["ops_per_second"] > 0
+
+    slower = {
+        "cases": {
+            name: dict(figures, ops_per_second=figures["ops_per_second"] / 2)
+            for name, figures in report["cases"].items()
+        }
+    }
+    assert 2 == len(micro.compare(report, slower, threshold=0.2))
+    assert [] == micro.compare(slower, report, threshold=0.2)
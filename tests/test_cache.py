@@ -0,0 +1,185 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from wpoke.cache import DEFAULT_CACHE_TTL, CachedHand, ResultCache
+from wpoke.exceptions import TargetTimeout
+from wpoke.finger import BaseFinger
+from wpoke.fingers.theme import ThemeFinger
+from wpoke.hand import Hand
+from wpoke.metrics import RESULT_CACHE
+from wpoke.models import HandResult
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_result(target):
+    result = HandResult()
+    result.target = target
+    result.status = 0
+    return result
+
+
+def make_finger(name, ttl=None, fail=False):
+    class CountingFinger(BaseFinger):
+        calls = 0
+
+        class Meta:
+            pass
+
+        async def run(self, target, **options):
+            type(self).calls += 1
+            await asyncio.sleep(0.01)
+            if fail:
+                raise TargetTimeout
+            return {"calls": type(self).calls}
+
+        def render(self, result, fmt=None, **kwargs):
+            pass
+
+    CountingFinger.Meta.name = name
+    if ttl is not None:
+        CountingFinger.Meta.cache_ttl = ttl
+    return CountingFinger
+
+
+def make_hand(*fingers, **kwargs):
+    hand = Hand(session=None)
+    for finger in fingers:
+        hand.add_finger(finger)
+    cache = ResultCache(clock=Clock(), **kwargs)
+    return CachedHand(hand, cache)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, make_result(key), 60)
+    assert cache.get("a") is not None
+    cache.put("c", make_result("c"), 60)
+
+    assert 2 == len(cache)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_entries_are_served_stale_until_expired():
+    clock = Clock()
+    cache = ResultCache(stale_ttl=30, clock=clock)
+    cache.put("a", make_result("a"), 60)
+
+    clock.now += 59
+    assert cache.get("a").fresh_until > clock.now
+    clock.now += 30
+    assert cache.get("a").fresh_until <= clock.now
+    clock.now += 1
+    assert cache.get("a") is None
+    assert 0 == len(cache)
+
+
+def test_entries_are_kept_on_disk(tmp_path):
+    path = str(tmp_path / "results.db")
+    cache = ResultCache(max_entries=1, path=path)
+    cache.put("a", make_result("http://a.com/"), 60)
+    cache.put("b", make_result("http://b.com/"), 60)
+    assert "http://a.com/" == cache.get("a").result.target
+    cache.close()
+
+    cache = ResultCache(path=path)
+    try:
+        assert "http://b.com/" == cache.get("b").result.target
+        cache.delete("b")
+        assert cache.get("b") is None
+    finally:
+        cache.close()
+
+
+def test_shortest_finger_ttl_applies():
+    hand = make_hand(make_finger("one", ttl=600), make_finger("two", ttl=60))
+    assert 60 == hand.ttl
+    assert DEFAULT_CACHE_TTL == make_hand(make_finger("three")).ttl
+
+
+@pytest.mark.asyncio
+async def test_concurrent_scans_are_coalesced():
+    finger = make_finger("theme", ttl=60)
+    hand = make_hand(finger)
+    results = await asyncio.gather(
+        hand.poke("http://wp.com/"), hand.poke("wp.com"), hand.poke("http://WP.com/x")
+    )
+
+    assert 1 == finger.calls
+    assert ["http://wp.com/", "wp.com", "http://WP.com/x"] == [
+        result.target for result in results
+    ]
+    assert 1 == len({id(result.pokes[0]) for result in results})
+
+
+@pytest.mark.asyncio
+async def test_stale_results_are_refreshed_in_background():
+    finger = make_finger("theme", ttl=60)
+    hand = make_hand(finger, stale_ttl=60)
+    clock = hand.cache.clock
+    first = await hand.poke("http://wp.com/")
+
+    clock.now += 30
+    assert first is await hand.poke("http://wp.com/")
+    assert 1 == finger.calls
+
+    clock.now += 60
+    assert first is await hand.poke("http://wp.com/")
+    await asyncio.sleep(0.05)
+    assert 2 == finger.calls
+    refreshed = await hand.poke("http://wp.com/")
+    assert {"calls": 2} == refreshed.pokes[0].data
+
+    clock.now += 200
+    await hand.poke("http://wp.com/")
+    assert 3 == finger.calls
+    await hand.aclose()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_scans_are_not_cached():
+    finger = make_finger("theme", ttl=60, fail=True)
+    hand = make_hand(finger)
+    for _ in range(2):
+        result = await hand.poke("http://wp.com/")
+        assert 1 == result.status
+    assert 2 == finger.calls
+    assert 0 == len(hand.cache)
+
+
+@pytest.mark.asyncio
+async def test_theme_scans_which_timed_out_are_not_cached():
+    session = mock.MagicMock()
+    session.request.side_effect = asyncio.TimeoutError
+    hand = Hand(session=session)
+    hand.add_finger(ThemeFinger)
+    hand = CachedHand(hand, ResultCache(clock=Clock()))
+    misses = RESULT_CACHE.labels("miss").value
+
+    for _ in range(2):
+        result = await hand.poke("http://wp.com/")
+        assert 1 == result.status
+    assert 2 == RESULT_CACHE.labels("miss").value - misses
+    assert 2 == session.request.call_count
+    assert 0 == len(hand.cache)
+
+
+@pytest.mark.asyncio
+async def test_uncacheable_targets_are_scanned():
+    finger = make_finger("theme", ttl=60)
+    hand = make_hand(finger)
+    assert hand.key("http://127.0.0.1/") is None
+    await hand.poke("http://127.0.0.1/")
+    await hand.poke("http://127.0.0.1/")
+    assert 2 == finger.calls
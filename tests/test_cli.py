@@ -0,0 +1,120 @@
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+from wpoke.cli import extract_cli_options, load_settings, select_fingers
+from wpoke.conf import InvalidCliConfigurationException, settings
+from wpoke.fingers import get_installed_fingers
+
+HEAVY_DEPENDENCIES = ("aiohttp", "lxml", "serpy")
+IMPORT_TIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+# Importing the CLI may take this many times the interpreter's own startup
+# (the `site` import). It is ~8 at the time of writing, while importing
+# aiohttp eagerly makes it ~50. Override it on unusual machines
+IMPORT_TIME_BUDGET = float(os.environ.get("WPOKE_IMPORT_TIME_BUDGET", "25"))
+
+
+# Top level packages installed as dependencies which `code` imports
+THIRD_PARTY_IMPORTS = (
+    "import sys, sysconfig{code}\n"
+    "purelib, platlib = sysconfig.get_paths()['purelib'], "
+    "sysconfig.get_paths()['platlib']\n"
+    "for name, module in list(sys.modules.items()):\n"
+    "    path = getattr(module, '__file__', None) or ''\n"
+    "    if path.startswith((purelib, platlib)):\n"
+    "        print(name.split('.')[0])\n"
+)
+
+
+def third_party_imports(code):
+    process = subprocess.run(
+        [sys.executable, "-c", THIRD_PARTY_IMPORTS.format(code=code)],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return set(process.stdout.split())
+
+
+def import_times(code):
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+class CliImportTimeTestCase(unittest.TestCase):
+    def test_help_does_not_import_heavy_dependencies(self):
+        times = import_times("from wpoke.cli import main; main(['--help'])")
+        self.assertIn("wpoke.cli", times)
+        for module in times:
+            self.assertNotIn(module.split(".")[0], HEAVY_DEPENDENCIES)
+
+    def test_import_time_budget(self):
+        # Both times come from the same process, so a loaded machine slows
+        # them down alike. The best of a few runs discards one-off stalls
+        ratios = []
+        for _ in range(3):
+            times = import_times("import wpoke.cli")
+            ratios.append(times["wpoke.cli"] / times["site"])
+        self.assertLess(min(ratios), IMPORT_TIME_BUDGET)
+
+    def test_cli_imports_no_dependency(self):
+        # What the interpreter loads on startup, such as .pth hooks, is not
+        # imported by the CLI
+        startup = third_party_imports("")
+        imported = third_party_imports(", wpoke.cli") - startup
+        self.assertLessEqual(imported, {"wpoke"})
+
+
+class CliOptionsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fingers = get_installed_fingers(["theme"])
+
+    def test_no_finger_flag_selects_every_finger(self):
+        _, options = extract_cli_options(self.fingers, ["https://wp.com"])
+        self.assertEqual(
+            list(self.fingers.values()), select_fingers(self.fingers, options)
+        )
+
+    def test_finger_flag_selects_finger(self):
+        _, options = extract_cli_options(self.fingers, ["-t", "https://wp.com"])
+        self.assertEqual([self.fingers["theme"]], select_fingers(self.fingers, options))
+
+    def test_unknown_format_is_rejected(self):
+        _, options = extract_cli_options(self.fingers, ["-f", "xml", "https://wp.com"])
+        with self.assertRaises(InvalidCliConfigurationException):
+            load_settings(options)
+
+    def test_url_or_input_is_required(self):
+        _, options = extract_cli_options(self.fingers, [])
+        with self.assertRaises(InvalidCliConfigurationException):
+            load_settings(options)
+
+    def test_serve_does_not_require_url(self):
+        _, options = extract_cli_options(self.fingers, ["-t", "--serve", "8080"])
+        load_settings(options)
+        self.assertEqual(8080, options.serve)
+        self.assertEqual("127.0.0.1", options.serve_host)
+
+    def test_profile_output_implies_profile(self):
+        _, options = extract_cli_options(
+            self.fingers, ["--profile-output", "scan.prof", "https://wp.com"]
+        )
+        previous = settings.profile
+        try:
+            load_settings(options)
+            self.assertTrue(settings.profile)
+            self.assertEqual("cprofile", options.profiler)
+        finally:
+            settings.profile = previous
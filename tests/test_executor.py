@@ -0,0 +1,76 @@
+import os
+import threading
+
+import pytest
+
+from wpoke.client import URL
+from wpoke.conf import settings
+from wpoke.exceptions import BundledThemeException
+from wpoke.executor import offload, offload_to_thread, shutdown_executors
+from wpoke.fingers.theme.crawler import WPThemeMetadataCrawler, extract_info_from_css
+from wpoke.store import DataStore
+
+
+@pytest.fixture
+def executor_settings():
+    previous = settings.executor, settings.offload_threshold
+    yield settings
+    settings.executor, settings.offload_threshold = previous
+    shutdown_executors()
+
+
+@pytest.mark.asyncio
+async def test_small_inputs_are_handled_inline(executor_settings):
+    executor_settings.offload_threshold = 100
+    assert threading.get_ident() == await offload(threading.get_ident, size=99)
+
+
+@pytest.mark.asyncio
+async def test_large_inputs_are_offloaded_to_threads(executor_settings):
+    executor_settings.executor = "thread"
+    executor_settings.offload_threshold = 100
+    assert threading.get_ident() != await offload(threading.get_ident, size=100)
+
+
+@pytest.mark.asyncio
+async def test_inline_executor_never_offloads(executor_settings):
+    executor_settings.executor = "inline"
+    executor_settings.offload_threshold = 0
+    assert threading.get_ident() == await offload(threading.get_ident, size=10 ** 9)
+
+
+@pytest.mark.asyncio
+async def test_process_executor(executor_settings):
+    executor_settings.executor = "process"
+    executor_settings.offload_threshold = 0
+    assert os.getpid() != await offload(os.getpid, size=1)
+    # Trees cannot be pickled, so they are always built on threads
+    assert os.getpid() == await offload_to_thread(os.getpid, size=1)
+    with pytest.raises(BundledThemeException):
+        await offload(extract_info_from_css, "body { color: red }", size=1)
+
+
+def make_crawler():
+    crawler = WPThemeMetadataCrawler(
+        http_session=None, canonical_url=URL("https://normal.wp.com/")
+    )
+    crawler.store = DataStore()
+    return crawler
+
+
+@pytest.mark.usefixtures("fixture_file_content")
+class TestOffloadedThemeCandidates:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("fixture", ["normal.html", "urls_third_parties.html"])
+    @pytest.mark.parametrize("executor", ["thread", "process"])
+    async def test_same_candidates_as_inline(
+        self, executor, fixture, executor_settings
+    ):
+        html = self.fixture_content(f"crawlers/theme/html/{fixture}")
+        expected = make_crawler().extract_theme_path_candidates(html)
+
+        executor_settings.executor = executor
+        executor_settings.offload_threshold = 0
+        actual = await make_crawler().find_theme_path_candidates(html)
+
+        assert expected == actual
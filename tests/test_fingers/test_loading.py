@@ -0,0 +1,64 @@
+import subprocess
+import sys
+import unittest
+from collections import namedtuple
+from unittest import mock
+
+from wpoke.exceptions import FingerNotFoundException
+from wpoke.fingers import BUILTIN_FINGERS, get_installed_fingers
+from wpoke.fingers.loading import FingerSpec, spec_from_path
+from wpoke.hand import Hand
+
+EntryPoint = namedtuple("EntryPoint", ("name", "value"))
+
+
+class FingerDiscoveryTestCase(unittest.TestCase):
+    def test_builtin_fingers_are_resolved_by_name(self):
+        fingers = get_installed_fingers(["theme"])
+        self.assertIs(BUILTIN_FINGERS["theme"], fingers["theme"])
+
+    def test_fingers_are_resolved_by_dotted_path(self):
+        for path in (
+            "wpoke.fingers.theme.ThemeFinger",
+            "wpoke.fingers.theme:ThemeFinger",
+        ):
+            spec = get_installed_fingers([path])["themefinger"]
+            self.assertEqual("wpoke.fingers.theme:ThemeFinger", spec.path)
+            self.assertEqual(["--themefinger"], spec.cli_flags)
+
+    @mock.patch("wpoke.fingers.loading._iter_entry_points")
+    def test_fingers_are_resolved_by_entry_point(self, iter_entry_points):
+        iter_entry_points.return_value = [
+            EntryPoint("users", "third_party.fingers:UsersFinger")
+        ]
+        spec = get_installed_fingers(["users"])["users"]
+        self.assertEqual("third_party.fingers:UsersFinger", spec.path)
+
+    @mock.patch("wpoke.fingers.loading._iter_entry_points", return_value=[])
+    def test_unknown_fingers_raise(self, _):
+        with self.assertRaises(FingerNotFoundException):
+            get_installed_fingers(["unknown"])
+
+    def test_unimportable_fingers_raise_on_load(self):
+        with self.assertRaises(FingerNotFoundException):
+            spec_from_path("wpoke.fingers.nope.NopeFinger").load()
+
+    def test_hand_registers_fingers_from_specs(self):
+        hand = Hand(session=None)
+        hand.add_finger_spec(BUILTIN_FINGERS["theme"])
+        self.assertListEqual(["theme_metadata"], hand.registered_fingers.finger_names)
+
+    def test_discovery_does_not_import_fingers(self):
+        code = (
+            "import sys; from wpoke.fingers import get_installed_fingers; "
+            "get_installed_fingers(); "
+            "assert 'wpoke.fingers.theme' not in sys.modules"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+
+class FingerSpecTestCase(unittest.TestCase):
+    def test_cli_flags_default_to_name(self):
+        spec = FingerSpec(name="core_version", path="a.b:C")
+        self.assertEqual(["--core-version"], spec.cli_flags)
+        self.assertEqual("finger_core_version", spec.dest)
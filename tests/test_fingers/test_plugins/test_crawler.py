@@ -0,0 +1,152 @@
+import asyncio
+import unittest
+
+import pytest
+
+from wpoke.client import URL
+from wpoke.fingers.plugins.crawler import (
+    WPPluginCrawler,
+    extract_plugins_from_html,
+    iter_wordlist,
+)
+from wpoke.fingers.plugins.models import FOUND_BY_INDEX, FOUND_BY_README
+
+README = "=== Akismet ===\nContributors: matt\nStable tag: 4.1.2\nLicense: GPLv2\n"
+
+
+class FakeContent:
+    def __init__(self, body):
+        self.body = body.encode("utf8")
+
+    async def read(self, n=-1):
+        return self.body if n < 0 else self.body[:n]
+
+
+class FakeResponse:
+    def __init__(self, url, status, body="", delay=0):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.content = FakeContent(body)
+        self.charset = "utf8"
+        self.delay = delay
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def text(self):
+        return self.body
+
+
+class FakeSession:
+    """ Answers 200 with the given body for known urls, else `default` """
+
+    def __init__(self, pages, default=404, delay=0):
+        self.pages = pages
+        self.default = default
+        self.delay = delay
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs.get("headers", {})))
+        if url in self.pages:
+            return FakeResponse(url, 200, self.pages[url], self.delay)
+        return FakeResponse(url, self.default, "", self.delay)
+
+
+def make_crawler(session):
+    return WPPluginCrawler(session, canonical_url=URL("https://wp.com/"))
+
+
+@pytest.mark.usefixtures("fixture_file_content", autouse=True)
+class TestExtractPluginsFromHTML(unittest.TestCase):
+    def test_plugins_are_found_in_index(self):
+        html = self.fixture_content("crawlers/plugins/html/normal.html")
+        plugins = extract_plugins_from_html("https://normal.wp.com/", html)
+
+        self.assertListEqual(
+            ["contact-form-7", "jetpack", "woocommerce"], sorted(plugins)
+        )
+        self.assertEqual("5.1.4", plugins["contact-form-7"].version)
+        self.assertEqual("3.7.1", plugins["woocommerce"].version)
+        self.assertIsNone(plugins["jetpack"].version)
+        self.assertListEqual([FOUND_BY_INDEX], plugins["jetpack"].found_by)
+
+    def test_only_plugins_of_the_site_are_found(self):
+        html = (
+            '<script src="/wp-content/plugins/akismet/a.js"></script>'
+            "<link href='//wp.com/wp-content/plugins/jetpack/a.css'>"
+            '<img src="https://cdn.wp.com/wp-content/plugins/woocommerce/a.png">'
+            '<a href="https://other.blog/wp-content/plugins/hello-dolly/">x</a>'
+            "<style>a { background: url(//cdn.io/wp-content/plugins/yoast/a.png) }"
+        )
+        plugins = extract_plugins_from_html("https://wp.com/", html)
+
+        self.assertListEqual(["akismet", "jetpack"], sorted(plugins))
+
+
+def test_iter_wordlist_skips_invalid_slugs():
+    lines = ["akismet\n", "\n", "../etc/passwd\n", "Jetpack  \n"]
+    assert ["akismet", "jetpack"] == list(iter_wordlist(lines))
+
+
+@pytest.mark.asyncio
+async def test_probe_finds_plugins_and_reads_their_version():
+    base = "https://wp.com/wp-content/plugins/"
+    session = FakeSession({f"{base}akismet/readme.txt": README})
+    crawler = make_crawler(session)
+    plugins = extract_plugins_from_html(
+        "https://wp.com/", f"{base}akismet/a.js?ver=1.0"
+    )
+
+    report = await crawler.probe(["hello", "akismet", "jetpack"], plugins, 2, 5)
+
+    assert report.completed
+    assert 3 == report.probed
+    assert "4.1.2" == plugins["akismet"].version
+    assert [FOUND_BY_INDEX, FOUND_BY_README] == plugins["akismet"].found_by
+    ranges = [h["Range"] for method, _, h in session.requests if method == "get"]
+    assert ["bytes=0-2047"] == ranges
+
+
+@pytest.mark.asyncio
+async def test_probe_aborts_on_catch_all_canary():
+    crawler = make_crawler(FakeSession({}, default=200))
+    plugins = {}
+
+    report = await crawler.probe(["akismet"] * 100, plugins, 4, 5)
+
+    assert report.catch_all
+    assert not report.completed
+    assert 0 == report.probed
+    assert {} == plugins
+
+
+@pytest.mark.asyncio
+async def test_probe_aborts_when_everything_is_found():
+    base = "https://wp.com/wp-content/plugins/"
+    slugs = [f"plugin-{i}" for i in range(1000)]
+    pages = {f"{base}{slug}/readme.txt": README for slug in slugs}
+    crawler = make_crawler(FakeSession(pages))
+    plugins = {}
+
+    report = await crawler.probe(slugs, plugins, 4, 5)
+
+    assert report.catch_all
+    assert report.probed < 50
+    assert {} == plugins
+
+
+@pytest.mark.asyncio
+async def test_probe_stops_on_time_budget():
+    crawler = make_crawler(FakeSession({}, delay=0.05))
+
+    report = await crawler.probe((f"p-{i}" for i in range(50000)), {}, 10, 0.3)
+
+    assert not report.completed
+    assert "time budget exhausted" == report.aborted_reason
+    assert report.probed < 100
@@ -0,0 +1,247 @@
+import asyncio
+import json
+
+import pytest
+
+from wpoke.client import URL
+from wpoke.fingers.rest.crawler import WPRestApiCrawler, route_url
+from wpoke.store import DataStore, pop_store, push_store
+
+INDEX_HTML = (
+    '<html><head><link rel="https://api.w.org/" href="https://wp.com/wp-json/" />'
+    "</head><body>Hello</body></html>"
+)
+API_INDEX = {
+    "name": "My blog",
+    "description": "Just another WordPress site",
+    "namespaces": ["oembed/1.0", "wp/v2"],
+    "routes": {
+        "/": {"namespace": "", "methods": ["GET"]},
+        "/wp/v2/users": {"namespace": "wp/v2", "methods": ["GET", "POST"]},
+    },
+}
+
+
+def users_page(page, per_page=2):
+    first = (page - 1) * per_page + 1
+    return [
+        {"id": i, "name": f"User {i}", "slug": f"user-{i}", "description": "x" * 50}
+        for i in range(first, first + per_page)
+    ]
+
+
+class FakeContent:
+    def __init__(self, body, chunk_size):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def iter_chunked(self, n):
+        size = min(n, self.chunk_size)
+        for i in range(0, len(self.body), size):
+            await asyncio.sleep(0)
+            yield self.body[i : i + size]
+
+
+class FakeResponse:
+    def __init__(self, session, url, status, body="", headers=None):
+        self.session = session
+        self.url = url
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.charset = "utf-8"
+        self.content = FakeContent(body.encode("utf8"), session.chunk_size)
+
+    async def __aenter__(self):
+        self.session.in_flight += 1
+        self.session.max_in_flight = max(
+            self.session.max_in_flight, self.session.in_flight
+        )
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *args):
+        self.session.in_flight -= 1
+
+    async def text(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, pages, chunk_size=7, timeouts=(), throttled=()):
+        self.pages = pages
+        self.timeouts = set(timeouts)
+        # Urls answered 429 the first time they are requested
+        self.throttled = set(throttled)
+        self.chunk_size = chunk_size
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests.append(url)
+        if url in self.timeouts:
+            raise asyncio.TimeoutError
+        if url in self.throttled:
+            self.throttled.remove(url)
+            return FakeResponse(self, url, 429, headers={"Retry-After": "1"})
+        if url in self.pages:
+            body, headers = self.pages[url]
+            return FakeResponse(self, url, 200, body, headers)
+        return FakeResponse(self, url, 404)
+
+
+@pytest.fixture
+def store():
+    push_store(DataStore())
+    yield
+    pop_store()
+
+
+def users_url(root, page):
+    return route_url(root, "/wp/v2/users", {"per_page": 100, "page": page})
+
+
+def make_site(root, total_pages=1, index_html=INDEX_HTML):
+    pages = {
+        "https://wp.com/": (index_html, {}),
+        route_url(root, "/"): (json.dumps(API_INDEX), {}),
+    }
+    for page in range(1, total_pages + 1):
+        headers = {
+            "X-WP-Total": str(total_pages * 2),
+            "X-WP-TotalPages": str(total_pages),
+        }
+        pages[users_url(root, page)] = (json.dumps(users_page(page)), headers)
+    return pages
+
+
+def make_crawler(session):
+    return WPRestApiCrawler(session, canonical_url=URL("https://wp.com/"))
+
+
+def test_route_url():
+    assert "https://wp.com/wp-json/" == route_url("https://wp.com/wp-json/", "/")
+    assert "https://wp.com/?rest_route=/wp/v2/users&page=2" == route_url(
+        "https://wp.com/?rest_route=/", "/wp/v2/users", {"page": 2}
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_index_and_users_are_streamed():
+    session = FakeSession(make_site("https://wp.com/wp-json/", total_pages=5))
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/", max_pages=4, concurrency=2)
+
+    assert result.available
+    assert "My blog" == result.name
+    assert ["oembed/1.0", "wp/v2"] == result.namespaces
+    assert ["/", "/wp/v2/users"] == result.routes
+    assert 2 == result.routes_count
+    assert 10 == result.users_total
+    assert list(range(1, 9)) == [user.id for user in result.users]
+    assert "user-1" == result.users[0].slug
+    assert not result.truncated
+    assert users_url("https://wp.com/wp-json/", 5) not in session.requests
+    # The index page and first users page are requested alone
+    assert session.max_in_flight <= 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_responses_are_capped():
+    session = FakeSession(make_site("https://wp.com/wp-json/"))
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/", max_bytes=120)
+
+    assert result.available
+    assert result.truncated
+    assert "My blog" == result.name
+    assert 1 == len(result.users)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_plain_permalinks_fallback():
+    root = "https://wp.com/?rest_route=/"
+    session = FakeSession(make_site(root, index_html="<html></html>"))
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/")
+
+    assert root == result.api_root
+    assert 2 == len(result.users)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_off_site_api_root_is_ignored():
+    html = INDEX_HTML.replace("https://wp.com/", "https://evil.com/")
+    session = FakeSession(make_site("https://wp.com/wp-json/", index_html=html))
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/")
+
+    assert "https://wp.com/wp-json/" == result.api_root
+    assert not any("evil.com" in url for url in session.requests)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_scheme_relative_api_root():
+    html = INDEX_HTML.replace("https://wp.com/", "//wp.com/")
+    session = FakeSession(make_site("https://wp.com/wp-json/", index_html=html))
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/")
+
+    assert "https://wp.com/wp-json/" == result.api_root
+    assert 2 == len(result.users)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_non_json_api_is_unavailable():
+    session = FakeSession(
+        {
+            "https://wp.com/": (INDEX_HTML, {}),
+            "https://wp.com/wp-json/": ("<html>Not found</html>", {}),
+        }
+    )
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/")
+
+    assert not result.available
+    assert [] == result.users
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_users_pages_timing_out_truncate_the_listing():
+    root = "https://wp.com/wp-json/"
+    session = FakeSession(make_site(root, total_pages=3), timeouts=[users_url(root, 2)])
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/", concurrency=1)
+
+    assert result.available
+    assert "My blog" == result.name
+    assert [1, 2] == [user.id for user in result.users]
+    assert result.truncated
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("store")
+async def test_throttled_api_is_requested_again():
+    root = "https://wp.com/wp-json/"
+    session = FakeSession(make_site(root), throttled=[route_url(root, "/")])
+    crawler = make_crawler(session)
+
+    result = await crawler.get_rest_api("https://wp.com/")
+
+    assert result.available
+    assert 2 == session.requests.count(route_url(root, "/"))
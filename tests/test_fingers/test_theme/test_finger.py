@@ -1,5 +1,33 @@
-import unittest
+import asyncio
+from unittest import mock
 
+import pytest
 
-class ThemeFingerTestCase(unittest.TestCase):
-    pass
+from wpoke.conf import settings
+from wpoke.exceptions import TargetTimeout
+from wpoke.fingers.theme import ThemeFinger
+from wpoke.store import DataStore, pop_store, push_store
+from wpoke.tls import get_ssl_context
+
+
+@pytest.fixture
+def ssl_enabled():
+    previous = settings.ssl_enabled
+    yield settings
+    settings.ssl_enabled = previous
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("verify", [True, False])
+async def test_ssl_verification_follows_settings(ssl_enabled, verify):
+    ssl_enabled.ssl_enabled = verify
+    session = mock.MagicMock()
+    session.request.side_effect = asyncio.TimeoutError
+    push_store(DataStore())
+    try:
+        with pytest.raises(TargetTimeout):
+            await ThemeFinger(session=session).run("https://wp.com/")
+    finally:
+        pop_store()
+
+    assert get_ssl_context(verify) is session.request.call_args[1]["ssl"]
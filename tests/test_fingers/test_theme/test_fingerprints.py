@@ -0,0 +1,110 @@
+import pytest
+
+from benchmarks.farm import FarmConfig, FarmResolver, start_farm
+from wpoke.batch import poke_many
+from wpoke.client import make_session
+from wpoke.exceptions import BundledThemeException
+from wpoke.fingers import get_installed_fingers
+from wpoke.fingers.theme.fingerprints import (
+    ThemeFingerprints,
+    fingerprint,
+    screenshot_key,
+)
+from wpoke.fingers.theme.models import WPThemeMetadata
+from wpoke.hand import Hand
+from wpoke.metrics import THEME_FINGERPRINTS
+
+THEME_URL = "http://wp.com/wp-content/themes/twentytwenty/"
+
+
+def make_theme(name="Twenty Twenty", version="1.0"):
+    theme = WPThemeMetadata(theme_name=name, version=version)
+    theme.set_featured_image(f"{THEME_URL}screenshot.png")
+    return theme
+
+
+def test_themes_are_copies_without_screenshot():
+    fingerprints = ThemeFingerprints()
+    digest = fingerprint("/* Theme Name: Twenty Twenty */")
+    assert fingerprints.get_theme(digest) is None
+
+    fingerprints.put_theme(digest, make_theme())
+    theme = fingerprints.get_theme(digest)
+    assert "Twenty Twenty" == theme.theme_name
+    assert theme.featured_image is None
+    assert theme is not fingerprints.get_theme(digest)
+
+
+def test_headers_without_metadata_are_remembered():
+    fingerprints = ThemeFingerprints()
+    digest = fingerprint("body { margin: 0; }")
+    fingerprints.put_theme(digest, None)
+    with pytest.raises(BundledThemeException):
+        fingerprints.get_theme(digest)
+
+
+def test_least_recently_used_themes_are_evicted():
+    fingerprints = ThemeFingerprints(max_entries=2)
+    one, two, three = (fingerprint(str(i)) for i in range(3))
+    fingerprints.put_theme(one, make_theme("One"))
+    fingerprints.put_theme(two, make_theme("Two"))
+    assert fingerprints.get_theme(one) is not None
+    fingerprints.put_theme(three, make_theme("Three"))
+
+    assert fingerprints.get_theme(two) is None
+    assert "One" == fingerprints.get_theme(one).theme_name
+    assert "Three" == fingerprints.get_theme(three).theme_name
+
+
+def test_fingerprints_are_kept_on_disk(tmp_path):
+    path = str(tmp_path / "fingerprints.db")
+    digest = fingerprint("/* Theme Name: Twenty Twenty */")
+    fingerprints = ThemeFingerprints(path=path)
+    fingerprints.put_theme(digest, make_theme())
+    fingerprints.put_screenshot(("twentytwenty", "1.0"), "png")
+    fingerprints.close()
+
+    fingerprints = ThemeFingerprints(path=path)
+    try:
+        assert "Twenty Twenty" == fingerprints.get_theme(digest).theme_name
+        assert "png" == fingerprints.get_screenshot(("twentytwenty", "1.0"))
+        assert fingerprints.get_screenshot(("twentytwenty", "1.1")) is None
+    finally:
+        fingerprints.close()
+
+
+def test_screenshots_are_keyed_by_slug_and_version():
+    assert ("twentytwenty", "1.0") == screenshot_key(THEME_URL, make_theme())
+    assert screenshot_key(THEME_URL, make_theme(version=None)) is None
+
+
+async def scan_farm(port, hosts):
+    targets = [f"http://site-{i}.wp.test:{port}/" for i in range(hosts)]
+    async with make_session(resolver=FarmResolver()) as session:
+        hand = Hand(session=session)
+        for spec in get_installed_fingers(["theme"]).values():
+            hand.add_finger_spec(spec)
+        return [result async for result in poke_many(hand, targets, 1)]
+
+
+@pytest.mark.asyncio
+async def test_sites_sharing_a_theme_are_parsed_once():
+    theme_hits = THEME_FINGERPRINTS.labels("theme", "hit").value
+    screenshot_hits = THEME_FINGERPRINTS.labels("screenshot", "hit").value
+
+    config = FarmConfig(hosts=3, themes=1, latency=0, failure_rate=0, redirect_rate=0)
+    runner, port = await start_farm(config)
+    try:
+        results = await scan_farm(port, 3)
+    finally:
+        await runner.cleanup()
+
+    assert all(0 == result.status for result in results)
+    assert 2 == THEME_FINGERPRINTS.labels("theme", "hit").value - theme_hits
+    assert 2 == THEME_FINGERPRINTS.labels("screenshot", "hit").value - screenshot_hits
+    themes = [theme for result in results for theme in result.pokes[0].data]
+    assert 1 == len({theme["theme_name"] for theme in themes})
+    assert sorted(
+        f"http://site-{i}.wp.test:{port}/wp-content/themes/theme-0/screenshot.png"
+        for i in range(3)
+    ) == sorted(theme["featured_image"] for theme in themes)
@@ -0,0 +1,77 @@
+import random
+import time
+
+import pytest
+
+from benchmarks.corpus import pathological_corpus
+from wpoke.client import URL
+from wpoke.exceptions import BundledThemeException
+from wpoke.fingers.theme.crawler import (
+    MAX_THEME_URLS,
+    STYLE_CSS_HEADER_SIZE,
+    THEMES_DIR,
+    extract_info_from_css,
+    extract_theme_path_by_global_regex,
+    iter_theme_urls_in_text,
+    truncate_theme_url,
+)
+
+SITE = URL("https://wpoke.app/")
+# Generous, as a backtracking regex takes minutes on these inputs
+TIME_BOUND = 1.0
+
+
+def timed(func, *args):
+    started_at = time.perf_counter()
+    result = func(*args)
+    assert time.perf_counter() - started_at < TIME_BOUND
+    return result
+
+
+@pytest.mark.parametrize("name, html", pathological_corpus().items())
+def test_global_regex_is_linear_on_pathological_input(name, html):
+    assert timed(extract_theme_path_by_global_regex, SITE, html) == []
+
+
+@pytest.mark.parametrize("name, html", pathological_corpus().items())
+def test_truncate_theme_url_is_bounded_on_pathological_input(name, html):
+    assert timed(truncate_theme_url, html) is None
+
+
+def test_truncate_theme_url_without_theme_directory():
+    assert truncate_theme_url("https://wpoke.app/wp-content/plugins/a/") is None
+    assert truncate_theme_url("https://wpoke.app/wp-content/themes/!/") is None
+
+
+def test_global_regex_results_are_capped():
+    html = "".join(
+        f"<!-- https://wpoke.app/wp-content/themes/theme-{index}/ -->"
+        for index in range(MAX_THEME_URLS * 2)
+    )
+    assert len(extract_theme_path_by_global_regex(SITE, html)) == MAX_THEME_URLS
+
+
+def test_global_regex_does_not_span_tokens():
+    html = "see http://wpoke.app/about then http://wpoke.app/wp-content/themes/k/a.js"
+    assert extract_theme_path_by_global_regex(SITE, html) == [
+        "http://wpoke.app/wp-content/themes/k/"
+    ]
+
+
+def test_css_header_is_looked_up_within_8kb():
+    css = "/*\n" + " " * STYLE_CSS_HEADER_SIZE + "Theme Name: Late\n*/"
+    with pytest.raises(BundledThemeException):
+        timed(extract_info_from_css, css * 100)
+    assert timed(extract_info_from_css, "/*\nTheme Name: Early\n*/" + css * 100)
+
+
+def test_scanner_fuzz():
+    rnd = random.Random(0)
+    pieces = ("//", "http", "https://", THEMES_DIR, "theme", "-", "/", '"', " ", "\n")
+    for _ in range(200):
+        text = "".join(rnd.choice(pieces) for _ in range(rnd.randint(0, 200)))
+        for url in iter_theme_urls_in_text(text):
+            assert THEMES_DIR in url
+            assert url.endswith("/")
+            assert url.lower().startswith(("//", "http"))
+            assert not any(c in url for c in (" ", "\n", '"'))
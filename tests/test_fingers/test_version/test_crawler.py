@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import pytest
+from asynctest import CoroutineMock
+
+from wpoke.client import URL
+from wpoke.exceptions import TargetTimeout
+from wpoke.fingers.theme.crawler import WPThemeMetadataCrawler
+from wpoke.fingers.version.crawler import WPCoreVersionCrawler, detect_core_version
+from wpoke.fingers.version.models import (
+    SOURCE_ASSET_VERSION,
+    SOURCE_FEED_GENERATOR,
+    SOURCE_META_GENERATOR,
+)
+from wpoke.html import HTMLDocument, parse_html
+from wpoke.store import DataStore, pop_store, push_store
+
+
+def detect(html):
+    return detect_core_version(HTMLDocument(html))
+
+
+@pytest.mark.usefixtures("fixture_file_content", autouse=True)
+class TestDetectCoreVersion(unittest.TestCase):
+    def test_every_source_is_gathered(self):
+        html = self.fixture_content("crawlers/version/html/normal.html")
+        result = detect(html)
+
+        self.assertEqual("5.2.4", result.version)
+        evidences = {(e.source, e.version): e.occurrences for e in result.evidences}
+        # jquery and jquery-migrate versions are not core versions
+        self.assertDictEqual(
+            {(SOURCE_META_GENERATOR, "5.2.4"): 1, (SOURCE_ASSET_VERSION, "5.2.4"): 3},
+            evidences,
+        )
+
+    def test_generator_outweighs_asset_versions(self):
+        html = (
+            '<html><head><meta name="generator" content="WordPress 5.3" />'
+            "<script src='/wp-includes/js/a.js?ver=5.2'></script>"
+            "<script src='/wp-includes/js/b.js?ver=5.2'></script></head></html>"
+        )
+        self.assertEqual("5.3", detect(html).version)
+
+    def test_asset_versions_weigh_their_occurrences(self):
+        assets = "".join(
+            f"<script src='/wp-includes/js/{name}.js?ver=6.4'></script>"
+            for name in "abcdefghij"
+        )
+        html = f"<html><head>{assets}<script src='/wp-includes/js/z.js?ver=5.0'>"
+        self.assertEqual("6.4", detect(html).version)
+        html = f"<html><head><script src='/wp-includes/js/z.js?ver=5.0'>{assets}"
+        self.assertEqual("6.4", detect(html).version)
+
+    def test_ties_go_to_the_strongest_source(self):
+        html = (
+            '<html><head><meta name="generator" content="WordPress 5.3" />'
+            + "".join(
+                f"<script src='/wp-includes/js/{name}.js?ver=5.2'></script>"
+                for name in "abc"
+            )
+            + "</head></html>"
+        )
+        self.assertEqual("5.3", detect(html).version)
+
+    def test_feed_generator(self):
+        html = "<html><!-- generator: https://wordpress.org/?v=4.9.10 --></html>"
+        result = detect(html)
+        self.assertEqual("4.9.10", result.version)
+        self.assertEqual(SOURCE_FEED_GENERATOR, result.evidences[0].source)
+
+    def test_no_version_disclosed(self):
+        for html in ("", "<html><body>Hi</body></html>", "\x00\x01\x02"):
+            result = detect(html)
+            self.assertIsNone(result.version)
+            self.assertListEqual([], result.evidences)
+
+
+@pytest.mark.asyncio
+async def test_fingers_share_index_body_and_parsed_tree(read_fixture):
+    html = read_fixture("crawlers/version/html/normal.html")
+    session = CoroutineMock()
+    push_store(DataStore())
+    try:
+        theme_crawler = WPThemeMetadataCrawler(
+            http_session=session, canonical_url=URL("https://normal.wp.com/")
+        )
+        theme_crawler.store.set("INDEX_BODY", html)
+        with mock.patch("wpoke.html.parse_html", wraps=parse_html) as parse:
+            theme_crawler.extract_theme_path_candidates(
+                await theme_crawler.fetch_html_body("https://normal.wp.com/")
+            )
+            version_crawler = WPCoreVersionCrawler(http_session=session)
+            result = await version_crawler.get_core_version("https://normal.wp.com/")
+    finally:
+        pop_store()
+
+    assert "5.2.4" == result.version
+    assert 1 == parse.call_count
+    session.request.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_fingers_share_index_fetch_failures():
+    session = mock.MagicMock()
+    session.request.side_effect = asyncio.TimeoutError
+    push_store(DataStore())
+    try:
+        theme_crawler = WPThemeMetadataCrawler(http_session=session)
+        with pytest.raises(TargetTimeout):
+            await theme_crawler.get_theme("https://down.wp.com/")
+        version_crawler = WPCoreVersionCrawler(http_session=session)
+        with pytest.raises(TargetTimeout):
+            await version_crawler.get_core_version("https://down.wp.com/")
+    finally:
+        pop_store()
+
+    assert 1 == session.request.call_count
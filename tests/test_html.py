@@ -0,0 +1,37 @@
+import pytest
+
+from wpoke.exceptions import DuplicatedXPathException
+from wpoke.html import HTMLDocument, get_xpath, parse_html, register_xpath
+
+register_xpath("tests.titles", "//title/text()")
+
+
+def test_register_xpath_is_idempotent_for_same_expression():
+    assert register_xpath("tests.titles", "//title/text()") is get_xpath("tests.titles")
+
+
+def test_register_xpath_conflict_raises():
+    with pytest.raises(DuplicatedXPathException):
+        register_xpath("tests.titles", "//h1/text()")
+
+
+def test_document_is_parsed_lazily():
+    document = HTMLDocument("<html><head><title>wp</title></head></html>")
+    assert not document.is_parsed
+    assert document.xpath("tests.titles") == ["wp"]
+    assert document.is_parsed
+
+
+@pytest.mark.parametrize("html", ["", "   \n"])
+def test_empty_document_matches_nothing(html):
+    document = HTMLDocument(html)
+    assert document.tree is None
+    assert document.xpath("tests.titles") == []
+
+
+def test_deeply_nested_document_is_parsed():
+    html = "<div>" * 100000 + "<title>deep</title>"
+    tree = parse_html(html)
+    assert tree is not None
+    depth = max(len(list(element.iterancestors())) for element in tree.iter())
+    assert depth <= 256
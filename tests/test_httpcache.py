@@ -0,0 +1,114 @@
+import pytest
+
+from benchmarks.farm import FarmConfig, FarmResolver, start_farm
+from wpoke.batch import poke_many
+from wpoke.client import make_session
+from wpoke.conf import settings
+from wpoke.fingers import get_installed_fingers
+from wpoke.hand import Hand
+from wpoke.httpcache import HTTPCache, close_http_cache, get_http_cache
+from wpoke.metrics import HTTP_CACHE, HTTP_CACHE_SAVED_BYTES
+
+URL = "http://wp.com/wp-content/themes/twentytwenty/style.css"
+
+
+@pytest.fixture
+def http_cache_settings():
+    previous = (settings.http_cache, settings.profile)
+    yield settings
+    settings.http_cache, settings.profile = previous
+    close_http_cache()
+
+
+def test_only_responses_with_validators_are_stored(tmp_path):
+    cache = HTTPCache(str(tmp_path / "http.db"))
+    cache.store(URL, 200, "body", {})
+    assert cache.get(URL) is None
+    cache.store(URL, 404, "body", {"ETag": '"a"'})
+    assert cache.get(URL) is None
+
+    cache.store(URL, 200, "body", {"ETag": '"a"', "Last-Modified": "yesterday"})
+    cached = cache.get(URL)
+    assert "body" == cached.body
+    assert {
+        "If-None-Match": '"a"',
+        "If-Modified-Since": "yesterday",
+    } == cached.conditional_headers()
+
+    cache.store(URL, 200, "other body", {})
+    assert cache.get(URL) is None
+    cache.close()
+
+
+def test_parses_are_dropped_along_with_their_body(tmp_path):
+    cache = HTTPCache(str(tmp_path / "http.db"))
+    cache.set_parsed(URL, {"theme_name": "Orphan"})
+    assert cache.get_parsed(URL) is None
+
+    cache.store(URL, 200, "body", {"ETag": '"a"'})
+    cache.set_parsed(URL, {"theme_name": "Twenty Twenty"})
+    assert {"theme_name": "Twenty Twenty"} == cache.get_parsed(URL)
+    cache.revalidated(URL, cache.get(URL))
+    assert {"theme_name": "Twenty Twenty"} == cache.get_parsed(URL)
+
+    cache.store(URL, 200, "new body", {"ETag": '"b"'})
+    assert cache.get_parsed(URL) is None
+    cache.close()
+
+
+def test_entries_not_revalidated_for_long_are_deleted(tmp_path):
+    path = str(tmp_path / "http.db")
+    cache = HTTPCache(path, clock=lambda: 1000)
+    cache.store(URL, 200, "body", {"ETag": '"a"'})
+    cache.close()
+
+    cache = HTTPCache(path, max_age=60, clock=lambda: 1100)
+    assert cache.get(URL) is None
+    cache.close()
+
+
+def test_cache_follows_settings(http_cache_settings, tmp_path):
+    http_cache_settings.http_cache = None
+    assert get_http_cache() is None
+
+    http_cache_settings.http_cache = str(tmp_path / "one.db")
+    cache = get_http_cache()
+    assert cache is get_http_cache()
+    http_cache_settings.http_cache = str(tmp_path / "two.db")
+    assert str(tmp_path / "two.db") == get_http_cache().path
+
+
+async def scan_farm(port, hosts):
+    targets = [f"http://site-{i}.wp.test:{port}/" for i in range(hosts)]
+    async with make_session(resolver=FarmResolver()) as session:
+        hand = Hand(session=session)
+        for spec in get_installed_fingers(["theme"]).values():
+            hand.add_finger_spec(spec)
+        return [result async for result in poke_many(hand, targets, hosts)]
+
+
+def themes(results):
+    return sorted(str(result.pokes[0].data) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_rescans_revalidate_style_css(http_cache_settings, tmp_path):
+    http_cache_settings.http_cache = str(tmp_path / "http.db")
+    http_cache_settings.profile = True
+    not_modified = HTTP_CACHE.labels("not_modified").value
+    saved_bytes = HTTP_CACHE_SAVED_BYTES.labels().value
+
+    config = FarmConfig(hosts=3, latency=0, failure_rate=0, redirect_rate=0)
+    runner, port = await start_farm(config)
+    try:
+        first = await scan_farm(port, 3)
+        second = await scan_farm(port, 3)
+    finally:
+        await runner.cleanup()
+
+    assert all(0 == result.status for result in first + second)
+    assert themes(first) == themes(second)
+    assert 3 == HTTP_CACHE.labels("not_modified").value - not_modified
+    assert HTTP_CACHE_SAVED_BYTES.labels().value > saved_bytes
+    assert all("css_parse" in result.stage_timings for result in first)
+    assert not any("css_parse" in result.stage_timings for result in second)
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from wpoke.journal import CheckpointJournal, JOURNAL_STATUS_OK, JOURNAL_STATUS_FAILED
+
+
+class CheckpointJournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "scan.journal")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_records_are_found_after_reopening(self):
+        with CheckpointJournal(self.path) as journal:
+            journal.record("https://a.wp.com", JOURNAL_STATUS_OK)
+            journal.record("https://b.wp.com", JOURNAL_STATUS_FAILED)
+
+        with CheckpointJournal(self.path) as journal:
+            self.assertEqual(2, len(journal))
+            self.assertTrue(journal.is_done("https://a.wp.com"))
+            self.assertEqual(JOURNAL_STATUS_FAILED, journal.status("https://b.wp.com"))
+            self.assertFalse(journal.is_done("https://c.wp.com"))
+
+    def test_uncommitted_records_are_replayed_from_journal(self):
+        journal = CheckpointJournal(self.path, commit_every=1000)
+        journal.open()
+        journal.record("https://a.wp.com", JOURNAL_STATUS_OK)
+        # Simulate a crash: the index is never committed
+        journal._journal.close()
+        journal._index.close()
+
+        with CheckpointJournal(self.path) as journal:
+            self.assertTrue(journal.is_done("https://a.wp.com"))
+
+    def test_torn_trailing_line_is_truncated(self):
+        with CheckpointJournal(self.path) as journal:
+            journal.record("https://a.wp.com", JOURNAL_STATUS_OK)
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as fd:
+            fd.write(b'{"target": "https://b.wp')
+
+        with CheckpointJournal(self.path) as journal:
+            self.assertEqual(1, len(journal))
+            self.assertFalse(journal.is_done("https://b.wp.com"))
+            journal.record("https://c.wp.com", JOURNAL_STATUS_OK)
+
+        self.assertGreater(os.path.getsize(self.path), size)
+        with CheckpointJournal(self.path) as journal:
+            self.assertEqual(2, len(journal))
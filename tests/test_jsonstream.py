@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from wpoke.jsonstream import JSONStreamError, JSONStreamParser, parse_chunks
+
+DOCUMENT = {
+    "name": "My blog",
+    "namespaces": ["oembed/1.0", "wp/v2"],
+    "routes": {"/": {"methods": ["GET"]}, "/wp/v2/users": {"args": {"page": 1}}},
+    "ratio": -1.5e2,
+    "flags": [True, False, None],
+    "escaped": 'say "hi" \\ café ☃',
+}
+
+
+def chunked(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_events_do_not_depend_on_chunk_boundaries(size):
+    text = json.dumps(DOCUMENT)
+    assert list(parse_chunks([text])) == list(parse_chunks(chunked(text, size)))
+
+
+def test_values_and_prefixes():
+    events = list(parse_chunks([json.dumps(DOCUMENT)]))
+
+    assert ("name", "string", "My blog") in events
+    assert ("routes", "map_key", "/wp/v2/users") in events
+    assert ("routes./wp/v2/users.args.page", "number", 1) in events
+    assert ("ratio", "number", -150.0) in events
+    assert ("flags.item", "null", None) in events
+    assert ("escaped", "string", DOCUMENT["escaped"]) in events
+    namespaces = [v for p, e, v in events if p == "namespaces.item"]
+    assert DOCUMENT["namespaces"] == namespaces
+
+
+def test_long_strings_are_not_kept():
+    parser = JSONStreamParser(max_string_length=8)
+    events = list(parser.feed('["short", "' + "x" * 100 + '"]'))
+    events.extend(parser.close())
+    assert [("item", "string", "short"), ("item", "string", None)] == events[1:3]
+
+
+@pytest.mark.parametrize(
+    "text", ['{"a" 1}', "[1,]", '{"a": 1}}', "[1", "tru", "{1: 2}", '"open', ""]
+)
+def test_malformed_documents_raise(text):
+    with pytest.raises(JSONStreamError):
+        list(parse_chunks([text]))
+
+
+def test_max_depth():
+    with pytest.raises(JSONStreamError):
+        list(parse_chunks(["[" * 10], max_depth=5))
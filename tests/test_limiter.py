@@ -0,0 +1,121 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from wpoke.batch import poke_many
+from wpoke.exceptions import MalformedBodyException, TargetTimeout
+from wpoke.fingers.theme import ThemeFinger
+from wpoke.hand import Hand
+from wpoke.limiter import AdaptiveLimiter, is_congested
+from wpoke.metrics import FINGER_OUTCOMES
+from wpoke.models import FingerResult, HandResult
+
+
+def make_result(error_type=None):
+    poke = FingerResult()
+    poke.error_type = error_type
+    result = HandResult()
+    result.status = int(error_type is not None)
+    result.pokes = [poke]
+    return result
+
+
+def run_window(limiter, latency=0.1, congested=False):
+    for _ in range(max(limiter.window, limiter.limit)):
+        limiter.started()
+    for _ in range(max(limiter.window, limiter.limit)):
+        limiter.finished(latency, congested)
+
+
+def test_is_congested():
+    assert is_congested(make_result(TargetTimeout))
+    assert not is_congested(make_result(MalformedBodyException))
+    assert not is_congested(make_result())
+
+
+@pytest.mark.asyncio
+async def test_theme_timeouts_are_congestion():
+    session = mock.MagicMock()
+    session.request.side_effect = asyncio.TimeoutError
+    hand = Hand(session=session)
+    hand.add_finger(ThemeFinger)
+    timeouts = FINGER_OUTCOMES.labels("theme_metadata", "TargetTimeout").value
+    limiter = AdaptiveLimiter(initial=4, window=4)
+
+    targets = [f"https://{i}.wp.com/" for i in range(8)]
+    results = [r async for r in poke_many(hand, targets, limiter=limiter)]
+
+    assert all(is_congested(result) for result in results)
+    assert (
+        8 == FINGER_OUTCOMES.labels("theme_metadata", "TargetTimeout").value - timeouts
+    )
+    assert 1.0 == limiter.stats.error_rate
+
+
+def test_limit_doubles_then_grows_additively():
+    limiter = AdaptiveLimiter(initial=4, window=10, max_limit=100)
+    run_window(limiter)
+    assert 8 == limiter.limit
+    run_window(limiter)
+    assert 16 == limiter.limit
+
+    run_window(limiter, congested=True)
+    assert 11 == limiter.limit
+    run_window(limiter)
+    run_window(limiter)
+    assert 18 == limiter.limit
+
+
+def test_limit_grows_only_when_reached():
+    limiter = AdaptiveLimiter(initial=4, window=10)
+    for _ in range(10):
+        limiter.started()
+        limiter.finished(0.1, False)
+    assert 4 == limiter.limit
+
+
+def test_limit_backs_off_on_latency():
+    limiter = AdaptiveLimiter(initial=20, window=10)
+    run_window(limiter, latency=0.1)
+    run_window(limiter, latency=0.5)
+    assert 28 == limiter.limit
+    assert 1 == limiter.stats.decreases
+    assert 0.5 == limiter.stats.latency_p90
+
+
+def test_limit_is_bounded():
+    limiter = AdaptiveLimiter(initial=4, window=10, min_limit=2, max_limit=6)
+    run_window(limiter)
+    assert 6 == limiter.limit
+    for _ in range(5):
+        run_window(limiter, congested=True)
+    assert 2 == limiter.limit
+
+
+class LinkHand:
+    """ Scans get slower past `capacity` of them in flight, and time out past
+    twice as many """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.in_flight = 0
+
+    async def poke(self, target):
+        self.in_flight += 1
+        load = self.in_flight / self.capacity
+        await asyncio.sleep(0.002 * max(1.0, load))
+        self.in_flight -= 1
+        return make_result(TargetTimeout if load > 2 else None)
+
+
+@pytest.mark.asyncio
+async def test_poke_many_converges_to_link_capacity():
+    limiter = AdaptiveLimiter(initial=2, window=10, max_limit=1000)
+    targets = (f"https://{i}.wp.com/" for i in range(3000))
+
+    results = [r async for r in poke_many(LinkHand(32), targets, limiter=limiter)]
+
+    assert 3000 == len(results)
+
+    assert 16 <= limiter.limit <= 96
@@ -0,0 +1,172 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from benchmarks.farm import FarmConfig, FarmResolver, start_farm
+from wpoke.batch import poke_many
+from wpoke.client import make_session
+from wpoke.conf import settings
+from wpoke.exceptions import DuplicatedMetricException
+from wpoke.fingers import get_installed_fingers
+from wpoke.hand import Hand
+from wpoke.metrics import (
+    BYTES_DOWNLOADED,
+    CONNECTIONS,
+    FINGER_OUTCOMES,
+    REQUEST_PHASES,
+    SCANS_IN_FLIGHT,
+    TARGETS_FINISHED,
+    TARGETS_STARTED,
+    MetricsFileWriter,
+    MetricsRegistry,
+    MetricsServer,
+    is_exporting,
+    registry,
+)
+
+
+@pytest.fixture
+def metrics_settings():
+    previous = settings.metrics_file
+    yield settings
+    settings.metrics_file = previous
+
+
+def test_counters_and_gauges_are_rendered():
+    metrics = MetricsRegistry()
+    requests = metrics.counter("requests_total", "Requests", ["code"])
+    requests.labels("200").inc()
+    requests.labels("200").inc(2)
+    requests.labels('"5xx"\n').inc()
+    in_flight = metrics.gauge("in_flight", "In flight")
+    in_flight.inc(3)
+    in_flight.dec()
+
+    assert metrics.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{code="200"} 3\n'
+        'requests_total{code="\\"5xx\\"\\n"} 1\n'
+        "# HELP in_flight In flight\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 2\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = MetricsRegistry()
+    latency = metrics.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+
+    lines = metrics.render().splitlines()[2:]
+    assert lines == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_metrics_are_registered_once():
+    metrics = MetricsRegistry()
+    metrics.counter("scans_total", "Scans")
+    with pytest.raises(DuplicatedMetricException):
+        metrics.gauge("scans_total", "Scans")
+
+
+def test_label_values_must_match_label_names():
+    metrics = MetricsRegistry()
+    outcomes = metrics.counter("outcomes_total", "Outcomes", ["finger", "outcome"])
+    with pytest.raises(ValueError):
+        outcomes.labels("theme")
+
+
+def test_values_can_be_read_from_functions():
+    metrics = MetricsRegistry()
+    limit = metrics.gauge("limit", "Limit")
+    limit.set(5)
+    limit.set_function(lambda: 42)
+    handshakes = metrics.counter("handshakes_total", "Handshakes", ["kind"])
+    handshakes.set_function(lambda: {("full",): 1, ("resumed",): 2})
+
+    rendered = metrics.render()
+    assert "limit 42\n" in rendered
+    assert 'handshakes_total{kind="full"} 1\n' in rendered
+    assert 'handshakes_total{kind="resumed"} 2\n' in rendered
+
+
+def test_metrics_are_served_over_http():
+    metrics = MetricsRegistry()
+    metrics.counter("scans_total", "Scans").inc()
+    server = MetricsServer(0, registry=metrics).start()
+    base_url = f"http://127.0.0.1:{server.port}"
+    try:
+        with urllib.request.urlopen(f"{base_url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert b"scans_total 1\n" in response.read()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base_url}/")
+        assert 404 == error.value.code
+    finally:
+        server.stop()
+
+
+def test_metrics_are_written_to_file_when_stopped(tmp_path):
+    path = str(tmp_path / "wpoke.prom")
+    metrics = MetricsRegistry()
+    scans = metrics.counter("scans_total", "Scans")
+    writer = MetricsFileWriter(path, interval=60, registry=metrics).start()
+    scans.inc()
+    writer.stop()
+
+    with open(path) as fd:
+        assert "scans_total 1\n" in fd.read()
+
+
+def sample(metric, *label_values):
+    return metric.labels(*label_values).value
+
+
+def observations(histogram, *label_values):
+    return sum(histogram.labels(*label_values).counts)
+
+
+@pytest.mark.asyncio
+async def test_scans_update_metrics(metrics_settings, tmp_path):
+    metrics_settings.metrics_file = str(tmp_path / "wpoke.prom")
+    assert is_exporting()
+    before = {
+        "started": sample(TARGETS_STARTED),
+        "ok": sample(TARGETS_FINISHED, "ok"),
+        "theme": sample(FINGER_OUTCOMES, "theme_metadata", "ok"),
+        "headers": observations(REQUEST_PHASES, "headers"),
+        "bytes": sample(BYTES_DOWNLOADED),
+        "connections": sample(CONNECTIONS, "new") + sample(CONNECTIONS, "reused"),
+    }
+
+    config = FarmConfig(hosts=3, latency=0, failure_rate=0, redirect_rate=0)
+    runner, port = await start_farm(config)
+    try:
+        targets = [f"http://site-{i}.wp.test:{port}/" for i in range(3)]
+        async with make_session(resolver=FarmResolver()) as session:
+            hand = Hand(session=session)
+            for spec in get_installed_fingers(["theme"]).values():
+                hand.add_finger_spec(spec)
+            results = [result async for result in poke_many(hand, targets, 3)]
+    finally:
+        await runner.cleanup()
+
+    assert all(0 == result.status for result in results)
+    assert 3 == sample(TARGETS_STARTED) - before["started"]
+    assert 3 == sample(TARGETS_FINISHED, "ok") - before["ok"]
+    assert 3 == sample(FINGER_OUTCOMES, "theme_metadata", "ok") - before["theme"]
+    assert 0 == sample(SCANS_IN_FLIGHT)
+    # Index, style.css and screenshot probes of every target
+    assert observations(REQUEST_PHASES, "headers") - before["headers"] >= 9
+    assert sample(BYTES_DOWNLOADED) > before["bytes"]
+    connections = sample(CONNECTIONS, "new") + sample(CONNECTIONS, "reused")
+    assert connections - before["connections"] >= 9
+    assert "wpoke_request_phase_seconds_bucket" in registry.render()
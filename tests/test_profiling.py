@@ -0,0 +1,125 @@
+import asyncio
+import pstats
+
+import pytest
+
+from benchmarks.farm import FarmConfig, FarmResolver, start_farm
+from wpoke.batch import poke_many
+from wpoke.client import make_session
+from wpoke.conf import settings
+from wpoke.fingers import get_installed_fingers
+from wpoke.hand import Hand
+from wpoke.profiling import (
+    STAGES,
+    StageProfile,
+    Stages,
+    StageTimings,
+    record_stages,
+    run_profiler,
+    serialize_result,
+    stage,
+)
+from wpoke.tracing import NULL_SPAN
+
+
+@pytest.fixture
+def profile_settings():
+    previous = settings.profile
+    yield settings
+    settings.profile = previous
+
+
+def test_stages_are_not_recorded_unless_profiling():
+    assert stage(Stages.CSS_PARSE) is NULL_SPAN
+
+
+async def scan_farm(hosts):
+    config = FarmConfig(hosts=hosts, latency=0, failure_rate=0, redirect_rate=0)
+    runner, port = await start_farm(config)
+    results = []
+    try:
+        targets = [f"http://site-{i}.wp.test:{port}/" for i in range(hosts)]
+        async with make_session(resolver=FarmResolver()) as session:
+            hand = Hand(session=session)
+            for spec in get_installed_fingers(["theme"]).values():
+                hand.add_finger_spec(spec)
+            async for result in poke_many(hand, targets, hosts):
+                results.append(result)
+    finally:
+        await runner.cleanup()
+    return results
+
+
+@pytest.mark.asyncio
+async def test_results_have_no_timings_unless_profiling():
+    (result,) = await scan_farm(1)
+    assert result.stage_timings is None
+    assert "stage_timings" not in serialize_result(result)
+
+
+@pytest.mark.asyncio
+async def test_stages_add_up_across_tasks():
+    async def fetch():
+        with stage(Stages.STYLE_CSS_FETCH):
+            await asyncio.sleep(0.01)
+
+    with record_stages() as timings:
+        await asyncio.gather(fetch(), fetch())
+        with stage(Stages.CSS_PARSE):
+            pass
+
+    assert {"style_css_fetch", "css_parse"} == set(timings)
+    assert timings["style_css_fetch"] >= 0.02
+    assert stage(Stages.CSS_PARSE) is NULL_SPAN
+
+
+def test_stage_profile_sums_up_scans():
+    profile = StageProfile()
+    profile.add({"index_fetch": 0.3, "css_parse": 0.1})
+    profile.add({"index_fetch": 0.5})
+    profile.add(None)
+
+    summary = profile.summary()
+    assert 2 == profile.scans
+    assert ["index_fetch", "css_parse"] == list(summary)
+    assert pytest.approx(0.8) == summary["index_fetch"]["total"]
+    assert pytest.approx(0.4) == summary["index_fetch"]["mean"]
+    assert pytest.approx(0.5) == summary["index_fetch"]["max"]
+    assert pytest.approx(0.8 / 0.9, rel=1e-3) == summary["index_fetch"]["share"]
+    assert "index_fetch" in profile.format()
+
+
+@pytest.mark.asyncio
+async def test_scans_are_profiled_stage_by_stage(profile_settings):
+    profile_settings.profile = True
+    results = await scan_farm(2)
+
+    assert 2 == len(results)
+    for result in results:
+        assert 0 == result.status
+        assert isinstance(result.stage_timings, StageTimings)
+        data = serialize_result(result)
+        assert set(STAGES) == set(data["stage_timings"])
+
+
+@pytest.mark.parametrize("kind", ["cprofile", "sample"])
+def test_run_profiler_saves_profile(kind, tmp_path):
+    path = str(tmp_path / "profile")
+
+    def busy():
+        return sum(i * i for i in range(200000))
+
+    with run_profiler(kind, path, interval=0.001):
+        for _ in range(20):
+            busy()
+
+    if kind == "cprofile":
+        stats = pstats.Stats(path)
+        assert any(name == "busy" for _, _, name in stats.stats)
+    else:
+        with open(path) as fd:
+            lines = fd.read().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert stack.startswith("MainThread;")
+        assert int(count) > 0
@@ -0,0 +1,71 @@
+import asyncio
+import os
+from collections import defaultdict
+
+from wpoke.batch import STATUS_ERROR
+from wpoke.finger import BaseFinger
+from wpoke.fingers.loading import FingerSpec
+from wpoke.runner import ShardedRunner, shard_for
+
+PID_FINGER = FingerSpec(name="pid", path="tests.test_runner:PidFinger")
+
+
+class PidFinger(BaseFinger):
+    """ Reports the process it ran on. Kills it on targets asking to """
+
+    class Meta:
+        name = "pid"
+
+    async def run(self, target, **options):
+        if "die" in target:
+            os._exit(1)
+        await asyncio.sleep(0.01)
+        return {"pid": os.getpid()}
+
+    def render(self, result, fmt=None, **kwargs):
+        pass
+
+
+def pid_of(result):
+    return result.data["pokes"][0]["data"]["pid"]
+
+
+def test_targets_of_a_host_share_shard():
+    assert shard_for("https://a.wp.com/blog", 8) == shard_for("http://A.wp.com", 8)
+    assert {shard_for(f"https://{i}.wp.com", 4) for i in range(100)} == set(range(4))
+
+
+def test_runner_shards_targets_by_host():
+    targets = [f"https://{i % 6}.wp.com/{i}" for i in range(30)]
+    runner = ShardedRunner([PID_FINGER], workers=3)
+
+    results = list(runner.run(targets))
+
+    assert sorted(targets) == sorted(result.target for result in results)
+    assert all(result.status == 0 for result in results)
+    pids_by_host = defaultdict(set)
+    for result in results:
+        pids_by_host[result.target.split("/")[2]].add(pid_of(result))
+    assert all(len(pids) == 1 for pids in pids_by_host.values())
+    assert os.getpid() not in {pid_of(result) for result in results}
+
+
+def test_ordered_runner_yields_in_input_order():
+    targets = [f"https://{i}.wp.com/" for i in range(20)]
+    runner = ShardedRunner([PID_FINGER], workers=2, ordered=True)
+
+    assert targets == [result.target for result in runner.run(targets)]
+
+
+def test_dead_worker_does_not_take_the_run_down():
+    targets = [f"https://{i}.wp.com/" for i in range(20)]
+    targets.insert(5, "https://die.wp.com/")
+    runner = ShardedRunner([PID_FINGER], workers=2)
+
+    results = list(runner.run(targets))
+
+    assert sorted(targets) == sorted(result.target for result in results)
+    statuses = {result.target: result.status for result in results}
+    assert STATUS_ERROR == statuses["https://die.wp.com/"]
+    # The surviving worker went on scanning the whole batch
+    assert sum(status == 0 for status in statuses.values()) >= 10
@@ -0,0 +1,161 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from wpoke.batch import poke_many
+from wpoke.crawler import BaseCrawler
+from wpoke.models import HandResult
+from wpoke.scheduler import HostScheduler, parse_retry_after, set_scheduler
+
+
+@pytest.fixture
+def scheduler():
+    def install(**kwargs):
+        scheduler = HostScheduler(**kwargs)
+        set_scheduler(scheduler)
+        return scheduler
+
+    yield install
+    set_scheduler(None)
+
+
+class FakeResponse:
+    def __init__(self, url, status, headers=None):
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+        self.charset = "utf8"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def text(self):
+        return "body"
+
+
+class ThrottlingSession:
+    """ Answers 429 to the first request, then 200 """
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        self.requested_at = []
+
+    def request(self, method, url, **kwargs):
+        self.requested_at.append(asyncio.get_event_loop().time())
+        if len(self.requested_at) == 1:
+            return FakeResponse(url, 429, {"Retry-After": self.retry_after})
+        return FakeResponse(url, 200)
+
+
+def test_parse_retry_after():
+    now = datetime(2020, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+    assert 120 == parse_retry_after("120")
+    assert 30 == parse_retry_after("Wed, 01 Jan 2020 00:00:30 GMT", now)
+    assert 0 == parse_retry_after("Tue, 31 Dec 2019 00:00:00 GMT", now)
+    assert 0 == parse_retry_after("soon")
+    assert 0 == parse_retry_after(None)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_per_host(scheduler):
+    host_scheduler = scheduler(rate=50, burst=1)
+    loop = asyncio.get_event_loop()
+
+    async def request(url):
+        async with host_scheduler.slot(url):
+            pass
+
+    started_at = loop.time()
+    await asyncio.gather(*(request(f"https://{i}.wp.com/") for i in range(10)))
+    assert loop.time() - started_at < 0.05
+
+    started_at = loop.time()
+    await asyncio.gather(*(request(f"https://wp.com/{i}") for i in range(6)))
+    assert loop.time() - started_at >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_per_host(scheduler):
+    host_scheduler = scheduler(concurrency=2)
+    in_flight = max_in_flight = 0
+
+    async def request(url):
+        nonlocal in_flight, max_in_flight
+        async with host_scheduler.slot(url):
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    await asyncio.gather(*(request("https://wp.com/") for _ in range(8)))
+    assert 2 == max_in_flight
+
+
+@pytest.mark.asyncio
+async def test_new_hosts_are_tracked_when_every_host_is_busy(scheduler):
+    host_scheduler = scheduler(concurrency=1, max_hosts=1)
+    in_flight = max_in_flight = 0
+
+    async def request(url):
+        nonlocal in_flight, max_in_flight
+        async with host_scheduler.slot(url):
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async with host_scheduler.slot("https://a.wp.com/"):
+        await asyncio.gather(*(request("https://b.wp.com/") for _ in range(4)))
+    assert 1 == max_in_flight
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honoured(scheduler):
+    host_scheduler = scheduler()
+    session = ThrottlingSession(retry_after="1")
+    crawler = BaseCrawler(session)
+
+    status, _ = await crawler._do_request("https://wp.com/")
+
+    assert 200 == status
+    assert 2 == len(session.requested_at)
+    assert session.requested_at[1] - session.requested_at[0] >= 0.99
+    assert not host_scheduler.is_throttled("https://wp.com/")
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_is_not_waited_for(scheduler):
+    host_scheduler = scheduler()
+    crawler = BaseCrawler(ThrottlingSession(retry_after="3600"))
+
+    status, _ = await crawler._do_request("https://wp.com/")
+
+    assert 429 == status
+    assert host_scheduler.is_throttled("https://wp.com/a")
+    assert not host_scheduler.is_throttled("https://other.wp.com/")
+
+
+class FakeHand:
+    async def poke(self, target):
+        await asyncio.sleep(0.01)
+        result = HandResult()
+        result.target = target
+        result.status = 0
+        return result
+
+
+@pytest.mark.asyncio
+async def test_poke_many_serves_idle_hosts_first(scheduler):
+    host_scheduler = scheduler()
+    host_scheduler.block("slow.wp.com", 0.1)
+    targets = [f"https://slow.wp.com/{i}" for i in range(3)]
+    targets += [f"https://{i}.wp.com/" for i in range(4)]
+
+    results = [r.target async for r in poke_many(FakeHand(), targets, 2)]
+
+    assert sorted(targets[3:]) == sorted(results[:4])
+    assert sorted(targets[:3]) == sorted(results[4:])
@@ -0,0 +1,160 @@
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.farm import FarmConfig, FarmResolver, start_farm
+from wpoke.cache import ResultCache
+from wpoke.client import make_session
+from wpoke.exceptions import InvalidJobException
+from wpoke.fingers import get_installed_fingers
+from wpoke.metrics import RESULT_CACHE
+from wpoke.service import JOB_DONE, ScanService, make_app
+
+
+async def start_service(hosts=3, **kwargs):
+    """ Service scanning a farm, along with what tears them down """
+    config = FarmConfig(hosts=hosts, latency=0, failure_rate=0, redirect_rate=0)
+    farm, port = await start_farm(config)
+    session = make_session(resolver=FarmResolver())
+    fingers = get_installed_fingers(["theme"])
+    service = ScanService(fingers, workers=2, session=session, **kwargs)
+    client = TestClient(TestServer(make_app(service)))
+    await client.start_server()
+
+    async def close():
+        await client.close()
+        await session.close()
+        await farm.cleanup()
+
+    targets = [f"http://site-{i}.wp.test:{port}/" for i in range(hosts)]
+    return client, service, targets, close
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_waited_for():
+    client, service, targets, close = await start_service()
+    try:
+        response = await client.post("/scans?wait=1", json={"targets": targets})
+        assert 200 == response.status
+        job = await response.json()
+    finally:
+        await close()
+
+    assert JOB_DONE == job["status"]
+    assert ["theme"] == job["fingers"]
+    assert 3 == job["finished"]
+    assert set(targets) == {result["target"] for result in job["results"]}
+    assert all(0 == result["status"] for result in job["results"])
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_polled_and_streamed():
+    client, service, targets, close = await start_service()
+    try:
+        response = await client.post("/scans", json={"target": targets[0]})
+        assert 202 == response.status
+        job = await response.json()
+        assert f"/scans/{job['id']}" == response.headers["Location"]
+        assert "results" not in job
+
+        response = await client.get(f"/scans/{job['id']}/results")
+        assert response.content_type == "application/x-ndjson"
+        lines = (await response.text()).splitlines()
+
+        response = await client.get(f"/scans/{job['id']}")
+        polled = await response.json()
+    finally:
+        await close()
+
+    (result,) = [json.loads(line) for line in lines]
+    assert targets[0] == result["target"]
+    assert JOB_DONE == polled["status"]
+    assert [result] == polled["results"]
+
+
+@pytest.mark.asyncio
+async def test_invalid_jobs_are_rejected():
+    client, service, targets, close = await start_service(hosts=1)
+    try:
+        bodies = [
+            {"targets": []},
+            {"targets": "http://wpoke.app/"},
+            {"target": "http://127.0.0.1/"},
+            {"target": targets[0], "fingers": ["nope"]},
+        ]
+        for body in bodies:
+            response = await client.post("/scans", json=body)
+            assert 400 == response.status, body
+        response = await client.post("/scans", data="not json")
+        assert 400 == response.status
+        response = await client.get("/scans/unknown")
+        assert 404 == response.status
+    finally:
+        await close()
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_rejected_when_busy():
+    client, service, targets, close = await start_service(max_queued=3)
+    try:
+        response = await client.post("/scans", json={"targets": targets})
+        assert 202 == response.status
+        # Two targets at most are being scanned, the rest is still queued
+        response = await client.post("/scans", json={"targets": targets})
+        assert 503 == response.status
+        assert "Retry-After" in response.headers
+    finally:
+        await close()
+
+
+@pytest.mark.asyncio
+async def test_jobs_larger_than_the_queue_are_rejected():
+    client, service, targets, close = await start_service(max_queued=2)
+    try:
+        response = await client.post("/scans", json={"targets": targets})
+        assert 400 == response.status
+        assert "Retry-After" not in response.headers
+    finally:
+        await close()
+
+
+@pytest.mark.asyncio
+async def test_service_shares_warm_hands():
+    client, service, targets, close = await start_service(hosts=2)
+    try:
+        for target in targets:
+            job = service.submit([target])
+            await job.wait()
+        response = await client.get("/metrics")
+        metrics = await response.text()
+    finally:
+        await close()
+
+    assert 1 == len(service.pool._hands)
+    assert "wpoke_targets_finished_total" in metrics
+
+
+def test_fingers_are_validated():
+    service = ScanService(get_installed_fingers(["theme"]))
+    assert ("theme",) == service._select_fingers(None)
+    assert ("theme",) == service._select_fingers(["theme", "theme"])
+    with pytest.raises(InvalidJobException):
+        service._select_fingers("theme")
+    with pytest.raises(InvalidJobException):
+        service._select_fingers(["nope"])
+
+
+@pytest.mark.asyncio
+async def test_repeated_jobs_are_served_from_cache():
+    client, service, targets, close = await start_service(hosts=1, cache=ResultCache())
+    hits = RESULT_CACHE.labels("hit").value
+    try:
+        for _ in range(2):
+            response = await client.post("/scans?wait=1", json={"target": targets[0]})
+            job = await response.json()
+    finally:
+        await close()
+
+    assert 0 == job["results"][0]["status"]
+    assert 1 == RESULT_CACHE.labels("hit").value - hits
@@ -1,7 +1,10 @@
-from unittest import TestCase
+import asyncio
+from unittest import TestCase, mock
+
+import pytest
 
 from wpoke.exceptions import DataStoreAttributeNotFound
-from wpoke.store import DataStore
+from wpoke.store import DataStore, peek_store, pop_store, push_store
 
 
 class StoreTestCase(TestCase):
@@ -92,3 +95,74 @@ class StoreTestCase(TestCase):
         self.assertEqual(3, len(self.store.keys()))
         self.store.clear()
         self.assertEqual(0, len(self.store.keys()))
+
+    def test_setattr_is_stored(self):
+        self.store.index_body = "<html></html>"
+        self.assertTrue(self.store.has("INDEX_BODY"))
+        self.assertEqual("<html></html>", self.store["index_body"])
+
+    def test_counters(self):
+        self.store["A"] = 1
+        self.store.get_safe("A")
+        self.store.get_safe("B")
+        self.assertEqual(1, self.store.stats.hits)
+        self.assertEqual(1, self.store.stats.misses)
+        self.assertEqual(0.5, self.store.stats.hit_rate)
+
+
+class BoundedStoreTestCase(TestCase):
+    def test_lru_eviction_by_size(self):
+        store = DataStore(max_size=2)
+        store["A"] = 1
+        store["B"] = 2
+        store.get_safe("A")
+        store["C"] = 3
+        self.assertListEqual(["A", "C"], store.keys())
+        self.assertEqual(1, store.stats.evictions)
+
+    def test_lru_eviction_by_bytes(self):
+        store = DataStore(max_bytes=100, sizeof=len)
+        store["A"] = "a" * 60
+        store["B"] = "b" * 30
+        self.assertEqual(90, store.nbytes)
+        store["C"] = "c" * 30
+        self.assertListEqual(["B", "C"], store.keys())
+        self.assertEqual(60, store.nbytes)
+
+    def test_overwriting_keeps_byte_accounting(self):
+        store = DataStore(sizeof=len)
+        store["A"] = "a" * 60
+        store["A"] = "a" * 10
+        self.assertEqual(10, store.nbytes)
+        store.delete("A")
+        self.assertEqual(0, store.nbytes)
+
+    @mock.patch("wpoke.store.time.monotonic")
+    def test_ttl_expiration(self, monotonic):
+        monotonic.return_value = 100
+        store = DataStore(ttl=10)
+        store["A"] = 1
+        store.set("B", 2, ttl=60)
+        monotonic.return_value = 111
+        self.assertFalse(store.has("A"))
+        self.assertIsNone(store.get_safe("A"))
+        self.assertEqual(2, store.B)
+        self.assertListEqual(["B"], store.keys())
+        self.assertEqual(1, store.stats.expirations)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tasks_do_not_share_pushed_stores():
+    seen = []
+
+    async def scan(name):
+        push_store(DataStore())
+        peek_store()["NAME"] = name
+        await asyncio.sleep(0.01)
+        seen.append((name, peek_store().NAME))
+        pop_store()
+
+    root = peek_store()
+    await asyncio.gather(scan("a"), scan("b"))
+    assert [("a", "a"), ("b", "b")] == sorted(seen)
+    assert root is peek_store()
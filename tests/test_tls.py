@@ -0,0 +1,73 @@
+import os
+import ssl
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import ClientConnectorCertificateError, ClientSession, TCPConnector, web
+
+from wpoke.tls import TLSStats, get_ssl_context, make_ssl_context
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "tls")
+CERT = os.path.join(FIXTURES, "cert.pem")
+KEY = os.path.join(FIXTURES, "key.pem")
+
+
+async def index(request):
+    return web.Response(text="ok")
+
+
+@asynccontextmanager
+async def serve_https():
+    app = web.Application()
+    app.router.add_get("/", index)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(CERT, KEY)
+    site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=server_context)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"https://localhost:{port}/"
+    finally:
+        await runner.cleanup()
+
+
+async def fetch(url, context):
+    # A new connection every time, as a rescan of the host would open
+    connector = TCPConnector(force_close=True)
+    async with ClientSession(connector=connector) as session:
+        async with session.get(url, ssl=context) as response:
+            return await response.text()
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_resumed():
+    context = make_ssl_context(verify=False)
+    async with serve_https() as url:
+        for _ in range(3):
+            assert "ok" == await fetch(url, context)
+    assert 3 == context.stats.handshakes
+    assert 2 == context.stats.resumed
+
+
+@pytest.mark.asyncio
+async def test_certificates_are_verified():
+    async with serve_https() as url:
+        with pytest.raises(ClientConnectorCertificateError):
+            await fetch(url, make_ssl_context(verify=True))
+        assert "ok" == await fetch(url, make_ssl_context(verify=True, cafile=CERT))
+
+
+def test_contexts_are_shared():
+    assert get_ssl_context(False) is get_ssl_context(False)
+    assert get_ssl_context(True) is not get_ssl_context(False)
+    assert ssl.CERT_NONE == get_ssl_context(False).verify_mode
+
+
+def test_time_saved():
+    stats = TLSStats(
+        handshakes=4, resumed=2, full_handshake_time=0.2, resumed_handshake_time=0.04
+    )
+    assert 0.5 == stats.resumption_rate
+    assert pytest.approx(0.16) == stats.time_saved
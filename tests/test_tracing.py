@@ -0,0 +1,96 @@
+import json
+from collections import Counter
+
+import pytest
+
+from benchmarks.farm import FarmConfig, FarmResolver, start_farm
+from wpoke.batch import poke_many
+from wpoke.client import make_session
+from wpoke.fingers import get_installed_fingers
+from wpoke.hand import Hand
+from wpoke.tracing import (
+    NULL_SPAN,
+    TraceSink,
+    async_span,
+    fragment_path,
+    merge_traces,
+    scan_span,
+    span,
+    start_tracing,
+    stop_tracing,
+)
+
+
+def read_trace(path):
+    with open(path) as fd:
+        return json.load(fd)
+
+
+def test_spans_are_no_ops_unless_tracing():
+    assert span("x", "stage") is NULL_SPAN
+    assert async_span("GET", "request") is NULL_SPAN
+    assert scan_span("http://wpoke.app/") is NULL_SPAN
+
+
+def test_events_are_flushed_in_batches(tmp_path):
+    path = str(tmp_path / "trace.json")
+    sink = TraceSink(path, buffer_size=10)
+    for index in range(25):
+        sink.emit({"name": str(index), "ph": "i", "ts": sink.now(), "pid": 1})
+    sink.close()
+
+    events = read_trace(path)
+    names = [event["name"] for event in events if event["ph"] == "i"]
+    assert [str(index) for index in range(25)] == names
+
+
+def test_fragments_are_merged_into_trace(tmp_path):
+    path = str(tmp_path / "trace.json")
+    TraceSink(path).close()
+    for index in range(2):
+        sink = TraceSink(fragment_path(path, index), fragment=True)
+        sink.emit({"name": f"worker {index}", "ph": "i", "ts": 0, "pid": index})
+        sink.close()
+
+    merge_traces(path, [fragment_path(path, index) for index in range(3)])
+
+    names = {event["name"] for event in read_trace(path)}
+    assert {"worker 0", "worker 1", "process_name", "thread_name"} == names
+    assert not (tmp_path / "trace.json.0").exists()
+
+
+@pytest.mark.asyncio
+async def test_batch_scan_is_traced(tmp_path):
+    path = str(tmp_path / "trace.json")
+    hosts, concurrency = 6, 3
+    config = FarmConfig(hosts=hosts, latency=0.01, failure_rate=0, redirect_rate=0)
+    runner, port = await start_farm(config)
+    start_tracing(path)
+    try:
+        targets = [f"http://site-{i}.wp.test:{port}/" for i in range(hosts)]
+        async with make_session(resolver=FarmResolver()) as session:
+            hand = Hand(session=session)
+            for spec in get_installed_fingers(["theme"]).values():
+                hand.add_finger_spec(spec)
+            async for _ in poke_many(hand, targets, concurrency):
+                pass
+    finally:
+        stop_tracing()
+        await runner.cleanup()
+
+    events = read_trace(path)
+    scans = [event for event in events if event.get("cat") == "scan"]
+    assert hosts == len(scans)
+    assert {0} == {event["args"]["status"] for event in scans}
+    # Lanes are reused, as many of them as scans in flight at most
+    assert 0 < len({event["tid"] for event in scans}) <= concurrency
+
+    kinds = Counter((event.get("cat"), event["ph"]) for event in events)
+    assert hosts == kinds[("finger", "X")]
+    assert kinds[("request", "b")] == kinds[("request", "e")] >= hosts * 3
+    stages = {event["name"] for event in events if event.get("cat") == "stage"}
+    assert {"index_fetch", "html_parse", "style_css_fetch", "css_parse"} <= stages
+
+    requests = [e for e in events if e.get("cat") == "request" and e["ph"] == "b"]
+    assert all(event["args"]["url"].startswith("http://") for event in requests)
+    assert all("status" in event["args"] for event in requests)
@@ -45,3 +45,24 @@ class TestURLValidator(unittest.TestCase):
 
         with self.assertRaises(ValidationError):
             validator("https://172.16.254.233")
+
+    def test_global_ip_addresses_are_allowed(self):
+        validator = URLValidator()
+
+        validator("http://8.8.8.8/")
+        validator("https://1.1.1.1:8443/foo")
+
+    def test_ipv6_loop_back_is_not_allowed(self):
+        validator = URLValidator()
+
+        with self.assertRaises(ValidationError):
+            validator("http://[::1]/")
+
+    def test_too_long_urls_are_rejected(self):
+        validator = URLValidator()
+
+        with self.assertRaises(ValidationError):
+            validator("https://wpoke.app/" + "a" * validator.max_length)
+
+        with self.assertRaises(ValidationError):
+            validator.is_same_origin("https://wpoke.app/", "http://" + ":" * 10 ** 6)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pytest
+
+from wpoke.models import HandResult
+from wpoke.workqueue import LeaseWorker, SQLiteLeaseQueue
+
+TARGETS = [f"https://{i}.wp.com/" for i in range(10)]
+
+
+@pytest.fixture
+def queue_path():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield os.path.join(tmp_dir, "scan.queue")
+
+
+class FakeHand:
+    async def poke(self, target):
+        await asyncio.sleep(0.001)
+        result = HandResult()
+        result.target = target
+        result.status = 0
+        return result
+
+
+def test_put_skips_enqueued_targets(queue_path):
+    with SQLiteLeaseQueue(queue_path) as work_queue:
+        assert 10 == work_queue.put(TARGETS)
+        assert 1 == work_queue.put(TARGETS[:5] + ["https://new.wp.com/"])
+        assert 11 == work_queue.counts()["pending"]
+
+
+def test_leases_do_not_overlap(queue_path):
+    with SQLiteLeaseQueue(queue_path) as work_queue:
+        work_queue.put(TARGETS)
+        first = work_queue.lease("a", 4, 60)
+        second = work_queue.lease("b", 4, 60)
+        third = work_queue.lease("c", 4, 60)
+
+        assert TARGETS == first.targets + second.targets + third.targets
+        assert work_queue.lease("d", 4, 60) is None
+        assert {"pending": 0, "leased": 10, "done": 0, "dead": 0} == (
+            work_queue.counts()
+        )
+
+
+def test_expired_leases_are_requeued_and_fenced(queue_path):
+    with SQLiteLeaseQueue(queue_path) as work_queue:
+        work_queue.put(TARGETS[:2])
+        stale = work_queue.lease("a", 2, 0.01)
+        time.sleep(0.02)
+
+        fresh = work_queue.lease("b", 2, 60)
+
+        assert stale.targets == fresh.targets
+        assert not work_queue.heartbeat(stale, 60)
+        assert not work_queue.complete(stale, TARGETS[0], "ok")
+        assert work_queue.complete(fresh, TARGETS[0], "ok")
+        assert work_queue.heartbeat(fresh, 60)
+
+
+def test_targets_die_after_max_attempts(queue_path):
+    with SQLiteLeaseQueue(queue_path, max_attempts=2) as work_queue:
+        work_queue.put(TARGETS[:1])
+        for _ in range(2):
+            assert work_queue.lease("a", 1, 0.01) is not None
+            time.sleep(0.02)
+
+        assert work_queue.lease("a", 1, 60) is None
+        assert 1 == work_queue.counts()["dead"]
+
+
+def test_release_gives_back_unfinished_targets(queue_path):
+    with SQLiteLeaseQueue(queue_path) as work_queue:
+        work_queue.put(TARGETS[:3])
+        lease = work_queue.lease("a", 3, 60)
+        work_queue.complete(lease, TARGETS[0], "ok")
+        work_queue.release(lease)
+
+        assert TARGETS[1:3] == work_queue.lease("b", 3, 60).targets
+
+
+def test_nodes_share_a_queue_file(queue_path):
+    targets = [f"https://{i}.wp.com/" for i in range(500)]
+    with SQLiteLeaseQueue(queue_path) as work_queue:
+        work_queue.put(targets)
+
+    completed = []
+
+    def node(name):
+        with SQLiteLeaseQueue(queue_path) as work_queue:
+            while True:
+                lease = work_queue.lease(name, 7, 60)
+                if lease is None:
+                    return
+                for target in lease.targets:
+                    assert work_queue.complete(lease, target, "ok")
+                    completed.append(target)
+
+    nodes = [threading.Thread(target=node, args=(str(i),)) for i in range(4)]
+    for thread in nodes:
+        thread.start()
+    for thread in nodes:
+        thread.join()
+
+    assert sorted(targets) == sorted(completed)
+
+
+@pytest.mark.asyncio
+async def test_lease_worker_scans_every_target_once(queue_path):
+    with SQLiteLeaseQueue(queue_path) as work_queue:
+        work_queue.put(TARGETS)
+        worker = LeaseWorker(FakeHand(), work_queue, batch_size=3, concurrency=2)
+
+        results = [result.target async for result in worker.run()]
+
+        assert sorted(TARGETS) == sorted(results)
+        assert 10 == work_queue.counts()["done"]
+
+
+class FailingQueue(SQLiteLeaseQueue):
+    def complete(self, lease, target, status):
+        raise sqlite3.OperationalError("disk I/O error")
+
+
+@pytest.mark.asyncio
+async def test_lease_worker_failures_count_as_attempts(queue_path):
+    with FailingQueue(queue_path, max_attempts=2) as work_queue:
+        work_queue.put(TARGETS[:3])
+        worker = LeaseWorker(FakeHand(), work_queue, batch_size=3, lease_timeout=0.01)
+        for _ in range(2):
+            with pytest.raises(sqlite3.OperationalError):
+                async for _ in worker.run():
+                    pass
+            await asyncio.sleep(0.02)
+
+        assert 3 == work_queue.counts()["dead"]
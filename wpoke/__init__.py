@@ -1,7 +1,6 @@
-import asyncio
-
-
 def set_event_loop_policy():
+    import asyncio
+
     try:
         import uvloop
 
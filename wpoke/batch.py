@@ -0,0 +1,163 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import (
+    AnyStr,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    TextIO,
+    TYPE_CHECKING,
+    Union,
+)
+
+from .hand import Hand
+from .journal import (
+    CheckpointJournal,
+    JOURNAL_STATUS_ERROR,
+    JOURNAL_STATUS_FAILED,
+    JOURNAL_STATUS_OK,
+)
+from .limiter import AdaptiveLimiter, is_congested
+from .models import HandResult
+from .scheduler import get_scheduler
+
+if TYPE_CHECKING:  # pragma: nocover
+    from .runner import ShardResult
+
+# Outcome of a target whose scan crashed outside of any finger
+STATUS_ERROR = 2
+# Seconds between checks of whether held back targets can be scanned
+DEFERRED_RECHECK_INTERVAL = 0.1
+
+
+def iter_targets(fd: TextIO) -> Iterator[str]:
+    """ Lazily yields targets from a file-like object, one per line. Blank
+    lines and comments are ignored """
+    for line in fd:
+        target = line.strip()
+        if target and not target.startswith("#"):
+            yield target
+
+
+def skip_finished(targets: Iterable[str], journal: CheckpointJournal) -> Iterator[str]:
+    for target in targets:
+        if not journal.is_done(target):
+            yield target
+
+
+def journal_status(result: Union[HandResult, "ShardResult"]) -> str:
+    if result.status == 0:
+        return JOURNAL_STATUS_OK
+    if result.status == STATUS_ERROR:
+        return JOURNAL_STATUS_ERROR
+    return JOURNAL_STATUS_FAILED
+
+
+def _failed_result(target: AnyStr, started_at: datetime) -> HandResult:
+    result = HandResult()
+    result.target = target
+    result.status = STATUS_ERROR
+    result.started_at = started_at
+    result.finished_at = datetime.utcnow()
+    result.loaded_fingers = []
+    result.pokes = []
+    result.serial_runtime = 0.0
+    result.parallel_runtime = 0.0
+    return result
+
+
+async def _poke_one(
+    hand: Hand, target: AnyStr, journal: Optional[CheckpointJournal]
+) -> HandResult:
+    started_at = datetime.utcnow()
+    try:
+        result = await hand.poke(target)
+    except Exception:
+        # A crashing target must not take the whole batch down with it
+        result = _failed_result(target, started_at)
+    if journal is not None:
+        journal.record(target, journal_status(result))
+    return result
+
+
+def _pick_target(
+    targets: Iterator[str], deferred: Deque[str], scheduler, max_deferred: int
+) -> Optional[str]:
+    """ Next target whose host accepts requests right now. Targets of
+    throttled hosts are held back, up to `max_deferred` of them """
+    for _ in range(len(deferred)):
+        target = deferred.popleft()
+        if not scheduler.is_throttled(target):
+            return target
+        deferred.append(target)
+    for target in targets:
+        if not scheduler.is_throttled(target):
+            return target
+        deferred.append(target)
+        if len(deferred) >= max_deferred:
+            # Too much work held back already, let it wait for its host
+            return deferred.popleft()
+    return None
+
+
+async def poke_many(
+    hand: Hand,
+    targets: Iterable[str],
+    concurrency: int = 10,
+    journal: Optional[CheckpointJournal] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> AsyncIterator[HandResult]:
+    """ Pokes every target with at most ``concurrency`` scans in flight,
+    yielding results as they complete. Given a limiter, scans in flight are
+    rather bounded by its limit, adjusted as they finish.
+
+    Targets are pulled from the iterable on demand, hence inputs of any size
+    are never loaded in memory. Targets whose host is being throttled by the
+    scheduler are put aside while those of idle hosts are scanned. When a
+    journal is given, every finished target is recorded on it before its
+    result is yielded.
+    """
+    targets = iter(targets)
+    scheduler = get_scheduler()
+    loop = asyncio.get_event_loop()
+    deferred: Deque[str] = deque()
+    max_deferred = concurrency * 10
+    pending = set()
+    started_at: Dict[asyncio.Future, float] = {}
+    try:
+        while True:
+            limit = limiter.limit if limiter is not None else concurrency
+            while len(pending) < limit:
+                target = _pick_target(targets, deferred, scheduler, max_deferred)
+                if target is None:
+                    if pending or not deferred:
+                        break
+                    # Nothing else to do than waiting for a throttled host
+                    target = deferred.popleft()
+                task = asyncio.ensure_future(_poke_one(hand, target, journal))
+                pending.add(task)
+                if limiter is not None:
+                    started_at[task] = loop.time()
+                    limiter.started()
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=DEFERRED_RECHECK_INTERVAL if deferred else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                result = task.result()
+                if limiter is not None:
+                    latency = loop.time() - started_at.pop(task)
+                    limiter.finished(latency, is_congested(result))
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
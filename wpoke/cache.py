@@ -0,0 +1,215 @@
+""" Cache of scan results in front of `Hand.poke`, for services asked about
+the same sites over and over.
+
+Results are keyed by the canonical URL of their target and the fingers
+which ran. They are fresh for as long as the shortest TTL declared by those
+fingers, as `Meta.cache_ttl`. Past that, they are still served for
+`stale_ttl` seconds while the target is scanned again in the background.
+Concurrent scans of the same key are coalesced into a single one.
+
+Entries are kept in memory, up to `max_entries` of them, evicting the least
+recently used. Given a path, they are written to a SQLite database as well,
+surviving evictions and restarts. Results are pickled into it, thus it must
+only be shared with trusted processes.
+"""
+import asyncio
+import copy
+import functools
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AnyStr, Dict, Optional
+
+from .conf import settings
+from .exceptions import ValidationError
+from .hand import Hand
+from .limiter import is_congested
+from .metrics import RESULT_CACHE
+from .models import HandResult
+from .targets import normalize_target
+
+# Seconds results of fingers not declaring `Meta.cache_ttl` stay fresh
+DEFAULT_CACHE_TTL = 300
+
+
+@dataclass
+class CacheEntry:
+    result: HandResult
+    fresh_until: float
+    stale_until: float
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        stale_ttl: float = 3600,
+        path: Optional[str] = None,
+        clock=time.time,
+    ):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, isolation_level=None)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, "
+                "fresh_until REAL, stale_until REAL, result BLOB)"
+            )
+            self._db.execute(
+                "DELETE FROM results WHERE stale_until <= ?", (self.clock(),)
+            )
+
+    @classmethod
+    def from_settings(cls) -> "ResultCache":
+        return cls(
+            max_entries=settings.cache_size,
+            stale_ttl=settings.cache_stale,
+            path=settings.cache_path,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[CacheEntry]:
+        row = self._db.execute(
+            "SELECT fresh_until, stale_until, result FROM results WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        fresh_until, stale_until, result = row
+        return CacheEntry(pickle.loads(result), fresh_until, stale_until)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """ Entry of the key, fresh or stale, if any """
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            entry = self._load(key)
+        if entry is None:
+            return None
+        if entry.stale_until <= self.clock():
+            self.delete(key)
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, result: HandResult, ttl: float) -> CacheEntry:
+        now = self.clock()
+        entry = CacheEntry(result, now + ttl, now + ttl + self.stale_ttl)
+        self._remember(key, entry)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (
+                    key,
+                    entry.fresh_until,
+                    entry.stale_until,
+                    pickle.dumps(result, pickle.HIGHEST_PROTOCOL),
+                ),
+            )
+        return entry
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def finger_cache_ttl(finger) -> float:
+    meta = getattr(type(finger), "Meta", None)
+    return getattr(meta, "cache_ttl", DEFAULT_CACHE_TTL)
+
+
+def _for_target(result: HandResult, target: AnyStr) -> HandResult:
+    """ Results are shared by every spelling of the same site """
+    if result.target == target:
+        return result
+    result = copy.copy(result)
+    result.target = target
+    return result
+
+
+class CachedHand:
+    """ Pokes targets through a `Hand`, unless their results are cached.
+    Results of scans which timed out or could not connect are not cached """
+
+    def __init__(self, hand: Hand, cache: ResultCache):
+        self.hand = hand
+        self.cache = cache
+        self._scans: Dict[str, asyncio.Future] = {}
+
+    @property
+    def registered_fingers(self):
+        return self.hand.registered_fingers
+
+    @property
+    def ttl(self) -> float:
+        fingers = self.hand.registered_fingers.values()
+        return min((finger_cache_ttl(finger) for finger in fingers), default=0)
+
+    def key(self, target: AnyStr) -> Optional[str]:
+        try:
+            canonical = normalize_target(target)
+        except ValidationError:
+            return None
+        return f"{canonical} {','.join(self.hand.registered_fingers.finger_names)}"
+
+    async def poke(self, target: AnyStr) -> HandResult:
+        key = self.key(target)
+        if key is None or self.ttl <= 0:
+            return await self.hand.poke(target)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.fresh_until > self.cache.clock():
+                RESULT_CACHE.labels("hit").inc()
+            else:
+                RESULT_CACHE.labels("stale").inc()
+                self._scan(key, target)
+            return _for_target(entry.result, target)
+        RESULT_CACHE.labels("coalesced" if key in self._scans else "miss").inc()
+        # Callers giving up must not cancel the scan others wait for
+        result = await asyncio.shield(self._scan(key, target))
+        return _for_target(result, target)
+
+    def _scan(self, key: str, target: AnyStr) -> asyncio.Future:
+        scan = self._scans.get(key)
+        if scan is None:
+            scan = asyncio.ensure_future(self._poke_and_store(key, target))
+            scan.add_done_callback(functools.partial(self._forget, key))
+            self._scans[key] = scan
+        return scan
+
+    def _forget(self, key: str, scan: asyncio.Future) -> None:
+        del self._scans[key]
+        if not scan.cancelled():
+            # Retrieved, so that failed background refreshes are not logged
+            scan.exception()
+
+    async def _poke_and_store(self, key: str, target: AnyStr) -> HandResult:
+        result = await self.hand.poke(target)
+        if not is_congested(result):
+            self.cache.put(key, result, self.ttl)
+        return result
+
+    async def aclose(self) -> None:
+        """ Cancels scans refreshing stale entries """
+        scans = list(self._scans.values())
+        for scan in scans:
+            scan.cancel()
+        await asyncio.gather(*scans, return_exceptions=True)
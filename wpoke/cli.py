@@ -0,0 +1,799 @@
+import argparse
+import contextlib
+import json
+import sys
+from typing import Dict, List
+
+from wpoke import set_event_loop_policy
+from wpoke.conf import (
+    EXECUTOR_KINDS,
+    InvalidCliConfigurationException,
+    RENDER_FORMATS,
+    settings,
+)
+from wpoke.profiling import PROFILERS, StageProfile, run_profiler, serialize_result
+from wpoke.tracing import fragment_path, merge_traces, start_tracing, stop_tracing
+from wpoke.exceptions import (
+    DuplicatedFingerException,
+    FingerNotFoundException,
+    ValidationError,
+)
+from wpoke.fingers import get_installed_fingers
+from wpoke.fingers.loading import FingerSpec
+
+# Heavy dependencies, such as aiohttp, lxml or serpy, are imported by the
+# functions running the scan. Parsing arguments, and so --help, stays cheap.
+
+
+def extract_cli_options(fingers: Dict[str, FingerSpec], argv=None):
+    """
+    Based on the cli options configured in every installed finger, load the
+    pertinent settings from them. Fingers are not imported in the process
+    """
+    parser = argparse.ArgumentParser(description="WordPress information gathering tool")
+    parser.add_argument("url", nargs="?", help="Target WordPress site. Can be any URL")
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        dest="input_file",
+        help="Batch scan the targets listed in a file, one per line. "
+        "Use - to read them from stdin",
+        required=False,
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        dest="concurrency",
+        help="Max number of targets scanned at once in batch scans",
+        required=False,
+    )
+    parser.add_argument(
+        "-A",
+        "--adaptive",
+        action="store_true",
+        dest="adaptive",
+        help="Adjust the number of targets scanned at once to the observed "
+        "latency, timeouts and connection errors. --concurrency is its ceiling",
+        required=False,
+    )
+    parser.add_argument(
+        "-W",
+        "--workers",
+        type=int,
+        dest="workers",
+        help="Number of processes batch scans are sharded across, by host. "
+        "Each of them scans up to --concurrency targets at once",
+        required=False,
+    )
+    parser.add_argument(
+        "-q",
+        "--queue",
+        type=str,
+        dest="queue",
+        help="Work queue shared by several wpoke processes or hosts. Along "
+        "with --input, targets are enqueued. Alone, queued targets are scanned "
+        "until none is left",
+        required=False,
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        dest="serve",
+        metavar="PORT",
+        help="Run as a service, taking scan jobs over HTTP on this port. "
+        "Finger flags select the fingers of jobs not choosing any",
+        required=False,
+    )
+    parser.add_argument(
+        "--serve-host",
+        type=str,
+        dest="serve_host",
+        default="127.0.0.1",
+        help="Address the service listens on",
+        required=False,
+    )
+    parser.add_argument(
+        "--lease-size",
+        type=int,
+        dest="lease_size",
+        default=100,
+        help="Number of targets leased from the work queue at once",
+        required=False,
+    )
+    parser.add_argument(
+        "--lease-timeout",
+        type=float,
+        dest="lease_timeout",
+        default=300,
+        help="Seconds after which targets leased by an unresponsive worker "
+        "are handed over to other workers",
+        required=False,
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_false",
+        dest="dedup",
+        help="Scan batch targets verbatim, skipping their normalization and "
+        "deduplication by site",
+        required=False,
+    )
+    parser.add_argument(
+        "--bloom-capacity",
+        type=int,
+        dest="bloom_capacity",
+        help="Deduplicate batch targets with a fixed-size bloom filter sized "
+        "for this many sites instead of an exact set. Meant for huge inputs",
+        required=False,
+    )
+    parser.add_argument(
+        "-j",
+        "--journal",
+        type=str,
+        dest="journal",
+        help="Checkpoint journal where batch scans record finished targets",
+        required=False,
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        help="Skip targets already recorded as finished in the journal",
+        required=False,
+    )
+    parser.add_argument(
+        "-u",
+        "--user-agent",
+        type=str,
+        dest="useragent",
+        help="User agent to use",
+        required=False,
+    )
+    parser.add_argument(
+        "--verify-ssl",
+        action="store_true",
+        dest="verify_ssl",
+        help="Check certificates and host names of HTTPS targets",
+        required=False,
+    )
+    parser.add_argument(
+        "-tt",
+        "--timeout",
+        type=str,
+        dest="timeout",
+        help="Global default timeout for all requests",
+        required=False,
+    )
+    parser.add_argument(
+        "-r",
+        "--max-redirects",
+        type=str,
+        dest="max_redirects",
+        help="Global default max redirects for each HTTP call",
+        required=False,
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        dest="host_rate",
+        help="Max requests per second sent to each host. Unlimited by default",
+        required=False,
+    )
+    parser.add_argument(
+        "--host-burst",
+        type=float,
+        dest="host_burst",
+        help="Max requests sent to a host at once before --host-rate applies",
+        required=False,
+    )
+    parser.add_argument(
+        "--host-concurrency",
+        type=int,
+        dest="host_concurrency",
+        help="Max requests in flight against each host. Unlimited by default",
+        required=False,
+    )
+    parser.add_argument(
+        "--politeness-by-ip",
+        action="store_true",
+        dest="politeness_by_ip",
+        help="Apply host limits to resolved IP addresses, so that sites "
+        "sharing a server share their limits too",
+        required=False,
+    )
+    parser.add_argument(
+        "-w",
+        "--wordlist",
+        type=str,
+        dest="wordlist",
+        help="Wordlist of slugs probed by fingers enumerating them, such as plugins",
+        required=False,
+    )
+    parser.add_argument(
+        "--probe-concurrency",
+        type=int,
+        dest="probe_concurrency",
+        help="Max number of probes in flight against each target",
+        required=False,
+    )
+    parser.add_argument(
+        "--probe-budget",
+        type=float,
+        dest="probe_budget",
+        help="Max seconds spent probing each target for wordlist slugs",
+        required=False,
+    )
+    parser.add_argument(
+        "--rest-max-bytes",
+        type=int,
+        dest="rest_max_bytes",
+        help="Max bytes read from each REST API response",
+        required=False,
+    )
+    parser.add_argument(
+        "--rest-max-pages",
+        type=int,
+        dest="rest_max_pages",
+        help="Max pages read from each paginated REST API listing",
+        required=False,
+    )
+    parser.add_argument(
+        "--executor",
+        type=str,
+        dest="executor",
+        choices=EXECUTOR_KINDS,
+        help="Where parsing of large documents runs, off the event loop",
+        required=False,
+    )
+    parser.add_argument(
+        "--offload-threshold",
+        type=int,
+        dest="offload_threshold",
+        help="Documents at least this many characters long are parsed by the "
+        "executor. Smaller ones are parsed inline",
+        required=False,
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        dest="profile",
+        help="Time the stages of every scan, such as fetching the index or "
+        "parsing style.css. Timings are added to results and summed up on stderr",
+        required=False,
+    )
+    parser.add_argument(
+        "--profile-output",
+        type=str,
+        dest="profile_output",
+        help="Profile the whole run too, saving the profile to this file. "
+        "Implies --profile",
+        required=False,
+    )
+    parser.add_argument(
+        "--profiler",
+        type=str,
+        dest="profiler",
+        choices=PROFILERS,
+        default=PROFILERS[0],
+        help="How --profile-output is made: cProfile stats, readable by "
+        "pstats, or sampled stacks in folded format, for flame graphs",
+        required=False,
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        dest="trace",
+        help="Write a trace of the run to this file, with spans of every "
+        "scan, finger, request and stage. Open it with https://ui.perfetto.dev",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        dest="metrics_port",
+        help="Serve live metrics of the run in Prometheus text format at "
+        "http://127.0.0.1:<port>/metrics",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        dest="metrics_file",
+        help="Write live metrics of the run in Prometheus text format to this "
+        "file every --metrics-interval seconds",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        dest="metrics_interval",
+        help="Seconds between writes of --metrics-file",
+        required=False,
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        dest="result_cache",
+        help="Cache results, for as long as fingers deem them fresh, and serve "
+        "repeated scans of a site from the cache",
+        required=False,
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        dest="cache_size",
+        help="Max number of results cached in memory",
+        required=False,
+    )
+    parser.add_argument(
+        "--cache-stale",
+        type=float,
+        dest="cache_stale",
+        help="Seconds results are still served once stale, while scanning "
+        "their target again in the background",
+        required=False,
+    )
+    parser.add_argument(
+        "--cache-path",
+        type=str,
+        dest="cache_path",
+        help="Keep cached results in this SQLite database too. Implies --cache",
+        required=False,
+    )
+    parser.add_argument(
+        "--http-cache",
+        type=str,
+        dest="http_cache",
+        help="Keep index pages and style.css files carrying ETag or "
+        "Last-Modified in this SQLite database, along with their parse. "
+        "Rescans only download and parse them again if they changed",
+        required=False,
+    )
+    parser.add_argument(
+        "--fingerprint-cache",
+        type=str,
+        dest="fingerprint_cache",
+        help="Keep themes seen before, by style.css content, in this SQLite "
+        "database, so that later runs do not parse them again either",
+        required=False,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        dest="render_format",
+        help="Output format. {json|cli}",
+        required=False,
+    )
+
+    for spec in fingers.values():
+        pkwargs = {"dest": spec.dest, "action": "store_true"}
+        if spec.help_text:
+            pkwargs["help"] = spec.help_text
+        parser.add_argument(*spec.cli_flags, **pkwargs)
+
+    return parser, parser.parse_args(argv)
+
+
+def load_settings(cli_options):
+    """
+    Set global configuration based on selected options defined in the CLI
+    """
+    # User-Agent http header
+    if cli_options.useragent:
+        settings.user_agent = cli_options.useragent
+    # TLS
+    if cli_options.verify_ssl:
+        settings.ssl_enabled = True
+    # Global timeout
+    if cli_options.timeout:
+        settings.timeout = int(cli_options.timeout)
+    # Global max redirects
+    if cli_options.max_redirects:
+        settings.max_redirects = int(cli_options.max_redirects)
+    # Politeness
+    if cli_options.host_rate:
+        settings.host_rate = cli_options.host_rate
+    if cli_options.host_burst:
+        settings.host_burst = cli_options.host_burst
+    if cli_options.host_concurrency:
+        settings.host_concurrency = cli_options.host_concurrency
+    if cli_options.politeness_by_ip:
+        settings.politeness_by_ip = True
+    # Wordlist probing
+    if cli_options.wordlist:
+        settings.wordlist = cli_options.wordlist
+    if cli_options.probe_concurrency:
+        settings.probe_concurrency = cli_options.probe_concurrency
+    if cli_options.probe_budget:
+        settings.probe_budget = cli_options.probe_budget
+    # REST API streaming
+    if cli_options.rest_max_bytes:
+        settings.rest_max_bytes = cli_options.rest_max_bytes
+    if cli_options.rest_max_pages:
+        settings.rest_max_pages = cli_options.rest_max_pages
+    # Parse work offloading
+    if cli_options.executor:
+        settings.executor = cli_options.executor
+    if cli_options.offload_threshold is not None:
+        settings.offload_threshold = cli_options.offload_threshold
+    # Profiling
+    if cli_options.profile or cli_options.profile_output:
+        settings.profile = True
+    if cli_options.trace:
+        settings.trace = cli_options.trace
+    # Metrics
+    if cli_options.metrics_port:
+        settings.metrics_port = cli_options.metrics_port
+    if cli_options.metrics_file:
+        settings.metrics_file = cli_options.metrics_file
+    if cli_options.metrics_interval:
+        settings.metrics_interval = cli_options.metrics_interval
+    # Result cache
+    if cli_options.result_cache or cli_options.cache_path:
+        settings.result_cache = True
+    if cli_options.cache_path:
+        settings.cache_path = cli_options.cache_path
+    if cli_options.cache_size is not None:
+        if cli_options.cache_size < 1:
+            message = f"invalid cache size: {cli_options.cache_size}"
+            raise InvalidCliConfigurationException(message)
+        settings.cache_size = cli_options.cache_size
+    if cli_options.cache_stale is not None:
+        settings.cache_stale = cli_options.cache_stale
+    if cli_options.http_cache:
+        settings.http_cache = cli_options.http_cache
+    if cli_options.fingerprint_cache:
+        settings.fingerprint_cache = cli_options.fingerprint_cache
+    # Batch scans
+    if not any(
+        (cli_options.url, cli_options.input_file, cli_options.queue, cli_options.serve)
+    ):
+        message = "either url, --input, --queue or --serve is required"
+        raise InvalidCliConfigurationException(message)
+    if cli_options.resume and not cli_options.journal:
+        raise InvalidCliConfigurationException("--resume requires --journal")
+    if cli_options.concurrency:
+        if cli_options.concurrency < 1:
+            message = f"invalid concurrency: {cli_options.concurrency}"
+            raise InvalidCliConfigurationException(message)
+        settings.concurrency = cli_options.concurrency
+    if cli_options.adaptive:
+        settings.adaptive = True
+    if cli_options.workers:
+        if cli_options.workers < 1:
+            message = f"invalid number of workers: {cli_options.workers}"
+            raise InvalidCliConfigurationException(message)
+        settings.workers = cli_options.workers
+    # Output format
+    if cli_options.render_format:
+        if cli_options.render_format not in RENDER_FORMATS:
+            message = f"unknown format: {cli_options.render_format}"
+            raise InvalidCliConfigurationException(message)
+        settings.output_format = cli_options.render_format
+
+
+def select_fingers(fingers: Dict[str, FingerSpec], cli_options) -> List[FingerSpec]:
+    """
+    Fingers explicitly selected through their CLI flags. All installed
+    fingers are selected when none is
+    """
+    selected = [spec for spec in fingers.values() if getattr(cli_options, spec.dest)]
+    return selected or list(fingers.values())
+
+
+def open_result_cache(stack: contextlib.ExitStack):
+    """
+    Result cache, when enabled, closed along with the stack
+    """
+    if not settings.result_cache:
+        return None
+    from wpoke.cache import ResultCache
+
+    cache = ResultCache.from_settings()
+    stack.callback(cache.close)
+    return cache
+
+
+async def scan(fingers: Dict[str, FingerSpec], cli_options):
+    from wpoke.client import make_session
+    from wpoke.hand import Hand
+    from wpoke.store import push_store, DataStore
+
+    cli_store = DataStore()
+    push_store(cli_store)
+
+    with contextlib.ExitStack() as stack:
+        cache = open_result_cache(stack)
+        async with make_session() as session:
+            hand = Hand(session=session)
+            try:
+                for spec in select_fingers(fingers, cli_options):
+                    hand.add_finger_spec(spec)
+            except (FingerNotFoundException, DuplicatedFingerException) as e:
+                print(e.message, file=sys.stderr)
+                sys.exit(2)
+
+            if cache is None:
+                await scan_with(hand, cli_options)
+                return
+
+            from wpoke.cache import CachedHand
+
+            hand = CachedHand(hand, cache)
+            try:
+                await scan_with(hand, cli_options)
+            finally:
+                await hand.aclose()
+
+
+async def scan_with(hand, cli_options):
+    if cli_options.queue:
+        await queue_scan(hand, cli_options)
+        return
+
+    if cli_options.input_file:
+        await batch_scan(hand, cli_options)
+        return
+
+    result = await hand.poke(cli_options.url)
+    data = serialize_result(result)
+    print(json.dumps(data, indent=2))
+    profile = StageProfile()
+    profile.add(data.get("stage_timings"))
+    print_profile(profile)
+
+
+def open_input(path: str):
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin)
+    return open(path, "rt", encoding="utf8")
+
+
+def warn_invalid_target(target: str, error: ValidationError):
+    print(f"skipping {target}: {error.message}", file=sys.stderr)
+
+
+def batch_targets(stack: contextlib.ExitStack, cli_options):
+    """
+    Targets of a batch scan, read lazily from the input file, along with the
+    checkpoint journal finished targets are recorded on, if any
+    """
+    from wpoke.batch import iter_targets, skip_finished
+    from wpoke.journal import CheckpointJournal
+    from wpoke.targets import BloomFilter, unique_targets
+
+    fd = stack.enter_context(open_input(cli_options.input_file))
+    targets = iter_targets(fd)
+    if cli_options.dedup:
+        seen = None
+        if cli_options.bloom_capacity:
+            seen = BloomFilter(cli_options.bloom_capacity)
+        targets = unique_targets(targets, seen, on_invalid=warn_invalid_target)
+    journal = None
+    if cli_options.journal:
+        journal = stack.enter_context(CheckpointJournal(cli_options.journal))
+        if cli_options.resume:
+            targets = skip_finished(targets, journal)
+        elif len(journal):
+            message = (
+                f"{cli_options.journal} already records finished targets. "
+                "Use --resume to skip them"
+            )
+            print(message, file=sys.stderr)
+            sys.exit(2)
+    return targets, journal
+
+
+def print_profile(profile: StageProfile) -> None:
+    if profile.scans:
+        print(profile.format(), file=sys.stderr)
+
+
+def make_limiter():
+    if not settings.adaptive:
+        return None
+    from wpoke.limiter import AdaptiveLimiter
+    from wpoke.metrics import CONCURRENCY_LIMIT
+
+    limiter = AdaptiveLimiter.from_settings()
+    CONCURRENCY_LIMIT.set_function(lambda: limiter.limit)
+    return limiter
+
+
+def report_limiter(limiter) -> None:
+    if limiter is not None:
+        stats = limiter.stats
+        print(
+            f"concurrency settled at {stats.limit} after {stats.increases} "
+            f"increases and {stats.decreases} decreases",
+            file=sys.stderr,
+        )
+
+
+async def batch_scan(hand, cli_options):
+    """
+    Scan every target in the input file, printing one JSON document per line
+    as soon as each of them finishes
+    """
+    from wpoke.batch import poke_many
+
+    limiter = make_limiter()
+    profile = StageProfile()
+    with contextlib.ExitStack() as stack:
+        targets, journal = batch_targets(stack, cli_options)
+        results = poke_many(
+            hand,
+            targets,
+            concurrency=settings.concurrency,
+            journal=journal,
+            limiter=limiter,
+        )
+        async for result in results:
+            data = serialize_result(result)
+            profile.add(data.get("stage_timings"))
+            print(json.dumps(data), flush=True)
+    report_limiter(limiter)
+    print_profile(profile)
+
+
+def enqueue_targets(cli_options):
+    """
+    Load the targets in the input file into the work queue, skipping those
+    enqueued before
+    """
+    from wpoke.workqueue import SQLiteLeaseQueue
+
+    with contextlib.ExitStack() as stack:
+        targets, _ = batch_targets(stack, cli_options)
+        work_queue = stack.enter_context(SQLiteLeaseQueue(cli_options.queue))
+        added = work_queue.put(targets)
+    print(f"{added} targets enqueued into {cli_options.queue}", file=sys.stderr)
+
+
+async def queue_scan(hand, cli_options):
+    """
+    Scan targets leased from the work queue until none is left, printing one
+    JSON document per line as soon as each of them finishes
+    """
+    from wpoke.workqueue import LeaseWorker, SQLiteLeaseQueue
+
+    limiter = make_limiter()
+    profile = StageProfile()
+    with SQLiteLeaseQueue(cli_options.queue) as work_queue:
+        worker = LeaseWorker(
+            hand,
+            work_queue,
+            batch_size=cli_options.lease_size,
+            lease_timeout=cli_options.lease_timeout,
+            concurrency=settings.concurrency,
+            limiter=limiter,
+        )
+        async for result in worker.run():
+            data = serialize_result(result)
+            profile.add(data.get("stage_timings"))
+            print(json.dumps(data), flush=True)
+    report_limiter(limiter)
+    print_profile(profile)
+
+
+def sharded_scan(fingers: Dict[str, FingerSpec], cli_options):
+    """
+    Same as `batch_scan`, with targets sharded across `settings.workers`
+    processes. Finished targets are journaled by this process only
+    """
+    from wpoke.batch import journal_status
+    from wpoke.metrics import TARGETS_FINISHED
+    from wpoke.runner import ShardedRunner
+
+    with contextlib.ExitStack() as stack:
+        targets, journal = batch_targets(stack, cli_options)
+        runner = ShardedRunner(select_fingers(fingers, cli_options), settings.workers)
+        profile = StageProfile()
+        for result in runner.run(targets):
+            status = journal_status(result)
+            if journal is not None:
+                journal.record(result.target, status)
+            # Workers keep metrics of their own, which are not exported
+            TARGETS_FINISHED.labels(status).inc()
+            profile.add(result.data.get("stage_timings"))
+            print(json.dumps(result.data), flush=True)
+    print_profile(profile)
+    if settings.trace:
+        # Workers are gone by now, their parts of the trace complete
+        stop_tracing()
+        fragments = (fragment_path(settings.trace, i) for i in range(settings.workers))
+        merge_traces(settings.trace, fragments)
+
+
+async def serve(fingers: Dict[str, FingerSpec], cli_options):
+    """
+    Take scan jobs over HTTP until interrupted, see `wpoke.service`
+    """
+    from wpoke.service import ScanService, make_app, serve as serve_app
+
+    selected = [spec.name for spec in select_fingers(fingers, cli_options)]
+    with contextlib.ExitStack() as stack:
+        cache = open_result_cache(stack)
+        service = ScanService(fingers, default_fingers=selected, cache=cache)
+        print(
+            f"serving on http://{cli_options.serve_host}:{cli_options.serve}",
+            file=sys.stderr,
+        )
+        await serve_app(make_app(service), cli_options.serve_host, cli_options.serve)
+
+
+def start_metrics_exporters() -> list:
+    if not settings.metrics_port and not settings.metrics_file:
+        return []
+    from wpoke.metrics import CONCURRENCY_LIMIT, MetricsFileWriter, MetricsServer
+
+    CONCURRENCY_LIMIT.set(settings.concurrency)
+    exporters = []
+    if settings.metrics_port:
+        exporters.append(MetricsServer(settings.metrics_port).start())
+    if settings.metrics_file:
+        writer = MetricsFileWriter(settings.metrics_file, settings.metrics_interval)
+        exporters.append(writer.start())
+    return exporters
+
+
+def main(argv=None) -> int:
+    try:
+        fingers = get_installed_fingers()
+    except FingerNotFoundException as e:
+        print(e.message, file=sys.stderr)
+        return 2
+
+    cli_parser, cli_options = extract_cli_options(fingers, argv)
+
+    try:
+        load_settings(cli_options)
+    except InvalidCliConfigurationException as e:
+        print(str(e))
+        cli_parser.print_help()
+        return 2
+
+    import asyncio
+
+    from wpoke.executor import shutdown_executors
+    from wpoke.fingers.theme.fingerprints import close_fingerprints
+    from wpoke.httpcache import close_http_cache
+
+    profiler = contextlib.nullcontext()
+    if cli_options.profile_output:
+        # Worker processes of sharded scans are not profiled, only this one
+        profiler = run_profiler(cli_options.profiler, cli_options.profile_output)
+    if settings.trace:
+        start_tracing(settings.trace)
+    exporters = start_metrics_exporters()
+
+    try:
+        with profiler:
+            if cli_options.queue and cli_options.input_file:
+                enqueue_targets(cli_options)
+            elif cli_options.input_file and settings.workers > 1:
+                sharded_scan(fingers, cli_options)
+            else:
+                set_event_loop_policy()
+                loop = asyncio.get_event_loop()
+                if cli_options.serve:
+                    loop.run_until_complete(serve(fingers, cli_options))
+                else:
+                    loop.run_until_complete(scan(fingers, cli_options))
+    except KeyboardInterrupt:
+        shutdown_executors(wait=False)
+        return 1
+    finally:
+        stop_tracing()
+        close_http_cache()
+        close_fingerprints()
+        for exporter in exporters:
+            exporter.stop()
+    shutdown_executors()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
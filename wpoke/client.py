@@ -1,5 +1,10 @@
+from aiohttp import ClientSession, TCPConnector
 from aiohttp.client import URL as aio_url
 
+from .conf import settings
+from .metrics import is_exporting, request_trace_config
+from .tls import get_ssl_context
+
 
 class URL:
     def __init__(self, url: str):
@@ -20,3 +25,42 @@ class URL:
 
     def set_scheme(self, scheme: str):
         self.url = self.url.with_scheme(scheme)
+
+    @property
+    def host(self):
+        return self.url.host
+
+    @property
+    def port(self):
+        return self.url.port
+
+    def is_default_port(self):
+        return self.url.is_default_port()
+
+    def site_root(self) -> "URL":
+        """ Same origin, stripped of credentials, path, query and fragment """
+        port = None if self.is_default_port() else self.port
+        host = (self.host or "").rstrip(".").lower()
+        return URL(
+            str(aio_url.build(scheme=self.scheme, host=host, port=port, path="/"))
+        )
+
+
+def make_session(resolver=None, **kwargs) -> ClientSession:
+    """ HTTP session shared by every scan of a process. Its connection pool
+    grows along with the number of concurrent scans, resolved hosts are
+    cached across scans and so are TLS sessions.
+
+    :param resolver: aiohttp resolver of host names, instead of the default
+    :param kwargs: options of the `ClientSession`
+    """
+    connector = TCPConnector(
+        limit=max(100, settings.concurrency * 4),
+        ttl_dns_cache=300,
+        ssl=get_ssl_context(),
+        resolver=resolver,
+    )
+    if is_exporting():
+        trace_configs = list(kwargs.pop("trace_configs", None) or ())
+        kwargs["trace_configs"] = trace_configs + [request_trace_config()]
+    return ClientSession(connector=connector, **kwargs)
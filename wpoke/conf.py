@@ -1,7 +1,7 @@
 import contextvars as ctxv
 import os
 from enum import Enum
-from typing import Any
+from typing import Any, Dict
 
 from .version import VERSION
 
@@ -13,15 +13,64 @@ class RenderFormats(Enum):
 
 RENDER_FORMATS = tuple(format_.value for format_ in RenderFormats)
 
+
+class ExecutorKinds(Enum):
+    """ Where CPU bound parse work of large documents runs """
+
+    # Always on the event loop
+    INLINE = "inline"
+    # lxml releases the GIL while parsing, so threads spread it across cores
+    THREAD = "thread"
+    # Spreads pure python work, such as regex passes, across cores too.
+    # Arguments and results must be picklable, which lxml trees are not
+    PROCESS = "process"
+
+
+EXECUTOR_KINDS = tuple(kind.value for kind in ExecutorKinds)
+
 TIMEOUT = int(os.getenv("TIMEOUT", 5))
 USER_AGENT = (
     f"wpoke/{VERSION} (+you have been poked! Find "
     "out more at https://github.com/sonirico/wpoke)"
 )
 
-INSTALLED_FINGERS = ("theme",)
+INSTALLED_FINGERS = tuple(
+    finger.strip()
+    for finger in os.getenv(
+        "INSTALLED_FINGERS", "theme,plugins,core_version,rest_api"
+    ).split(",")
+    if finger.strip()
+)
 SSL_ENABLED = bool(os.getenv("SSL_ENABLED", False))
 MAX_REDIRECTS = int(os.getenv("MAX_REDIRECTS", 3))
+CONCURRENCY = int(os.getenv("CONCURRENCY", 10))
+WORKERS = int(os.getenv("WORKERS", 1))
+ADAPTIVE = bool(os.getenv("ADAPTIVE", False))
+HOST_RATE = float(os.getenv("HOST_RATE", 0))
+HOST_BURST = float(os.getenv("HOST_BURST", 0))
+HOST_CONCURRENCY = int(os.getenv("HOST_CONCURRENCY", 0))
+POLITENESS_BY_IP = bool(os.getenv("POLITENESS_BY_IP", False))
+MAX_RETRY_AFTER = float(os.getenv("MAX_RETRY_AFTER", 30))
+WORDLIST = os.getenv("WORDLIST")
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", 10))
+PROBE_BUDGET = float(os.getenv("PROBE_BUDGET", 60))
+REST_MAX_BYTES = int(os.getenv("REST_MAX_BYTES", 5 * 1024 * 1024))
+REST_MAX_PAGES = int(os.getenv("REST_MAX_PAGES", 10))
+EXECUTOR = os.getenv("EXECUTOR", "thread")
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", 0))
+OFFLOAD_THRESHOLD = int(os.getenv("OFFLOAD_THRESHOLD", 256 * 1024))
+PROFILE = bool(os.getenv("PROFILE", False))
+TRACE = os.getenv("TRACE")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 15))
+RESULT_CACHE = bool(os.getenv("RESULT_CACHE", False))
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", 10000))
+CACHE_STALE = float(os.getenv("CACHE_STALE", 3600))
+CACHE_PATH = os.getenv("CACHE_PATH")
+HTTP_CACHE = os.getenv("HTTP_CACHE")
+FINGERPRINT_CACHE_SIZE = int(os.getenv("FINGERPRINT_CACHE_SIZE", 4096))
+FINGERPRINT_CACHE = os.getenv("FINGERPRINT_CACHE")
 
 
 class SettingAttr(object):
@@ -89,10 +138,107 @@ class Settings:
     max_redirects = SettingAttr(
         "max_redirects", ctxv.ContextVar("max_redirects", default=MAX_REDIRECTS)
     )
+    concurrency = SettingAttr(
+        "concurrency", ctxv.ContextVar("concurrency", default=CONCURRENCY)
+    )
+    workers = SettingAttr("workers", ctxv.ContextVar("workers", default=WORKERS))
+    adaptive = SettingAttr("adaptive", ctxv.ContextVar("adaptive", default=ADAPTIVE))
+    host_rate = SettingAttr(
+        "host_rate", ctxv.ContextVar("host_rate", default=HOST_RATE)
+    )
+    host_burst = SettingAttr(
+        "host_burst", ctxv.ContextVar("host_burst", default=HOST_BURST)
+    )
+    host_concurrency = SettingAttr(
+        "host_concurrency",
+        ctxv.ContextVar("host_concurrency", default=HOST_CONCURRENCY),
+    )
+    politeness_by_ip = SettingAttr(
+        "politeness_by_ip",
+        ctxv.ContextVar("politeness_by_ip", default=POLITENESS_BY_IP),
+    )
+    max_retry_after = SettingAttr(
+        "max_retry_after", ctxv.ContextVar("max_retry_after", default=MAX_RETRY_AFTER),
+    )
+    wordlist = SettingAttr("wordlist", ctxv.ContextVar("wordlist", default=WORDLIST))
+    probe_concurrency = SettingAttr(
+        "probe_concurrency",
+        ctxv.ContextVar("probe_concurrency", default=PROBE_CONCURRENCY),
+    )
+    probe_budget = SettingAttr(
+        "probe_budget", ctxv.ContextVar("probe_budget", default=PROBE_BUDGET)
+    )
+    rest_max_bytes = SettingAttr(
+        "rest_max_bytes", ctxv.ContextVar("rest_max_bytes", default=REST_MAX_BYTES)
+    )
+    rest_max_pages = SettingAttr(
+        "rest_max_pages", ctxv.ContextVar("rest_max_pages", default=REST_MAX_PAGES)
+    )
+    executor = SettingAttr("executor", ctxv.ContextVar("executor", default=EXECUTOR))
+    executor_workers = SettingAttr(
+        "executor_workers",
+        ctxv.ContextVar("executor_workers", default=EXECUTOR_WORKERS),
+    )
+    offload_threshold = SettingAttr(
+        "offload_threshold",
+        ctxv.ContextVar("offload_threshold", default=OFFLOAD_THRESHOLD),
+    )
+    profile = SettingAttr("profile", ctxv.ContextVar("profile", default=PROFILE))
+    trace = SettingAttr("trace", ctxv.ContextVar("trace", default=TRACE))
+    metrics_port = SettingAttr(
+        "metrics_port", ctxv.ContextVar("metrics_port", default=METRICS_PORT)
+    )
+    metrics_file = SettingAttr(
+        "metrics_file", ctxv.ContextVar("metrics_file", default=METRICS_FILE)
+    )
+    metrics_interval = SettingAttr(
+        "metrics_interval",
+        ctxv.ContextVar("metrics_interval", default=METRICS_INTERVAL),
+    )
+    result_cache = SettingAttr(
+        "result_cache", ctxv.ContextVar("result_cache", default=RESULT_CACHE)
+    )
+    cache_size = SettingAttr(
+        "cache_size", ctxv.ContextVar("cache_size", default=CACHE_SIZE)
+    )
+    cache_stale = SettingAttr(
+        "cache_stale", ctxv.ContextVar("cache_stale", default=CACHE_STALE)
+    )
+    cache_path = SettingAttr(
+        "cache_path", ctxv.ContextVar("cache_path", default=CACHE_PATH)
+    )
+    http_cache = SettingAttr(
+        "http_cache", ctxv.ContextVar("http_cache", default=HTTP_CACHE)
+    )
+    fingerprint_cache_size = SettingAttr(
+        "fingerprint_cache_size",
+        ctxv.ContextVar("fingerprint_cache_size", default=FINGERPRINT_CACHE_SIZE),
+    )
+    fingerprint_cache = SettingAttr(
+        "fingerprint_cache",
+        ctxv.ContextVar("fingerprint_cache", default=FINGERPRINT_CACHE),
+    )
     output_format = SettingAttr(
         "output_format",
         ctxv.ContextVar("output_format", default=RenderFormats.JSON.value),
     )
 
+    @classmethod
+    def _attr_names(cls):
+        return [
+            name for name, attr in vars(cls).items() if isinstance(attr, SettingAttr)
+        ]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Current values of every setting, e.g to configure a worker
+        process as its parent is """
+        return {name: getattr(self, name) for name in self._attr_names()}
+
+    def load(self, values: Dict[str, Any]) -> None:
+        names = set(self._attr_names())
+        for name, value in values.items():
+            if name in names:
+                setattr(self, name, value)
+
 
 settings = Settings()
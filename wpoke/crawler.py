@@ -0,0 +1,209 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+from aiohttp import ClientSession
+
+from wpoke import exceptions as general_exceptions
+from wpoke.client import URL
+from wpoke.conf import settings
+from wpoke.executor import offload_to_thread
+from wpoke.html import HTMLDocument
+from wpoke.httpcache import get_http_cache
+from wpoke.profiling import Stages, stage
+from wpoke.scheduler import get_scheduler
+from wpoke.store import peek_store
+from wpoke.tls import get_ssl_context
+from wpoke.tracing import async_span
+
+
+def raise_on_failure(status_code: int, has_body: bool) -> None:
+    if 400 <= status_code < 500:
+        # Some 4XX responses are served by WordPress, therefore still
+        # prone to yield interesting data
+        if not has_body:
+            raise general_exceptions.TargetNotFound
+    elif status_code > 499:
+        raise general_exceptions.TargetInternalServerError
+
+
+@contextlib.contextmanager
+def translate_client_errors():
+    """ Maps aiohttp and asyncio errors raised while crawling a target into
+    wpoke exceptions """
+    try:
+        yield
+    except aiohttp.client.TooManyRedirects:
+        raise general_exceptions.NastyTargetException
+    except aiohttp.client.ClientConnectionError as e:
+        raise general_exceptions.TargetConnectionError() from e
+    except aiohttp.ServerTimeoutError:
+        raise general_exceptions.TargetTimeout
+    except aiohttp.client.ClientError:
+        # General unexpected error
+        raise general_exceptions.TargetInternalServerError
+    except asyncio.TimeoutError as e:
+        raise general_exceptions.TargetTimeout from e
+
+
+@dataclass
+class CrawlerConfiguration:
+    timeout: int = settings.timeout
+    user_agent: str = settings.user_agent
+    max_redirects: int = settings.max_redirects
+    ssl_enabled: bool = settings.ssl_enabled
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            timeout=settings.timeout,
+            user_agent=settings.user_agent,
+            max_redirects=settings.max_redirects,
+            ssl_enabled=settings.ssl_enabled,
+        )
+
+
+class BaseCrawler:
+    """ HTTP plumbing shared by every finger crawling a target. Artifacts
+    common to several fingers, such as the index body, are kept in the
+    store of the ongoing scan so that they are only fetched once """
+
+    def __init__(
+        self,
+        http_session: ClientSession,
+        http_config: Optional[CrawlerConfiguration] = None,
+        canonical_url: Optional[URL] = None,
+    ):
+        self.canonical_url = canonical_url
+        self.session = http_session
+        self.http_config = http_config or CrawlerConfiguration()
+        self.store = peek_store()
+
+    @property
+    def request_options(self):
+        return dict(
+            ssl=get_ssl_context(self.http_config.ssl_enabled),
+            timeout=self.http_config.timeout,
+            max_redirects=self.http_config.max_redirects,
+            headers={"User-Agent": self.http_config.user_agent},
+        )
+
+    async def _do_request(
+        self,
+        target_url: str,
+        http_method: str = "GET",
+        headers: Optional[Dict[str, str]] = None,
+        max_bytes: Optional[int] = None,
+        revalidate: bool = False,
+    ) -> Tuple[int, str]:
+        """
+        :param headers: extra headers on top of the default ones
+        :param max_bytes: read at most this many bytes of the body, whatever
+            its length is
+        :param revalidate: go through the HTTP cache, if any. Responses
+            carrying validators are stored, and served again as long as the
+            server answers 304 to conditional requests
+        """
+        options = self.request_options
+        if headers:
+            options["headers"] = {**options["headers"], **headers}
+        cache = get_http_cache() if revalidate and max_bytes is None else None
+        cached = cache.get(target_url) if cache is not None else None
+        if cached is not None:
+            options["headers"] = {
+                **options["headers"],
+                **cached.conditional_headers(),
+            }
+        async with self._open(target_url, http_method, **options) as response:
+            status = response.status
+            if cached is not None and status == 304:
+                cache.revalidated(target_url, cached)
+                status, body = cached.status, cached.body
+            elif max_bytes is None:
+                body = await response.text()
+                if cache is not None:
+                    cache.store(target_url, status, body, response.headers)
+            else:
+                chunk = await response.content.read(max_bytes)
+                body = chunk.decode(response.charset or "utf8", errors="replace")
+            return status, body
+
+    @contextlib.asynccontextmanager
+    async def _open(self, target_url: str, http_method: str = "GET", **options):
+        """ Response to a request, whose body is read within the slot of its
+        host. Hosts answering with a Retry-After no longer than
+        `settings.max_retry_after` are waited for, then requested once more
+        """
+        scheduler = get_scheduler()
+        retries = 1
+        while True:
+            with async_span(http_method.upper(), "request", url=target_url) as traced:
+                async with scheduler.slot(target_url) as slot:
+                    async with self.session.request(
+                        method=http_method.lower(), url=target_url, **options
+                    ) as response:
+                        traced.set(status=response.status)
+                        retry_after = slot.throttled(response)
+                        if retries and 0 < retry_after <= settings.max_retry_after:
+                            # The slot waits for the host to accept requests
+                            # again
+                            retries -= 1
+                            continue
+                        if not self.canonical_url:
+                            # If there have been redirects, the canonical url
+                            # for the scan is not the provided, but the
+                            # resulting of the redirection.
+                            self.canonical_url = URL(str(response.url))
+                        yield response
+                        return
+
+    async def fetch_html_body(self, url: str):
+        """ Index body of the target, fetched once per scan. Failures are
+        kept as well, and raised again to every other finger of the scan
+        :raises TargetException
+        """
+        body = self.store.get_safe("INDEX_BODY")
+        if isinstance(body, general_exceptions.WpokeException):
+            raise body
+        if body is not None:
+            if not self.canonical_url:
+                self.canonical_url = self.store.get_safe("CANONICAL_URL")
+            return body
+        try:
+            with translate_client_errors(), stage(Stages.INDEX_FETCH):
+                status, body = await self._do_request(url, "GET", revalidate=True)
+            raise_on_failure(status_code=status, has_body=bool(body))
+        except general_exceptions.WpokeException as e:
+            self.store.set("INDEX_BODY", e)
+            raise
+        self.store.set("INDEX_BODY", body)
+        self.store.set("CANONICAL_URL", self.canonical_url)
+        return body
+
+    def get_html_document(self, html: str) -> HTMLDocument:
+        """ Document shared by every finger of the scan working on the same
+        html, usually the index body. Its tree is parsed once, lazily """
+        document = self.store.get_safe("INDEX_DOCUMENT")
+        # Fingers get the very same body object from the store, hence this
+        # comparison is an identity check most of the time
+        if document is None or document.html != html:
+            document = HTMLDocument(html)
+            self.store.set("INDEX_DOCUMENT", document)
+        return document
+
+    def get_html_tree(self, html: str):
+        return self.get_html_document(html).tree
+
+    async def parse_html_document(self, html: str) -> HTMLDocument:
+        """ Same as `get_html_document`, but large documents are parsed by
+        the executor so that the event loop keeps serving other scans """
+        document = self.get_html_document(html)
+        if not document.is_parsed:
+            with stage(Stages.HTML_PARSE):
+                await offload_to_thread(document.parse, size=len(html))
+        return document
+
+    async def fetch_html_document(self, url: str) -> HTMLDocument:
+        return await self.parse_html_document(await self.fetch_html_body(url))
@@ -63,5 +63,25 @@ class DuplicatedFingerException(WpokeException):
     pass
 
 
+class FingerNotFoundException(WpokeException):
+    pass
+
+
+class DuplicatedXPathException(WpokeException):
+    pass
+
+
+class DuplicatedMetricException(WpokeException):
+    pass
+
+
+class InvalidJobException(WpokeException):
+    pass
+
+
+class ServiceBusyException(WpokeException):
+    pass
+
+
 class DataStoreAttributeNotFound(AttributeError):
     pass
@@ -0,0 +1,65 @@
+import asyncio
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from .conf import ExecutorKinds, settings
+
+T = TypeVar("T")
+
+_executors: Dict[str, Executor] = {}
+
+
+def get_executor(kind: str) -> Executor:
+    """ Pools are created on first use and live as long as the process does,
+    shared by every scan """
+    executor = _executors.get(kind)
+    if executor is None:
+        workers = settings.executor_workers or None
+        if kind == ExecutorKinds.PROCESS.value:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="wpoke-parse"
+            )
+        _executors[kind] = executor
+    return executor
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    while _executors:
+        _, executor = _executors.popitem()
+        executor.shutdown(wait=wait)
+
+
+def should_offload(size: Optional[int]) -> bool:
+    if settings.executor == ExecutorKinds.INLINE.value:
+        return False
+    return size is None or size >= settings.offload_threshold
+
+
+async def offload(func: Callable[..., T], *args, size: Optional[int] = None) -> T:
+    """ Runs CPU bound `func` on the configured executor when the input it
+    works on, `size` characters long, is above `settings.offload_threshold`.
+    Smaller inputs are cheaper to handle inline than to ship to a worker.
+
+    With a process executor, `func` must be a module level function and its
+    arguments and result picklable.
+    """
+    if not should_offload(size):
+        return func(*args)
+    loop = asyncio.get_event_loop()
+    executor = get_executor(settings.executor)
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+async def offload_to_thread(
+    func: Callable[..., T], *args, size: Optional[int] = None
+) -> T:
+    """ Same as `offload`, but always on threads. Meant for work producing
+    objects which cannot cross process boundaries, such as lxml trees """
+    if not should_offload(size):
+        return func(*args)
+    loop = asyncio.get_event_loop()
+    executor = get_executor(ExecutorKinds.THREAD.value)
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
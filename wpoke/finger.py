@@ -1,12 +1,13 @@
 from abc import ABCMeta
 from abc import abstractmethod
-from typing import AnyStr
+from typing import AnyStr, TYPE_CHECKING
 
-from aiohttp import ClientSession
+if TYPE_CHECKING:  # pragma: nocover
+    from aiohttp import ClientSession
 
 
 class BaseFinger(metaclass=ABCMeta):
-    def __init__(self, session: ClientSession):
+    def __init__(self, session: "ClientSession"):
         self.session = session
 
     def get_session(self):
@@ -1 +1,59 @@
-from .theme import ThemeFinger
+from typing import Dict, Iterable, Optional
+
+from wpoke.conf import settings
+from .loading import FingerSpec, discover_fingers
+
+# Fingers shipped with wpoke. Their modules are imported only when selected
+BUILTIN_FINGERS: Dict[str, FingerSpec] = {
+    "theme": FingerSpec(
+        name="theme",
+        path="wpoke.fingers.theme:ThemeFinger",
+        lookup_name="theme_metadata",
+        short_flag="-t",
+        long_flag="--theme",
+        help_text="Display themes information",
+    ),
+    "plugins": FingerSpec(
+        name="plugins",
+        path="wpoke.fingers.plugins:PluginsFinger",
+        lookup_name="plugins",
+        short_flag="-p",
+        long_flag="--plugins",
+        help_text="Display plugins information. Set a wordlist to probe "
+        "for plugins not referenced by the index page",
+    ),
+    "core_version": FingerSpec(
+        name="core_version",
+        path="wpoke.fingers.version:CoreVersionFinger",
+        lookup_name="core_version",
+        short_flag="-V",
+        long_flag="--core-version",
+        help_text="Display WordPress core version",
+    ),
+    "rest_api": FingerSpec(
+        name="rest_api",
+        path="wpoke.fingers.rest:RestApiFinger",
+        lookup_name="rest_api",
+        short_flag="-a",
+        long_flag="--rest-api",
+        help_text="Display what the REST API discloses: namespaces, routes "
+        "and users",
+    ),
+}
+
+
+def get_installed_fingers(
+    installed: Optional[Iterable[str]] = None,
+) -> Dict[str, FingerSpec]:
+    if installed is None:
+        installed = settings.installed_fingers
+    return discover_fingers(installed, BUILTIN_FINGERS)
+
+
+def __getattr__(name):
+    # Backwards compatible access to finger classes, e.g
+    # `from wpoke.fingers import ThemeFinger`, without eager imports
+    for spec in BUILTIN_FINGERS.values():
+        if spec.path.endswith(f":{name}"):
+            return spec.load()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,108 @@
+import importlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from wpoke.exceptions import FingerNotFoundException
+
+ENTRY_POINT_GROUP = "wpoke.fingers"
+
+
+@dataclass(frozen=True)
+class FingerSpec:
+    """ Everything needed to offer a finger on the CLI without importing it.
+    The finger class is only imported once it has been selected to run.
+
+    :param name: Name used in `settings.installed_fingers` and, by default,
+        as CLI long flag
+    :param path: Where the finger class lives, as "package.module:ClassName"
+    :param lookup_name: Name the finger is registered with in a `Hand`.
+        Defaults to the finger `Meta.name`
+    """
+
+    name: str
+    path: str
+    lookup_name: Optional[str] = None
+    short_flag: Optional[str] = None
+    long_flag: Optional[str] = None
+    help_text: Optional[str] = None
+
+    @property
+    def cli_flags(self) -> List[str]:
+        flags = [self.short_flag, self.long_flag or f"--{self.name}"]
+        return [flag.replace("_", "-") for flag in flags if flag]
+
+    @property
+    def dest(self) -> str:
+        return f"finger_{self.name}"
+
+    def load(self):
+        """
+        :raises FingerNotFoundException
+        :return: The finger class
+        """
+        module_name, _, attr = self.path.partition(":")
+        try:
+            module = importlib.import_module(module_name)
+            return getattr(module, attr)
+        except (ImportError, AttributeError) as e:
+            msg = f"finger {self.name} could not be loaded from {self.path}"
+            raise FingerNotFoundException(msg) from e
+
+
+def spec_from_path(path: str) -> FingerSpec:
+    """ Accepts either "package.module:ClassName" or "package.module.ClassName" """
+    if ":" not in path:
+        module_name, _, attr = path.rpartition(".")
+        path = f"{module_name}:{attr}"
+    name = path.rpartition(":")[2].lower()
+    return FingerSpec(name=name, path=path)
+
+
+def _iter_entry_points():
+    try:
+        from importlib import metadata
+    except ImportError:  # Python < 3.8
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            return []
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return entry_points.select(group=ENTRY_POINT_GROUP)
+    return entry_points.get(ENTRY_POINT_GROUP, [])
+
+
+def entry_point_specs() -> Dict[str, FingerSpec]:
+    """ Fingers registered by third party distributions under the
+    "wpoke.fingers" entry point group. Only distribution metadata is read """
+    return {
+        entry_point.name: FingerSpec(name=entry_point.name, path=entry_point.value)
+        for entry_point in _iter_entry_points()
+    }
+
+
+def discover_fingers(
+    installed: Iterable[str], builtins: Dict[str, FingerSpec]
+) -> Dict[str, FingerSpec]:
+    """ Resolves every entry of `settings.installed_fingers` into a finger
+    spec. Entries can be names of built-in fingers, names of fingers
+    published through entry points or dotted paths to finger classes.
+
+    :raises FingerNotFoundException
+    """
+    specs = {}
+    entry_points = None
+    for item in installed:
+        if item in builtins:
+            spec = builtins[item]
+        elif "." in item or ":" in item:
+            spec = spec_from_path(item)
+        else:
+            if entry_points is None:
+                entry_points = entry_point_specs()
+            if item not in entry_points:
+                raise FingerNotFoundException(f"finger {item} is not installed")
+            spec = entry_points[item]
+        specs[spec.name] = spec
+    return specs
@@ -0,0 +1,46 @@
+import contextlib
+import json
+import sys
+from typing import AnyStr, Dict
+
+from wpoke.conf import settings, RenderFormats
+from wpoke.crawler import CrawlerConfiguration
+from wpoke.finger import BaseFinger
+from .crawler import WPPluginCrawler, iter_wordlist
+from .serializers import WPPluginMetadataSerializer, WPPluginProbeReportSerializer
+
+
+class PluginsFinger(BaseFinger):
+    class Meta:
+        name = "plugins"
+        # Seconds results stay fresh in the result cache
+        cache_ttl = 3600
+
+    class Cli:
+        help_text = "Display plugins information"
+        required = False
+        short_flag = "-p"
+        long_flag = "--plugins"
+
+    async def run(self, target: AnyStr, **options) -> Dict:
+        crawler = WPPluginCrawler(self.session, CrawlerConfiguration.from_settings())
+        with contextlib.ExitStack() as stack:
+            slugs = None
+            if settings.wordlist:
+                fd = stack.enter_context(open(settings.wordlist, encoding="utf8"))
+                slugs = iter_wordlist(fd)
+            plugins, report = await crawler.get_plugins(
+                target,
+                slugs,
+                concurrency=settings.probe_concurrency,
+                budget=settings.probe_budget,
+            )
+        return {
+            "plugins": WPPluginMetadataSerializer(plugins, many=True).data,
+            "probe": WPPluginProbeReportSerializer(report).data if report else None,
+        }
+
+    def render(self, result, out=sys.stdout, **kwargs) -> None:
+        fmt = settings.output_format
+        if not fmt or fmt == RenderFormats.JSON.value:
+            print(json.dumps(result, indent=4), file=out)
@@ -0,0 +1,224 @@
+import asyncio
+import re
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import aiohttp
+
+from wpoke.client import URL
+from wpoke.crawler import BaseCrawler, translate_client_errors
+from wpoke.exceptions import ValidationError
+from wpoke.executor import offload
+from wpoke.validators.url import validate_url
+from .models import (
+    FOUND_BY_INDEX,
+    FOUND_BY_README,
+    WPPluginMetadata,
+    WPPluginProbeReport,
+)
+
+PLUGIN_PATH_RE = re.compile(
+    r"/wp-content/plugins/([a-z0-9][a-z0-9_.\-]*)/([^\s\"'<>]*)", re.IGNORECASE
+)
+VERSION_QUERY_RE = re.compile(r"[?&](?:amp;)?ver=([\w.\-]+)")
+STABLE_TAG_RE = re.compile(r"^[ \t]*stable tag:[ \t]*([\w.\-]+)", re.I | re.M)
+SLUG_RE = re.compile(r"^[a-z0-9][a-z0-9_.\-]*$")
+URL_START_RE = re.compile(r"//|https?://", re.IGNORECASE)
+URL_DELIMITERS = (" ", "\t", "\n", "\r", '"', "'", "<", ">", "(", ")", "=", ",")
+# Characters looked back from a plugin path for the origin it is served from
+MAX_URL_PREFIX_LENGTH = 256
+
+# Bytes of readme.txt fetched to read its stable tag, which lives in the
+# header
+README_MAX_BYTES = 2048
+# A host answering 200 to this ratio of probes is considered a catch-all
+CATCH_ALL_MIN_PROBES = 20
+CATCH_ALL_HIT_RATIO = 0.9
+# The host is most likely blocking us after this many errors in a row
+MAX_CONSECUTIVE_ERRORS = 20
+
+PROBE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def _url_prefix(html: str, start: int) -> str:
+    """ What precedes the plugin path at `start` in its url, usually the
+    scheme and host, or nothing for relative urls """
+    lower_bound = max(0, start - MAX_URL_PREFIX_LENGTH)
+    token_start = max(html.rfind(c, lower_bound, start) for c in URL_DELIMITERS)
+    token_start = max(token_start + 1, lower_bound)
+    return html[token_start:start]
+
+
+def is_same_site(prefix: str, url: str) -> bool:
+    """ Whether a plugin path preceded by `prefix` is served by the site at
+    `url`. Relative paths are """
+    match = URL_START_RE.search(prefix)
+    if match is None:
+        return True
+    start = match.start()
+    origin = prefix[start:]
+    if origin.startswith("//"):
+        origin = f"http:{origin}"
+    try:
+        return validate_url.is_same_origin(f"{origin}/", url)
+    except ValidationError:
+        return False
+
+
+def extract_plugins_from_html(url: str, html: str) -> Dict[str, WPPluginMetadata]:
+    """ Passively collects plugins referenced by assets and links under
+    /wp-content/plugins/ in a html document. Only paths sharing the origin of
+    `url`, or relative to it, are taken: CDNs, embeds and links to other
+    blogs are not the plugins of the site. Asset versions, as in
+    `?ver=1.2.3`, are taken as a hint of the plugin version """
+    plugins = {}
+    for match in PLUGIN_PATH_RE.finditer(html):
+        if not is_same_site(_url_prefix(html, match.start()), url):
+            continue
+        slug = match.group(1).lower()
+        plugin = plugins.get(slug)
+        if plugin is None:
+            plugin = plugins[slug] = WPPluginMetadata(slug=slug)
+            plugin.add_evidence(FOUND_BY_INDEX)
+        if plugin.version is None:
+            version = VERSION_QUERY_RE.search(match.group(2))
+            if version:
+                plugin.version = version.group(1)
+    return plugins
+
+
+def iter_wordlist(fd: TextIO) -> Iterator[str]:
+    """ Lazily yields valid plugin slugs from a wordlist, one per line """
+    for line in fd:
+        slug = line.strip().lower()
+        if slug and SLUG_RE.match(slug):
+            yield slug
+
+
+class WPPluginCrawler(BaseCrawler):
+    def plugins_base_url(self) -> str:
+        return f"{self.canonical_url.site_root()}wp-content/plugins/"
+
+    async def readme_exists(self, readme_url: str) -> bool:
+        status, _ = await self._do_request(readme_url, "HEAD")
+        return 200 <= status <= 299
+
+    async def probe_readme(
+        self, base_url: str, slug: str
+    ) -> Optional[WPPluginMetadata]:
+        """ Checks whether the plugin readme.txt exists with a HEAD request,
+        then reads the header of the existing ones to get their version """
+        readme_url = f"{base_url}{slug}/readme.txt"
+        if not await self.readme_exists(readme_url):
+            return None
+
+        plugin = WPPluginMetadata(slug=slug, readme_url=readme_url)
+        plugin.add_evidence(FOUND_BY_README)
+        status, body = await self._do_request(
+            readme_url,
+            "GET",
+            headers={"Range": f"bytes=0-{README_MAX_BYTES - 1}"},
+            max_bytes=README_MAX_BYTES,
+        )
+        if 200 <= status <= 299:
+            match = STABLE_TAG_RE.search(body)
+            if match and match.group(1).lower() != "trunk":
+                plugin.version = match.group(1)
+        return plugin
+
+    async def probe(
+        self,
+        slugs: Iterable[str],
+        plugins: Dict[str, WPPluginMetadata],
+        concurrency: int,
+        budget: float,
+    ) -> WPPluginProbeReport:
+        """ Probes readme.txt for every slug, with at most `concurrency`
+        requests in flight against the host, for `budget` seconds at most.
+        Found plugins are merged into `plugins`.
+
+        Probing is aborted early once the host looks like it answers 200 to
+        everything, as any finding would be meaningless.
+        """
+        report = WPPluginProbeReport()
+        base_url = self.plugins_base_url()
+
+        canary = f"wpoke-{uuid.uuid4().hex[:12]}"
+        if await self.readme_exists(f"{base_url}{canary}/readme.txt"):
+            report.catch_all = True
+            report.aborted_reason = "host answers to any plugin"
+            return report
+
+        slugs = iter(slugs)
+        found: Dict[str, WPPluginMetadata] = {}
+        consecutive_errors = 0
+
+        async def worker():
+            nonlocal consecutive_errors
+            for slug in slugs:
+                if report.aborted_reason:
+                    return
+                try:
+                    plugin = await self.probe_readme(base_url, slug)
+                except PROBE_ERRORS:
+                    report.errors += 1
+                    consecutive_errors += 1
+                    if consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+                        report.aborted_reason = "too many consecutive errors"
+                    continue
+                consecutive_errors = 0
+                report.probed += 1
+                if plugin is not None:
+                    found[slug] = plugin
+                if (
+                    report.probed >= CATCH_ALL_MIN_PROBES
+                    and len(found) / report.probed >= CATCH_ALL_HIT_RATIO
+                ):
+                    report.catch_all = True
+                    report.aborted_reason = "host answers to any plugin"
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        done, pending = await asyncio.wait(workers, timeout=budget)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            # Unexpected errors are not swallowed
+            task.result()
+
+        if pending and not report.aborted_reason:
+            report.aborted_reason = "time budget exhausted"
+        report.completed = not report.aborted_reason
+
+        if not report.catch_all:
+            for slug, plugin in found.items():
+                if slug in plugins:
+                    plugins[slug].add_evidence(FOUND_BY_README)
+                    plugins[slug].readme_url = plugin.readme_url
+                    plugins[slug].version = plugin.version or plugins[slug].version
+                else:
+                    plugins[slug] = plugin
+        return report
+
+    async def get_plugins(
+        self,
+        url: str,
+        slugs: Optional[Iterable[str]] = None,
+        concurrency: int = 10,
+        budget: float = 60,
+    ) -> Tuple[List[WPPluginMetadata], Optional[WPPluginProbeReport]]:
+        report = None
+        with translate_client_errors():
+            html_content = await self.fetch_html_body(url)
+            if not self.canonical_url:
+                self.canonical_url = URL(url)
+            html_content = html_content or ""
+            plugins = await offload(
+                extract_plugins_from_html,
+                str(self.canonical_url),
+                html_content,
+                size=len(html_content),
+            )
+            if slugs is not None:
+                report = await self.probe(slugs, plugins, concurrency, budget)
+        return sorted(plugins.values(), key=lambda p: p.slug), report
@@ -0,0 +1,28 @@
+from dataclasses import dataclass, field
+from typing import AnyStr, List
+
+FOUND_BY_INDEX = "index"
+FOUND_BY_README = "readme"
+
+
+@dataclass
+class WPPluginMetadata:
+    slug: AnyStr = None
+    version: AnyStr = None
+    readme_url: AnyStr = None
+    found_by: List[AnyStr] = field(default_factory=list)
+
+    def add_evidence(self, found_by: AnyStr) -> None:
+        if found_by not in self.found_by:
+            self.found_by.append(found_by)
+
+
+@dataclass
+class WPPluginProbeReport:
+    """ Outcome of actively probing for plugins from a wordlist """
+
+    probed: int = 0
+    errors: int = 0
+    catch_all: bool = False
+    completed: bool = False
+    aborted_reason: AnyStr = None
@@ -0,0 +1,16 @@
+import serpy
+
+
+class WPPluginMetadataSerializer(serpy.Serializer):
+    slug = serpy.StrField(required=True)
+    version = serpy.StrField(required=False)
+    readme_url = serpy.StrField(required=False)
+    found_by = serpy.Field(required=True)
+
+
+class WPPluginProbeReportSerializer(serpy.Serializer):
+    probed = serpy.IntField(required=True)
+    errors = serpy.IntField(required=True)
+    catch_all = serpy.BoolField(required=True)
+    completed = serpy.BoolField(required=True)
+    aborted_reason = serpy.StrField(required=False)
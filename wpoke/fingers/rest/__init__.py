@@ -0,0 +1,37 @@
+import json
+import sys
+from typing import AnyStr, Dict
+
+from wpoke.conf import settings, RenderFormats
+from wpoke.crawler import CrawlerConfiguration
+from wpoke.finger import BaseFinger
+from .crawler import WPRestApiCrawler
+from .serializers import WPRestApiSerializer
+
+
+class RestApiFinger(BaseFinger):
+    class Meta:
+        name = "rest_api"
+        # Seconds results stay fresh in the result cache
+        cache_ttl = 900
+
+    class Cli:
+        help_text = "Display what the REST API discloses: namespaces, routes and users"
+        required = False
+        short_flag = "-a"
+        long_flag = "--rest-api"
+
+    async def run(self, target: AnyStr, **options) -> Dict:
+        crawler = WPRestApiCrawler(self.session, CrawlerConfiguration.from_settings())
+        rest_api = await crawler.get_rest_api(
+            target,
+            max_bytes=settings.rest_max_bytes,
+            max_pages=settings.rest_max_pages,
+            concurrency=settings.probe_concurrency,
+        )
+        return WPRestApiSerializer(rest_api).data
+
+    def render(self, result, out=sys.stdout, **kwargs) -> None:
+        fmt = settings.output_format
+        if not fmt or fmt == RenderFormats.JSON.value:
+            print(json.dumps(result, indent=4), file=out)
@@ -0,0 +1,242 @@
+import asyncio
+import codecs
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlencode, urljoin
+
+import aiohttp
+
+from wpoke.client import URL
+from wpoke.crawler import BaseCrawler, translate_client_errors
+from wpoke.exceptions import WpokeException
+from wpoke.html import register_xpath
+from wpoke.jsonstream import (
+    END_MAP,
+    MAP_KEY,
+    NUMBER,
+    START_MAP,
+    STRING,
+    JSONStreamError,
+    JSONStreamParser,
+)
+from .models import WPRestApi, WPRestUser
+
+API_LINK_XPATH = "rest_api.link"
+
+register_xpath(API_LINK_XPATH, '//link[@rel="https://api.w.org/"]/@href')
+
+CHUNK_SIZE = 16 * 1024
+MAX_ROUTES = 500
+MAX_USERS = 1000
+USERS_PER_PAGE = 100
+
+EventHandler = Callable[[str, str, object], None]
+# Failures of a users page, which cut the listing short without failing the
+# finger
+PAGE_ERRORS = (
+    JSONStreamError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    WpokeException,
+)
+
+
+def route_url(api_root: str, route: str, params: Optional[Dict] = None) -> str:
+    """ Both pretty (/wp-json/wp/v2/users) and plain permalink
+    (/?rest_route=/wp/v2/users) API roots are supported """
+    url = api_root.rstrip("/") + route
+    if not params:
+        return url
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}{urlencode(params)}"
+
+
+def _int_header(headers: Mapping, name: str) -> Optional[int]:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class IndexHandler:
+    """ Picks site name, namespaces and route names out of the API index.
+    Route definitions, the bulk of the document, are skipped over """
+
+    def __init__(self, result: WPRestApi, max_routes: int = MAX_ROUTES):
+        self.result = result
+        self.max_routes = max_routes
+
+    def __call__(self, prefix: str, event: str, value) -> None:
+        result = self.result
+        if prefix == "routes" and event == MAP_KEY:
+            result.routes_count += 1
+            if value and len(result.routes) < self.max_routes:
+                result.routes.append(value)
+        elif event == STRING:
+            if prefix == "namespaces.item":
+                result.namespaces.append(value)
+            elif prefix == "name":
+                result.name = value
+            elif prefix == "description":
+                result.description = value
+
+
+class UsersHandler:
+    """ Collects id, slug and name of every user of a users listing page """
+
+    def __init__(self, users: List[WPRestUser], max_users: int = MAX_USERS):
+        self.users = users
+        self.max_users = max_users
+        self._user = None
+
+    def __call__(self, prefix: str, event: str, value) -> None:
+        if prefix == "item":
+            if event == START_MAP:
+                self._user = WPRestUser()
+            elif event == END_MAP:
+                if len(self.users) < self.max_users:
+                    self.users.append(self._user)
+                self._user = None
+        elif self._user is not None:
+            if prefix == "item.id" and event == NUMBER:
+                self._user.id = value
+            elif prefix == "item.slug" and event == STRING:
+                self._user.slug = value
+            elif prefix == "item.name" and event == STRING:
+                self._user.name = value
+
+
+class WPRestApiCrawler(BaseCrawler):
+    def discover_api_roots(self, html: str) -> List[str]:
+        """ The API root is advertised by the index page. Otherwise, both the
+        pretty and the plain permalink roots are guessed """
+        for href in self.get_html_document(html).xpath(API_LINK_XPATH):
+            try:
+                # Scheme relative links follow the scheme of the site
+                api_root = URL(urljoin(str(self.canonical_url), href.strip()))
+            except ValueError:
+                continue
+            # Never follow the API root off the scanned site
+            if api_root.host == self.canonical_url.host:
+                return [str(api_root)]
+        site_root = self.canonical_url.site_root()
+        return [f"{site_root}wp-json/", f"{site_root}?rest_route=/"]
+
+    async def stream_json(
+        self, url: str, handler: EventHandler, max_bytes: int
+    ) -> Tuple[int, Mapping, bool]:
+        """ Feeds the JSON body of a response, chunk by chunk, to `handler`
+        without ever holding it entirely. At most `max_bytes` of the body
+        are read.
+
+        :raises JSONStreamError: the body is not JSON
+        :return: status, headers and whether the body was cut short
+        """
+        options = self.request_options
+        options["headers"] = {**options["headers"], "Accept": "application/json"}
+        async with self._open(url, "GET", **options) as response:
+            if not 200 <= response.status <= 299:
+                return response.status, response.headers, False
+
+            parser = JSONStreamParser()
+            decoder = codecs.getincrementaldecoder(response.charset or "utf8")(
+                errors="replace"
+            )
+            remaining = max_bytes
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+                for event in parser.feed(decoder.decode(chunk)):
+                    handler(*event)
+                if remaining <= 0:
+                    # Whatever has been parsed so far is kept
+                    return response.status, response.headers, True
+
+            for event in parser.feed(decoder.decode(b"", final=True)):
+                handler(*event)
+            for event in parser.close():
+                handler(*event)
+            return response.status, response.headers, False
+
+    async def get_index(self, api_root: str, max_bytes: int) -> Optional[WPRestApi]:
+        result = WPRestApi(api_root=api_root)
+        try:
+            status, _, truncated = await self.stream_json(
+                route_url(api_root, "/"), IndexHandler(result), max_bytes
+            )
+        except JSONStreamError:
+            return None
+        if not 200 <= status <= 299:
+            return None
+        result.available = True
+        result.truncated = truncated
+        return result
+
+    async def get_users_page(
+        self, result: WPRestApi, page: int, max_bytes: int
+    ) -> Tuple[int, Mapping]:
+        url = route_url(
+            result.api_root, "/wp/v2/users", {"per_page": USERS_PER_PAGE, "page": page}
+        )
+        status, headers, truncated = await self.stream_json(
+            url, UsersHandler(result.users), max_bytes
+        )
+        result.truncated = result.truncated or truncated
+        return status, headers
+
+    async def get_users(
+        self, result: WPRestApi, max_bytes: int, max_pages: int, concurrency: int
+    ) -> None:
+        """ Reads the first page of users to learn how many pages there are,
+        then fetches the rest of them with at most `concurrency` requests in
+        flight. Pages failing to load leave the listing truncated """
+        try:
+            status, headers = await self.get_users_page(result, 1, max_bytes)
+        except JSONStreamError:
+            # Not a users listing
+            return
+        except PAGE_ERRORS:
+            result.truncated = True
+            return
+        if not 200 <= status <= 299:
+            return
+        result.users_total = _int_header(headers, "X-WP-Total")
+        total_pages = _int_header(headers, "X-WP-TotalPages") or 1
+        pages = iter(range(2, min(total_pages, max_pages) + 1))
+
+        async def worker():
+            for page in pages:
+                if len(result.users) >= MAX_USERS:
+                    return
+                try:
+                    await self.get_users_page(result, page, max_bytes)
+                except PAGE_ERRORS:
+                    result.truncated = True
+                    return
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # None is left writing into the result once it is returned
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        result.users.sort(key=lambda user: (user.id is None, user.id or 0))
+
+    async def get_rest_api(
+        self,
+        url: str,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_pages: int = 10,
+        concurrency: int = 10,
+    ) -> WPRestApi:
+        with translate_client_errors():
+            html_content = await self.fetch_html_body(url)
+            if not self.canonical_url:
+                self.canonical_url = URL(url)
+            for api_root in self.discover_api_roots(html_content or ""):
+                result = await self.get_index(api_root, max_bytes)
+                if result is not None:
+                    await self.get_users(result, max_bytes, max_pages, concurrency)
+                    return result
+        return WPRestApi()
@@ -0,0 +1,27 @@
+from dataclasses import dataclass, field
+from typing import AnyStr, List
+
+
+@dataclass
+class WPRestUser:
+    id: int = None
+    slug: AnyStr = None
+    name: AnyStr = None
+
+
+@dataclass
+class WPRestApi:
+    """ What the REST API of a site discloses. Routes and users are capped,
+    `routes_count` being the number of routes actually exposed """
+
+    api_root: AnyStr = None
+    available: bool = False
+    name: AnyStr = None
+    description: AnyStr = None
+    namespaces: List[AnyStr] = field(default_factory=list)
+    routes: List[AnyStr] = field(default_factory=list)
+    routes_count: int = 0
+    users: List[WPRestUser] = field(default_factory=list)
+    users_total: int = None
+    # Whether any response was cut short by the byte cap
+    truncated: bool = False
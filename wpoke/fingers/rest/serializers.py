@@ -0,0 +1,20 @@
+import serpy
+
+
+class WPRestUserSerializer(serpy.Serializer):
+    id = serpy.IntField(required=False)
+    slug = serpy.StrField(required=False)
+    name = serpy.StrField(required=False)
+
+
+class WPRestApiSerializer(serpy.Serializer):
+    api_root = serpy.StrField(required=False)
+    available = serpy.BoolField(required=True)
+    name = serpy.StrField(required=False)
+    description = serpy.StrField(required=False)
+    namespaces = serpy.Field(required=True)
+    routes = serpy.Field(required=True)
+    routes_count = serpy.IntField(required=True)
+    users = WPRestUserSerializer(many=True, required=True)
+    users_total = serpy.IntField(required=False)
+    truncated = serpy.BoolField(required=True)
@@ -2,8 +2,6 @@ import json
 import sys
 from typing import AnyStr, Dict, List
 
-import wpoke.exceptions
-from wpoke import exceptions as generic_exceptions
 from wpoke.conf import settings, RenderFormats
 from wpoke.finger import BaseFinger
 from wpoke.fingers.theme.serializers import WPThemeMetadataSerializer
@@ -13,6 +11,8 @@ from . import crawler as theme_crawler
 class ThemeFinger(BaseFinger):
     class Meta:
         name = "theme_metadata"
+        # Seconds results stay fresh in the result cache
+        cache_ttl = 6 * 3600
 
     class Cli:
         help_text = "Display themes information"
@@ -21,22 +21,11 @@ class ThemeFinger(BaseFinger):
         long_flag = "--theme"
 
     async def run(self, target: AnyStr, **options) -> List[Dict]:
-        try:
-            crawler_config = theme_crawler.WPThemeMetadataConfiguration(
-                timeout=settings.timeout,
-                user_agent=settings.user_agent,
-                max_redirects=settings.max_redirects,
-            )
-            crawler = theme_crawler.WPThemeMetadataCrawler(self.session, crawler_config)
-            themes = await crawler.get_theme(target)
-        except wpoke.exceptions.BundledThemeException as e:
-            print(e.message)
-        except generic_exceptions.TargetTimeout:
-            timeout = settings.timeout
-            print(f"Target timeout. Try to set a value higher than {timeout}")
-        else:
-            serializer = WPThemeMetadataSerializer(themes, many=True)
-            return serializer.data
+        crawler_config = theme_crawler.WPThemeMetadataConfiguration.from_settings()
+        crawler = theme_crawler.WPThemeMetadataCrawler(self.session, crawler_config)
+        themes = await crawler.get_theme(target)
+        serializer = WPThemeMetadataSerializer(themes, many=True)
+        return serializer.data
 
     def render(self, result, out=sys.stdout, **kwargs) -> None:
         fmt = settings.output_format
@@ -1,48 +1,71 @@
-import asyncio
-import itertools
+import functools
 import re
-from dataclasses import dataclass
-from io import StringIO
-from typing import List, Optional, Set, Iterator, Union
-
-import aiohttp
-from aiohttp import ClientSession
-
-from lxml import etree
+from typing import List, Optional, Pattern, Set, Iterator, Union
 
 from wpoke import exceptions as general_exceptions
 from wpoke.client import URL
-from wpoke.conf import settings
-from wpoke.exceptions import ThemePathMissingException, BundledThemeException
-from wpoke.store import peek_store
+from wpoke.crawler import (
+    BaseCrawler,
+    CrawlerConfiguration,
+    raise_on_failure,
+    translate_client_errors,
+)
+from wpoke.exceptions import (
+    BundledThemeException,
+    ThemePathMissingException,
+    ValidationError,
+)
+from wpoke.executor import offload
 from wpoke.validators.url import validate_url
+from wpoke.html import HTMLDocument, register_xpath
+from wpoke.httpcache import get_http_cache
+from wpoke.profiling import Stages, stage
+from .fingerprints import fingerprint, get_fingerprints, screenshot_key
 from .models import WPThemeMetadata, WPThemeModelDisplay
 
+THEME_ASSETS_XPATH = "theme.assets"
+
+register_xpath(
+    THEME_ASSETS_XPATH,
+    '//link[contains(@href, "/wp-content/themes/")]/@href'
+    ' | //script[contains(@src, "/wp-content/themes/")]/@src',
+)
+
+
+THEMES_DIR = "/wp-content/themes/"
+# WordPress itself only reads this many bytes of style.css for its header
+# https://github.com/WordPress/WordPress/blob/aab929b8d619bde14495a97cdc1eb7bdf1f1d487/wp-includes/functions.php#L5156
+STYLE_CSS_HEADER_SIZE = 8192
+# Longer urls are junk, if not hostile
+MAX_URL_LENGTH = 2048
+# Max number of theme urls picked out of a single document
+MAX_THEME_URLS = 100
+# Characters urls embedded in a document never span across
+URL_DELIMITERS = (" ", "\t", "\n", "\r", '"', "'", "<", ">", "(", ")")
 
-def raise_on_failure(status_code: int, has_body: bool) -> None:
-    if 400 <= status_code < 500:
-        # Some 4XX responses are served by WordPress, therefore still
-        # prone to yield interesting data
-        if not has_body:
-            raise general_exceptions.TargetNotFound
-    elif status_code > 499:
-        raise general_exceptions.TargetInternalServerError
+THEME_SLUG_RE = re.compile(r"[_\-\w+\.]+/")
+GLOBAL_THEME_SLUG_RE = re.compile(r"[\w\-]+/")
+URL_START_RE = re.compile(r"//|https?", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=None)
+def _header_regex(name: str) -> Pattern:
+    # https://github.com/WordPress/WordPress/blob/aab929b8d619bde14495a97cdc1eb7bdf1f1d487/wp-includes/functions.php#L5182
+    return re.compile(f"^[ \t/*#@]*{name}:(?P<meta_value>.*)$", re.IGNORECASE | re.M)
 
 
 def extract_info_from_css(css_content: str) -> WPThemeMetadata:
-    """ Extract css theme metadata into WPThemeMetadata model
+    """ Extract css theme metadata into WPThemeMetadata model. Only the
+    header, within the first 8 KB, is looked at
     :param css_content: raw style.css content
     :return: WPThemeMetadata
     """
     any_match = False
     wp_meta = WPThemeMetadata()
-    css_content = css_content.replace("\r", "\n")
+    css_content = css_content[:STYLE_CSS_HEADER_SIZE].replace("\r", "\n")
 
     for k, v in WPThemeModelDisplay():
-        # https://github.com/WordPress/WordPress/blob/aab929b8d619bde14495a97cdc1eb7bdf1f1d487/wp-includes/functions.php#L5182
-        regex_ = f"^[ \t/*#@]*{v}:(?P<meta_value>.*)$"
-        regex = re.compile(regex_, re.IGNORECASE | re.M)
-        match = re.search(regex, css_content)
+        match = _header_regex(v).search(css_content)
 
         if match:
             meta_value = match.group("meta_value").strip()
@@ -55,13 +78,37 @@ def extract_info_from_css(css_content: str) -> WPThemeMetadata:
     return wp_meta
 
 
-def truncate_theme_url(url: str) -> str:
+def _theme_dir_end(text: str, marker: int, slug_re: Pattern) -> Optional[int]:
+    """ End of the theme directory whose THEMES_DIR starts at `marker` """
+    match = slug_re.match(text, marker + len(THEMES_DIR))
+    return match.end() if match else None
+
+
+def truncate_theme_url(url: str) -> Optional[str]:
     """
     :param url: Full url containing the /wp-content/themes sub string
-    :return: url from protocol scheme to theme name
+    :return: url from protocol scheme to theme name. None if it has no
+        theme directory, or is way too long for a url
     """
-    regex = re.compile(r".*/wp-content/themes/[_\-\w+\.]+/")
-    return regex.search(url).group()
+    if len(url) > MAX_URL_LENGTH:
+        return None
+    # Same result as matching `.*/wp-content/themes/[_\-\w+\.]+/`, without
+    # its backtracking: the last theme directory of the first line having any
+    marker = url.find(THEMES_DIR)
+    while marker != -1 and _theme_dir_end(url, marker, THEME_SLUG_RE) is None:
+        marker = url.find(THEMES_DIR, marker + 1)
+    if marker == -1:
+        return None
+    line_start = url.rfind("\n", 0, marker) + 1
+    line_end = url.find("\n", marker)
+    if line_end == -1:
+        line_end = len(url)
+    last = url.rfind(THEMES_DIR, marker, line_end)
+    while True:
+        end = _theme_dir_end(url, last, THEME_SLUG_RE)
+        if end is not None:
+            return url[line_start:end]
+        last = url.rfind(THEMES_DIR, marker, last)
 
 
 def remove_duplicated_theme_urls(urls: Union[List[str], Iterator[str]]) -> Set[str]:
@@ -69,75 +116,115 @@ def remove_duplicated_theme_urls(urls: Union[List[str], Iterator[str]]) -> Set[s
     :param urls: All urls containing /wp-content/themes/
     :return: set of unique urls from protocol scheme to theme name
     """
-    return {truncate_theme_url(url) for url in urls}
+    result = set()
+    for url in urls:
+        theme_url = truncate_theme_url(url)
+        if theme_url is not None:
+            result.add(theme_url)
+    return result
+
+
+def iter_theme_urls_in_text(text: str) -> Iterator[str]:
+    """ Urls of theme directories found anywhere in the text, ignoring
+    markup: from the first `//` or `http` of the token they are part of up
+    to the theme name.
+
+    Runs in linear time whatever the text is. Each theme directory is looked
+    up by plain substring search, then its url is searched for backwards, no
+    further than MAX_URL_LENGTH nor the previous theme directory.
+    """
+    previous_end = 0
+    marker = text.find(THEMES_DIR)
+    while marker != -1:
+        end = _theme_dir_end(text, marker, GLOBAL_THEME_SLUG_RE)
+        lower_bound = max(previous_end, marker - MAX_URL_LENGTH)
+        previous_end = marker + len(THEMES_DIR)
+        if end is not None:
+            token_start = max(
+                text.rfind(c, lower_bound, marker) for c in URL_DELIMITERS
+            )
+            token_start = max(token_start + 1, lower_bound)
+            match = URL_START_RE.search(text, token_start, marker)
+            if match is not None:
+                start = match.start()
+                previous_end = end
+                yield text[start:end]
+        marker = text.find(THEMES_DIR, previous_end)
 
 
 def extract_theme_path_by_global_regex(url: URL, html: str) -> Optional[List[str]]:
-    """ Performs a cross text search in the document, ignoring markup. """
-    regex_str = r"(?://|https?)(?:.*?)/wp-content/themes/[\d\w\-_]+/"
-    regex = re.compile(regex_str, re.IGNORECASE)
-    result = re.findall(regex, html)
-
-    if result is None:
-        return list()
-
-    return [match for match in result if validate_url.is_same_origin(match, str(url))]
-
-
-@dataclass
-class WPThemeMetadataConfiguration:
-    timeout: int = settings.timeout
-    user_agent: str = settings.user_agent
-    max_redirects: int = settings.max_redirects
-    ssl_enabled: bool = settings.ssl_enabled
-
-
-class WPThemeMetadataCrawler:
-    def __init__(
-        self,
-        http_session: ClientSession,
-        http_config: Optional[WPThemeMetadataConfiguration] = None,
-        canonical_url: Optional[URL] = None,
-    ):
-        self.canonical_url = canonical_url
-        self.session = http_session
-        self.http_config = http_config or WPThemeMetadataConfiguration()
-        self.store = peek_store()
-
-    @property
-    def request_options(self):
-        return dict(
-            ssl=self.http_config.ssl_enabled,
-            timeout=self.http_config.timeout,
-            max_redirects=self.http_config.max_redirects,
-            headers={"User-Agent": self.http_config.user_agent},
-        )
-
-    async def _do_request(self, target_url: str, http_method: str = "GET"):
-        async with self.session.request(
-            method=http_method.lower(), url=target_url, **self.request_options
-        ) as response:
-            body = await response.text()
-            if not self.canonical_url:
-                # If there have been redirects, the canonical url for the scan
-                # is not the provided, but the resulting of the redirection.
-                self.canonical_url = URL(str(response.url))
-            return response.status, body
-
-    async def fetch_html_body(self, url: str):
-        if self.store.has("INDEX_BODY"):
-            return self.store.INDEX_BODY
-        status, body = await self._do_request(url, "GET")
-        raise_on_failure(status_code=status, has_body=bool(body))
-        self.store.INDEX_BODY = body
-        return body
+    """ Performs a cross text search in the document, ignoring markup. At
+    most MAX_THEME_URLS urls sharing the origin of `url` are returned """
+    result = []
+    for match in iter_theme_urls_in_text(html):
+        try:
+            same_origin = validate_url.is_same_origin(match, str(url))
+        except ValidationError:
+            continue
+        if same_origin:
+            result.append(match)
+            if len(result) >= MAX_THEME_URLS:
+                break
+    return result
+
 
+class WPThemeMetadataConfiguration(CrawlerConfiguration):
+    pass
+
+
+class WPThemeMetadataCrawler(BaseCrawler):
     async def fetch_style_css(self, url: str):
-        status, css_content = await self._do_request(url, "GET")
-        css_length = len(css_content)
+        with stage(Stages.STYLE_CSS_FETCH):
+            status, css_content = await self._do_request(url, "GET", revalidate=True)
         raise_on_failure(status_code=status, has_body=bool(css_content))
-        # https://github.com/WordPress/WordPress/blob/aab929b8d619bde14495a97cdc1eb7bdf1f1d487/wp-includes/functions.php#L5156
-        return css_content[: (8192 if css_length >= 8192 else css_length)]
+        return css_content[:STYLE_CSS_HEADER_SIZE]
+
+    async def parse_style_css(self, url: str, css_content: str) -> WPThemeMetadata:
+        """ Theme metadata of the style.css at `url`. Parsing is skipped when
+        the very same header has been seen before, on any site, or when the
+        HTTP cache holds the parse of this url
+        :raises BundledThemeException
+        """
+        fingerprints = get_fingerprints()
+        digest = None
+        if fingerprints is not None:
+            digest = fingerprint(css_content[:STYLE_CSS_HEADER_SIZE])
+            theme_model = fingerprints.get_theme(digest)
+            if theme_model is not None:
+                return theme_model
+        cache = get_http_cache()
+        theme_model = cache.get_parsed(url) if cache is not None else None
+        if theme_model is None:
+            try:
+                with stage(Stages.CSS_PARSE):
+                    theme_model = await offload(
+                        extract_info_from_css, css_content, size=len(css_content)
+                    )
+            except BundledThemeException:
+                if digest is not None:
+                    fingerprints.put_theme(digest, None)
+                raise
+            if cache is not None:
+                cache.set_parsed(url, theme_model)
+        if digest is not None:
+            fingerprints.put_theme(digest, theme_model)
+        return theme_model
+
+    async def find_screenshot(self, url: str, model: WPThemeMetadata) -> Optional[str]:
+        """ Same as `get_screenshot`, without probing for the screenshot when
+        its extension is known for this very theme and version """
+        fingerprints = get_fingerprints()
+        key = screenshot_key(url, model) if fingerprints is not None else None
+        if key is None:
+            return await self.get_screenshot(url)
+        extension = fingerprints.get_screenshot(key)
+        if extension is not None:
+            return f"{url}screenshot.{extension}"
+        screenshot = await self.get_screenshot(url)
+        if screenshot is not None:
+            # Failed probes are not remembered, they may be transient
+            fingerprints.put_screenshot(key, screenshot.rsplit(".", 1)[1])
+        return screenshot
 
     async def get_screenshot(self, url: str) -> Optional[str]:
         """ Received a curated URL to a theme and returns theme
@@ -153,7 +240,8 @@ class WPThemeMetadataCrawler:
         self, url: str, model: WPThemeMetadata
     ) -> WPThemeMetadata:
         # Screenshot feature
-        screenshot = await self.get_screenshot(url)
+        with stage(Stages.SCREENSHOT_PROBE):
+            screenshot = await self.find_screenshot(url, model)
         if screenshot:
             model.set_featured_image(screenshot)
         return model
@@ -171,36 +259,56 @@ class WPThemeMetadataCrawler:
                 by the theme creator intentionally.
         """
 
-        html = html.strip()
-        if not html:
+        document = self.get_html_document(html)
+
+        if document.tree is None:
             return None
 
-        parser = etree.HTMLParser()
-        tree = etree.parse(StringIO(html), parser)
+        candidates = self.extract_theme_path_candidates_from_tree(document)
+
+        if not candidates:
+            # As a last resort, search by regex in comments. Some themes leave
+            # tracks of the theme name as html comments deliberately.
+            candidates = extract_theme_path_by_global_regex(
+                self.canonical_url, html.strip()
+            )
+
+        return self.complete_theme_path_candidates(candidates)
 
-        if tree is None:
+    async def find_theme_path_candidates(self, html: str) -> Optional[List[str]]:
+        """ Same as `extract_theme_path_candidates`, but large documents are
+        parsed and scanned by the executor, off the event loop """
+        document = await self.parse_html_document(html)
+
+        if document.tree is None:
             return None
 
-        xpath_candidates = [
-            '//link[contains(@href, "/wp-content/themes/")]/@href',
-            '//script[contains(@src, "/wp-content/themes/")]/@src',
-        ]
+        with stage(Stages.CANDIDATE_EXTRACTION):
+            candidates = self.extract_theme_path_candidates_from_tree(document)
 
+            if not candidates:
+                candidates = await offload(
+                    extract_theme_path_by_global_regex,
+                    self.canonical_url,
+                    html.strip(),
+                    size=len(html),
+                )
+
+            return self.complete_theme_path_candidates(candidates)
+
+    def extract_theme_path_candidates_from_tree(
+        self, document: HTMLDocument
+    ) -> List[str]:
         # TODO: Check that candidate urls start with the same domain as the
         # supplied url!
 
-        # tree.xpath returns a list of string values matching the path.
-        # A single list of them is created and then converted to a set.
-        matches = [tree.xpath(xpath) for xpath in xpath_candidates]
-        matches_flat = itertools.chain.from_iterable(matches)
+        # A list of string values of <link> and <script> tags referencing
+        # theme assets, converted to a set of theme urls afterwards.
+        matches = document.xpath(THEME_ASSETS_XPATH)
 
-        candidates = list(remove_duplicated_theme_urls(matches_flat))
-
-        if not candidates:
-            # As a last resort, search by regex in comments. Some themes leave
-            # tracks of the theme name as html comments deliberately.
-            candidates = extract_theme_path_by_global_regex(self.canonical_url, html)
+        return list(remove_duplicated_theme_urls(matches))
 
+    def complete_theme_path_candidates(self, candidates: List[str]) -> List[str]:
         # TODO: Somehow, mark this result as less valid as any other extracted
         # from DOM elements.
 
@@ -217,13 +325,13 @@ class WPThemeMetadataCrawler:
         return result
 
     async def get_theme(self, url: str) -> List[WPThemeMetadata]:
-        try:
+        with translate_client_errors():
             html_content = await self.fetch_html_body(url)
 
             if not html_content:
                 raise general_exceptions.MalformedBodyException
 
-            candidates = self.extract_theme_path_candidates(html_content)
+            candidates = await self.find_theme_path_candidates(html_content)
 
             if not candidates:
                 raise ThemePathMissingException
@@ -235,7 +343,9 @@ class WPThemeMetadataCrawler:
                 css_content = await self.fetch_style_css(style_css_path)
 
                 try:
-                    theme_model = extract_info_from_css(css_content)
+                    theme_model = await self.parse_style_css(
+                        style_css_path, css_content
+                    )
                 except BundledThemeException:
                     continue
                 else:
@@ -249,14 +359,3 @@ class WPThemeMetadataCrawler:
                 raise BundledThemeException
 
             return theme_models
-        except aiohttp.client.TooManyRedirects:
-            raise general_exceptions.NastyTargetException
-        except aiohttp.client.ClientConnectionError as e:
-            raise general_exceptions.TargetConnectionError() from e
-        except aiohttp.ServerTimeoutError:
-            raise general_exceptions.TargetTimeout
-        except aiohttp.client.ClientError:
-            # General unexpected error
-            raise general_exceptions.TargetInternalServerError
-        except asyncio.TimeoutError as e:
-            raise general_exceptions.TargetTimeout from e
@@ -0,0 +1,170 @@
+""" Themes seen before, shared by every target of the process.
+
+Thousands of sites run identical copies of the same popular themes. Their
+style.css headers are looked up by content hash instead of being parsed
+again, and the extension of their screenshot, resolved once per theme slug
+and version, spares the probes for it.
+
+Entries are kept in memory, the least recently used evicted first. Given a
+path, they are written to a SQLite database as well, as JSON.
+"""
+import dataclasses
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from wpoke.conf import settings
+from wpoke.exceptions import BundledThemeException
+from wpoke.metrics import THEME_FINGERPRINTS
+from .models import WPThemeMetadata
+
+# Seconds writers wait for each other, such as workers of sharded scans
+BUSY_TIMEOUT = 30
+
+ScreenshotKey = Tuple[str, str]
+
+
+def fingerprint(css_header: str) -> bytes:
+    """ Digest of the header of a style.css, i.e its first 8 KB """
+    return hashlib.blake2b(css_header.encode("utf8"), digest_size=16).digest()
+
+
+def screenshot_key(url: str, theme: WPThemeMetadata) -> Optional[ScreenshotKey]:
+    """ Slug and version of the theme at `url`, its directory. None unless
+    the theme declares a version """
+    slug = url.rstrip("/").rsplit("/", 1)[-1]
+    if not slug or not theme.version:
+        return None
+    return slug, theme.version
+
+
+class ThemeFingerprints:
+    def __init__(self, max_entries: int = 4096, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        # Theme metadata by fingerprint. Empty for headers with no metadata
+        self._themes: "OrderedDict[bytes, Dict]" = OrderedDict()
+        self._screenshots: "OrderedDict[ScreenshotKey, str]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS themes "
+                "(fingerprint BLOB PRIMARY KEY, metadata TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS screenshots "
+                "(slug TEXT, version TEXT, extension TEXT, "
+                "PRIMARY KEY (slug, version))"
+            )
+
+    @classmethod
+    def from_settings(cls) -> "ThemeFingerprints":
+        return cls(
+            max_entries=settings.fingerprint_cache_size,
+            path=settings.fingerprint_cache,
+        )
+
+    def _remember(self, entries: OrderedDict, key, value) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _lookup(self, entries: OrderedDict, key, query: str, params, decode=None):
+        value = entries.get(key)
+        if value is None and self._db is not None:
+            row = self._db.execute(query, params).fetchone()
+            if row is not None:
+                value = decode(row[0]) if decode else row[0]
+        if value is not None:
+            self._remember(entries, key, value)
+        return value
+
+    def get_theme(self, digest: bytes) -> Optional[WPThemeMetadata]:
+        """ A copy of the metadata of the style.css header of this digest
+        :raises BundledThemeException: the header is known to hold none
+        """
+        metadata = self._lookup(
+            self._themes,
+            digest,
+            "SELECT metadata FROM themes WHERE fingerprint = ?",
+            (digest,),
+            json.loads,
+        )
+        if metadata is None:
+            THEME_FINGERPRINTS.labels("theme", "miss").inc()
+            return None
+        THEME_FINGERPRINTS.labels("theme", "hit").inc()
+        if not metadata:
+            raise BundledThemeException
+        return WPThemeMetadata(**metadata)
+
+    def put_theme(self, digest: bytes, theme: Optional[WPThemeMetadata]) -> None:
+        """ Remembers the metadata of a style.css header, None if it has no
+        metadata. What is specific to a site, the screenshot, is left out """
+        metadata = {}
+        if theme is not None:
+            metadata = dataclasses.asdict(theme)
+            metadata["featured_image"] = None
+        self._remember(self._themes, digest, metadata)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO themes VALUES (?, ?)",
+                (digest, json.dumps(metadata)),
+            )
+
+    def get_screenshot(self, key: ScreenshotKey) -> Optional[str]:
+        """ Extension of the screenshot of the theme, if resolved already """
+        extension = self._lookup(
+            self._screenshots,
+            key,
+            "SELECT extension FROM screenshots WHERE slug = ? AND version = ?",
+            key,
+        )
+        result = "miss" if extension is None else "hit"
+        THEME_FINGERPRINTS.labels("screenshot", result).inc()
+        return extension
+
+    def put_screenshot(self, key: ScreenshotKey, extension: str) -> None:
+        self._remember(self._screenshots, key, extension)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO screenshots VALUES (?, ?, ?)",
+                (*key, extension),
+            )
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_fingerprints: Optional[ThemeFingerprints] = None
+
+
+def get_fingerprints() -> Optional[ThemeFingerprints]:
+    """ Fingerprints shared by every scan of this process. None when
+    `settings.fingerprint_cache_size` is 0 """
+    global _fingerprints
+    if not settings.fingerprint_cache_size:
+        return None
+    fingerprints = _fingerprints
+    if (
+        fingerprints is None
+        or fingerprints.path != settings.fingerprint_cache
+        or fingerprints.max_entries != settings.fingerprint_cache_size
+    ):
+        close_fingerprints()
+        fingerprints = _fingerprints = ThemeFingerprints.from_settings()
+    return fingerprints
+
+
+def close_fingerprints() -> None:
+    global _fingerprints
+    fingerprints, _fingerprints = _fingerprints, None
+    if fingerprints is not None:
+        fingerprints.close()
@@ -0,0 +1,34 @@
+import json
+import sys
+from typing import AnyStr, Dict
+
+from wpoke.conf import settings, RenderFormats
+from wpoke.crawler import CrawlerConfiguration
+from wpoke.finger import BaseFinger
+from .crawler import WPCoreVersionCrawler
+from .serializers import WPCoreVersionSerializer
+
+
+class CoreVersionFinger(BaseFinger):
+    class Meta:
+        name = "core_version"
+        # Seconds results stay fresh in the result cache
+        cache_ttl = 3600
+
+    class Cli:
+        help_text = "Display WordPress core version"
+        required = False
+        short_flag = "-V"
+        long_flag = "--core-version"
+
+    async def run(self, target: AnyStr, **options) -> Dict:
+        crawler = WPCoreVersionCrawler(
+            self.session, CrawlerConfiguration.from_settings()
+        )
+        core_version = await crawler.get_core_version(target)
+        return WPCoreVersionSerializer(core_version).data
+
+    def render(self, result, out=sys.stdout, **kwargs) -> None:
+        fmt = settings.output_format
+        if not fmt or fmt == RenderFormats.JSON.value:
+            print(json.dumps(result, indent=4), file=out)
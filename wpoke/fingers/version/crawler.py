@@ -0,0 +1,127 @@
+import re
+from collections import Counter
+from typing import Iterable, List
+
+from wpoke.crawler import BaseCrawler, translate_client_errors
+from wpoke.html import HTMLDocument, register_xpath
+from .models import (
+    SOURCE_ASSET_VERSION,
+    SOURCE_FEED_GENERATOR,
+    SOURCE_META_GENERATOR,
+    WPCoreVersion,
+    WPVersionEvidence,
+)
+
+VERSION = r"(\d+\.\d+(?:\.\d+)?)"
+GENERATOR_RE = re.compile(r"^\s*WordPress\s+" + VERSION + r"\b", re.IGNORECASE)
+ASSET_VERSION_RE = re.compile(r"[?&](?:amp;)?ver=" + VERSION + r"(?![\w.\-])")
+# wordpress.org/?v=X is the generator of feeds. It leaks into the index body
+# through embedded feeds and widgets, and escaped within inline scripts.
+FEED_GENERATOR_RE = re.compile(r"wordpress\.org/\?v=" + VERSION + r"(?![\w.\-])")
+# Emoji settings are inlined as JSON, not as markup: https:\/\/...?ver=X
+EMOJI_SCRIPT_RE = re.compile(
+    r"wp-includes\\?/js\\?/wp-emoji-release\.min\.js\?ver=" + VERSION
+)
+
+META_GENERATOR_XPATH = "core_version.meta_generator"
+CORE_ASSETS_XPATH = "core_version.core_assets"
+
+register_xpath(META_GENERATOR_XPATH, '//meta[@name="generator"]/@content')
+register_xpath(
+    CORE_ASSETS_XPATH,
+    '//script[contains(@src, "/wp-includes/")]/@src'
+    ' | //link[contains(@href, "/wp-includes/")]/@href'
+    ' | //link[contains(@href, "/wp-admin/")]/@href',
+)
+SOURCE_WEIGHTS = {
+    SOURCE_META_GENERATOR: 3,
+    SOURCE_FEED_GENERATOR: 2,
+    SOURCE_ASSET_VERSION: 1,
+}
+# Occurrences of a version counted per source. Themes load a dozen core
+# assets where a single one is enough to tell the version
+MAX_COUNTED_OCCURRENCES = 3
+# Libraries bundled with WordPress are versioned after themselves
+VENDORED_ASSETS_RE = re.compile(
+    r"/wp-includes/js/(?:jquery|underscore|backbone|mediaelement|tinymce"
+    r"|imagesloaded|masonry|hoverintent|swfobject|thickbox|plupload|codemirror"
+    r"|twemoji|dist/vendor)",
+    re.IGNORECASE,
+)
+
+
+def _count(source: str, versions: Iterable[str]) -> List[WPVersionEvidence]:
+    return [
+        WPVersionEvidence(source=source, version=version, occurrences=occurrences)
+        for version, occurrences in Counter(versions).most_common()
+    ]
+
+
+def find_meta_generator(document: HTMLDocument) -> List[WPVersionEvidence]:
+    versions = []
+    for content in document.xpath(META_GENERATOR_XPATH):
+        match = GENERATOR_RE.match(content)
+        if match:
+            versions.append(match.group(1))
+    return _count(SOURCE_META_GENERATOR, versions)
+
+
+def find_asset_versions(document: HTMLDocument) -> List[WPVersionEvidence]:
+    versions = []
+    for url in document.xpath(CORE_ASSETS_XPATH):
+        if VENDORED_ASSETS_RE.search(url):
+            continue
+        match = ASSET_VERSION_RE.search(url)
+        if match:
+            versions.append(match.group(1))
+    versions.extend(EMOJI_SCRIPT_RE.findall(document.html))
+    return _count(SOURCE_ASSET_VERSION, versions)
+
+
+def find_feed_generator(html: str) -> List[WPVersionEvidence]:
+    return _count(SOURCE_FEED_GENERATOR, FEED_GENERATOR_RE.findall(html))
+
+
+def detect_core_version(document: HTMLDocument) -> WPCoreVersion:
+    """ Gathers every WordPress version disclosed by an index page. Each
+    evidence scores the weight of its source times its occurrences, counting
+    up to MAX_COUNTED_OCCURRENCES of them. Generator tags weigh the most and
+    core asset versions the least, as caching plugins tend to rewrite them.
+    The version scoring the most wins, ties going to the version backed by
+    the strongest source, then by most occurrences """
+    evidences = []
+    evidences.extend(find_meta_generator(document))
+    evidences.extend(find_asset_versions(document))
+    evidences.extend(find_feed_generator(document.html))
+
+    scores = Counter()
+    strongest = Counter()
+    occurrences = Counter()
+    for evidence in evidences:
+        weight = SOURCE_WEIGHTS[evidence.source]
+        counted = min(evidence.occurrences, MAX_COUNTED_OCCURRENCES)
+        scores[evidence.version] += weight * counted
+        strongest[evidence.version] = max(strongest[evidence.version], weight)
+        occurrences[evidence.version] += evidence.occurrences
+
+    result = WPCoreVersion(evidences=evidences)
+    if scores:
+        result.version = max(
+            scores,
+            key=lambda version: (
+                scores[version],
+                strongest[version],
+                occurrences[version],
+            ),
+        )
+    return result
+
+
+class WPCoreVersionCrawler(BaseCrawler):
+    async def get_core_version(self, url: str) -> WPCoreVersion:
+        """ Works on the index body and tree cached for the ongoing scan, thus
+        it costs no request when any other finger has fetched them """
+        with translate_client_errors():
+            html_content = await self.fetch_html_body(url)
+        document = await self.parse_html_document(html_content or "")
+        return detect_core_version(document)
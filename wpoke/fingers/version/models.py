@@ -0,0 +1,19 @@
+from dataclasses import dataclass, field
+from typing import AnyStr, List
+
+SOURCE_META_GENERATOR = "meta_generator"
+SOURCE_ASSET_VERSION = "asset_version"
+SOURCE_FEED_GENERATOR = "feed_generator"
+
+
+@dataclass
+class WPVersionEvidence:
+    source: AnyStr = None
+    version: AnyStr = None
+    occurrences: int = 1
+
+
+@dataclass
+class WPCoreVersion:
+    version: AnyStr = None
+    evidences: List[WPVersionEvidence] = field(default_factory=list)
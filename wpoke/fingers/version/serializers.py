@@ -0,0 +1,12 @@
+import serpy
+
+
+class WPVersionEvidenceSerializer(serpy.Serializer):
+    source = serpy.StrField(required=True)
+    version = serpy.StrField(required=True)
+    occurrences = serpy.IntField(required=True)
+
+
+class WPCoreVersionSerializer(serpy.Serializer):
+    version = serpy.StrField(required=False)
+    evidences = WPVersionEvidenceSerializer(many=True, required=True)
@@ -1,11 +1,26 @@
+import contextlib
 from datetime import datetime
-from typing import Any, AnyStr, Dict, Optional, List, Type
-
-from aiohttp import ClientSession
+from typing import Any, AnyStr, Dict, Optional, List, Type, TYPE_CHECKING
 
+from .conf import settings
 from .exceptions import DuplicatedFingerException, WpokeException
 from .finger import BaseFinger
+from .fingers.loading import FingerSpec
+from .journal import JOURNAL_STATUS_ERROR, JOURNAL_STATUS_FAILED, JOURNAL_STATUS_OK
+from .metrics import (
+    FINGER_OUTCOMES,
+    SCAN_DURATION,
+    SCANS_IN_FLIGHT,
+    TARGETS_FINISHED,
+    TARGETS_STARTED,
+)
 from .models import HandResult, FingerResult
+from .profiling import record_stages
+from .store import DataStore, pop_store, push_store
+from .tracing import scan_span, span
+
+if TYPE_CHECKING:  # pragma: nocover
+    from aiohttp import ClientSession
 
 
 def _now():
@@ -30,7 +45,7 @@ class _FingerRegistry(Dict):
 class Hand:
     """ A runner of fingers """
 
-    def __init__(self, session: ClientSession):
+    def __init__(self, session: "ClientSession"):
         self._finger_registry: _FingerRegistry = _FingerRegistry()
         self.session = session
 
@@ -61,6 +76,13 @@ class Hand:
             raise DuplicatedFingerException(msg)
         self._finger_registry.add_finger(lookup_name, finger_cls(session=self.session))
 
+    def add_finger_spec(self, spec: FingerSpec):
+        """ Imports the finger described by the spec and registers it
+        :raises FingerNotFoundException
+        :raises DuplicatedFingerException
+        """
+        self.add_finger(spec.load(), spec.lookup_name)
+
     async def _poke(self, target_url: AnyStr) -> List[Any]:
         pokes = []
         for finger_name, finger in self.registered_fingers:
@@ -68,22 +90,45 @@ class Hand:
             result.finger_origin = finger_name
             result.started_at = _now()
             try:
-                result.data = await finger.run(target_url)
+                with span(finger_name, "finger"):
+                    result.data = await finger.run(target_url)
             except WpokeException as e:
                 result.data = None
                 result.status = 1
                 result.errors.append(e.message)
+                result.error_type = type(e)
+                FINGER_OUTCOMES.labels(finger_name, type(e).__name__).inc()
             else:
                 result.status = 0
+                FINGER_OUTCOMES.labels(finger_name, "ok").inc()
             result.finished_at = _now()
             pokes.append(result)
         return pokes
 
     async def poke(self, target_url: AnyStr) -> HandResult:
         result = HandResult()
+        result.target = target_url
         result.started_at = _now()
-        pokes = await self._poke(target_url)
+        # Every scan owns a private store so that artifacts shared among its
+        # fingers, such as the index body, never leak into other targets.
+        push_store(DataStore())
+        profiling = record_stages() if settings.profile else contextlib.nullcontext()
+        TARGETS_STARTED.inc()
+        SCANS_IN_FLIGHT.inc()
+        outcome = JOURNAL_STATUS_ERROR
+        try:
+            with scan_span(target_url) as traced, profiling as timings:
+                pokes = await self._poke(target_url)
+                result.status = int(any(poke.status != 0 for poke in pokes))
+                traced.set(status=result.status)
+            outcome = JOURNAL_STATUS_FAILED if result.status else JOURNAL_STATUS_OK
+        finally:
+            pop_store()
+            SCANS_IN_FLIGHT.dec()
+            TARGETS_FINISHED.labels(outcome).inc()
+        result.stage_timings = timings
         result.finished_at = _now()
+        SCAN_DURATION.observe(result.runtime)
         result.loaded_fingers = self._finger_registry.finger_names
         result.pokes = pokes
         result.serial_runtime = sum(result.runtime for result in pokes)
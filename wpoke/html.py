@@ -0,0 +1,81 @@
+from io import StringIO
+from typing import Dict, List, Optional
+
+from lxml import etree
+
+from wpoke.exceptions import DuplicatedXPathException
+
+# Documents are cut down to this many characters before being parsed
+MAX_HTML_SIZE = 10 * 1024 * 1024
+
+_registered_xpaths: Dict[str, etree.XPath] = {}
+
+
+def register_xpath(name: str, expression: str) -> etree.XPath:
+    """ Compiles an XPath expression once, at import time of the finger that
+    registers it, so that querying documents does not pay for compiling it.
+
+    :raises DuplicatedXPathException: `name` is taken by another expression
+    """
+    xpath = _registered_xpaths.get(name)
+    if xpath is not None:
+        if xpath.path != expression:
+            raise DuplicatedXPathException(f"{name} is already registered")
+        return xpath
+    xpath = _registered_xpaths[name] = etree.XPath(expression)
+    return xpath
+
+
+def get_xpath(name: str) -> etree.XPath:
+    return _registered_xpaths[name]
+
+
+def parse_html(html: str) -> Optional[etree._ElementTree]:
+    """ Parses a html document leniently. Returns None for empty documents.
+
+    Hostile documents are kept in check: only the first MAX_HTML_SIZE
+    characters are parsed, and with `huge_tree` off libxml2 stops nesting
+    elements 256 levels deep. Ids are not indexed, as no finger looks
+    elements up by id """
+    if not html or not html.strip():
+        return None
+    parser = etree.HTMLParser(huge_tree=False, collect_ids=False)
+    return etree.parse(StringIO(html[:MAX_HTML_SIZE]), parser)
+
+
+class HTMLDocument:
+    """ A html document along with its tree, which is parsed on first use
+    only. Meant to be shared by every finger of a scan working on the same
+    document, so that N fingers cost a single parse plus N queries """
+
+    __slots__ = ("html", "_tree", "_is_parsed")
+
+    def __init__(self, html: str):
+        self.html = html
+        self._tree = None
+        self._is_parsed = False
+
+    @property
+    def tree(self) -> Optional[etree._ElementTree]:
+        if not self._is_parsed:
+            self.parse()
+        return self._tree
+
+    def parse(self) -> Optional[etree._ElementTree]:
+        self._tree = parse_html(self.html)
+        self._is_parsed = True
+        return self._tree
+
+    @property
+    def is_parsed(self) -> bool:
+        return self._is_parsed
+
+    def has_root(self) -> bool:
+        tree = self.tree
+        return tree is not None and tree.getroot() is not None
+
+    def xpath(self, name: str) -> List:
+        """ Evaluates a registered XPath. Empty documents match nothing """
+        if not self.has_root():
+            return []
+        return get_xpath(name)(self.tree)
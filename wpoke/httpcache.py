@@ -0,0 +1,131 @@
+""" On-disk HTTP cache of responses carrying validators, for rescans.
+
+Responses to GET requests which opt in, the index and style.css, are stored
+along with their ETag and Last-Modified headers. Requesting them again
+sends `If-None-Match` and `If-Modified-Since`, and a 304 answer is served
+the stored body instead. What was parsed out of a body can be stored next
+to it, so that unchanged style.css files are not parsed again either. It is
+dropped whenever the body changes.
+
+The cache is a SQLite database shared by every scan of the process, and by
+the workers of sharded scans. Parses are pickled into it, thus it must only
+be shared with trusted processes.
+"""
+import pickle
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+from .conf import settings
+from .metrics import HTTP_CACHE, HTTP_CACHE_SAVED_BYTES
+
+# Entries not revalidated for this many seconds are deleted on open
+MAX_AGE = 30 * 24 * 3600
+# Seconds writers wait for each other, such as workers of sharded scans
+BUSY_TIMEOUT = 30
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache:
+    def __init__(self, path: str, max_age: float = MAX_AGE, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, "
+            "status INTEGER, body TEXT, etag TEXT, last_modified TEXT, "
+            "parsed BLOB, validated_at REAL)"
+        )
+        self._db.execute(
+            "DELETE FROM responses WHERE validated_at < ?", (clock() - max_age,)
+        )
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        row = self._db.execute(
+            "SELECT status, body, etag, last_modified FROM responses WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(*row)
+
+    def store(self, url: str, status: int, body: str, headers: Mapping[str, str]):
+        """ Stores a response, if it carries any validator. Formerly stored
+        responses of the url are deleted otherwise """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if status != 200 or not (etag or last_modified):
+            self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, NULL, ?)",
+            (url, status, body, etag, last_modified, self.clock()),
+        )
+        HTTP_CACHE.labels("stored").inc()
+
+    def revalidated(self, url: str, response: CachedResponse) -> None:
+        """ The server answered 304, the stored response is still valid """
+        self._db.execute(
+            "UPDATE responses SET validated_at = ? WHERE url = ?", (self.clock(), url)
+        )
+        HTTP_CACHE.labels("not_modified").inc()
+        HTTP_CACHE_SAVED_BYTES.inc(len(response.body))
+
+    def get_parsed(self, url: str) -> Optional[Any]:
+        """ What was parsed out of the stored body of the url, if anything """
+        row = self._db.execute(
+            "SELECT parsed FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return pickle.loads(row[0])
+
+    def set_parsed(self, url: str, parsed: Any) -> None:
+        """ Stores the parse of the body of the url, if it is stored """
+        self._db.execute(
+            "UPDATE responses SET parsed = ? WHERE url = ?",
+            (pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL), url),
+        )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+_http_cache: Optional[HTTPCache] = None
+
+
+def get_http_cache() -> Optional[HTTPCache]:
+    """ The cache at `settings.http_cache`, if set, shared by every scan of
+    this process """
+    global _http_cache
+    path = settings.http_cache
+    if not path:
+        return None
+    if _http_cache is None or _http_cache.path != path:
+        close_http_cache()
+        _http_cache = HTTPCache(path)
+    return _http_cache
+
+
+def close_http_cache() -> None:
+    global _http_cache
+    cache, _http_cache = _http_cache, None
+    if cache is not None:
+        cache.close()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import AnyStr, Optional
+
+JOURNAL_STATUS_OK = "ok"
+JOURNAL_STATUS_FAILED = "failed"
+JOURNAL_STATUS_ERROR = "error"
+
+
+def target_digest(target: AnyStr) -> bytes:
+    """ 16 bytes identifying a target inside the journal index """
+    if isinstance(target, str):
+        target = target.encode("utf8")
+    return hashlib.blake2b(target, digest_size=16).digest()
+
+
+class CheckpointJournal:
+    """ Records which targets of a batch scan have already finished.
+
+    Two files are kept side by side:
+
+    - ``path``: an append-only journal, one JSON document per finished
+      target. It is the source of truth and stays human readable.
+    - ``path + ".idx"``: a SQLite index mapping the digest of every journaled
+      target to its outcome, along with the journal offset it covers. Looking
+      up a target never requires reading the journal nor the scan input.
+
+    The index is committed every ``commit_every`` records. On open, journal
+    lines past the committed offset are replayed into the index and a
+    trailing line torn by a crash in the middle of a write is truncated, so
+    the pair is always consistent again before the scan resumes.
+
+    All the writing happens synchronously under a lock, therefore completions
+    coming from many coroutines (or worker threads) never interleave.
+    """
+
+    def __init__(
+        self, path: str, commit_every: int = 64, fsync: bool = False,
+    ):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.commit_every = commit_every
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._journal = None
+        self._index: Optional[sqlite3.Connection] = None
+        self._pending = 0
+
+    def __enter__(self) -> "CheckpointJournal":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._journal is not None
+
+    def open(self) -> None:
+        self._index = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._index.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS targets (
+                digest BLOB PRIMARY KEY,
+                status TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+        self._recover()
+        self._journal = open(self.path, "ab")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._commit()
+                self._journal.close()
+                self._journal = None
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+
+    def _get_offset(self) -> int:
+        row = self._index.execute(
+            "SELECT value FROM meta WHERE key = 'offset'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _set_offset(self, offset: int) -> None:
+        self._index.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('offset', ?)", (offset,),
+        )
+
+    def _recover(self) -> None:
+        """ Replays journal lines not yet covered by the index """
+        if not os.path.exists(self.path):
+            self._set_offset(0)
+            self._index.commit()
+            return
+
+        offset = self._get_offset()
+        with open(self.path, "r+b") as fd:
+            fd.seek(0, os.SEEK_END)
+            size = fd.tell()
+            if offset > size:
+                # The journal was replaced or shrunk behind our back
+                offset = 0
+            fd.seek(offset)
+            for line in fd:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self._index_entry(entry["target"], entry["status"])
+                offset += len(line)
+            if offset < size:
+                fd.truncate(offset)
+        self._set_offset(offset)
+        self._index.commit()
+
+    def _index_entry(self, target: AnyStr, status: str) -> None:
+        self._index.execute(
+            "INSERT OR REPLACE INTO targets (digest, status) VALUES (?, ?)",
+            (target_digest(target), status),
+        )
+
+    def _commit(self) -> None:
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._set_offset(self._journal.tell())
+        self._index.commit()
+        self._pending = 0
+
+    def status(self, target: AnyStr) -> Optional[str]:
+        row = self._index.execute(
+            "SELECT status FROM targets WHERE digest = ?", (target_digest(target),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, target: AnyStr) -> bool:
+        return self.status(target) is not None
+
+    def record(self, target: AnyStr, status: str) -> None:
+        line = json.dumps({"target": target, "status": status}) + "\n"
+        with self._lock:
+            self._journal.write(line.encode("utf8"))
+            # Flushing every line keeps the journal complete for anything but
+            # the very last write should the process be killed.
+            self._journal.flush()
+            self._index_entry(target, status)
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._commit()
+
+    def __len__(self) -> int:
+        return self._index.execute("SELECT COUNT(*) FROM targets").fetchone()[0]
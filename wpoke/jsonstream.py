@@ -0,0 +1,242 @@
+import json
+import re
+from typing import Iterator, List, Optional, Tuple
+
+# Events yielded by `JSONStreamParser`, named after the ones of ijson
+START_MAP = "start_map"
+END_MAP = "end_map"
+START_ARRAY = "start_array"
+END_ARRAY = "end_array"
+MAP_KEY = "map_key"
+STRING = "string"
+NUMBER = "number"
+BOOLEAN = "boolean"
+NULL = "null"
+
+Event = Tuple[str, str, object]
+
+# What the parser expects next
+_VALUE = 0
+_VALUE_OR_END = 1
+_KEY = 2
+_KEY_OR_END = 3
+_COLON = 4
+_COMMA_OR_END = 5
+_DONE = 6
+
+_WHITESPACE_RE = re.compile(r"[ \t\r\n]*")
+_STRING_SPECIAL_RE = re.compile(r'["\\]')
+_SCALAR_RE = re.compile(r'[^ \t\r\n,:\[\]{}"]+')
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?")
+_INCOMPLETE = object()
+_LITERALS = {"true": (BOOLEAN, True), "false": (BOOLEAN, False), "null": (NULL, None)}
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class JSONStreamParser:
+    """ Incremental JSON parser. Text is fed in chunks of any size and
+    parsing events are yielded as soon as they are complete, as
+    ``(prefix, event, value)`` tuples. The prefix is the dotted path of the
+    value, array members being named "item":
+
+    .. code-block:: python
+        parser = JSONStreamParser()
+        list(parser.feed('{"namespaces": ["wp/'))
+        # [('', 'start_map', None), ('', 'map_key', 'namespaces'),
+        #  ('namespaces', 'start_array', None)]
+        list(parser.feed('v2"]}'))
+        # [('namespaces.item', 'string', 'wp/v2'), ('namespaces', 'end_array', None),
+        #  ('', 'end_map', None)]
+
+    Only the current path and the scalar being read are held in memory,
+    whatever the size of the document. Strings longer than
+    ``max_string_length`` are consumed but not kept, and yielded as None.
+
+    :raises JSONStreamError: the document is not valid JSON
+    """
+
+    def __init__(self, max_string_length: int = 4096, max_depth: int = 64):
+        self.max_string_length = max_string_length
+        self.max_depth = max_depth
+        self._path: List[str] = []
+        # Whether each open container is a map
+        self._containers: List[bool] = []
+        self._expect = _VALUE
+        # Scalar split between two chunks
+        self._pending = ""
+        self._in_string = False
+        self._string_parts: List[str] = []
+        self._string_length = 0
+        self._escaped = False
+
+    @property
+    def prefix(self) -> str:
+        return ".".join(self._path)
+
+    def feed(self, text: str) -> Iterator[Event]:
+        pos = 0
+        end = len(text)
+        if self._pending:
+            # Only scalars, i.e numbers and literals, are left pending
+            text = self._pending + text
+            end = len(text)
+            self._pending = ""
+        while pos < end:
+            if self._in_string:
+                pos, value = self._read_string(text, pos)
+                if value is not _INCOMPLETE:
+                    yield from self._emit_string(value)
+                continue
+
+            pos = _WHITESPACE_RE.match(text, pos).end()
+            if pos >= end:
+                break
+            char = text[pos]
+
+            if char == '"':
+                if self._expect not in (_VALUE, _VALUE_OR_END, _KEY, _KEY_OR_END):
+                    self._fail(char)
+                self._in_string = True
+                self._string_parts = []
+                self._string_length = 0
+                pos += 1
+            elif char == "{" or char == "[":
+                if self._expect not in (_VALUE, _VALUE_OR_END):
+                    self._fail(char)
+                if len(self._containers) >= self.max_depth:
+                    raise JSONStreamError("max depth exceeded")
+                is_map = char == "{"
+                yield self.prefix, START_MAP if is_map else START_ARRAY, None
+                self._containers.append(is_map)
+                self._path.append("" if is_map else "item")
+                self._expect = _KEY_OR_END if is_map else _VALUE_OR_END
+                pos += 1
+            elif char == "}" or char == "]":
+                is_map = char == "}"
+                if (
+                    not self._containers
+                    or self._containers[-1] != is_map
+                    or self._expect
+                    not in ((_KEY_OR_END if is_map else _VALUE_OR_END), _COMMA_OR_END)
+                ):
+                    self._fail(char)
+                self._containers.pop()
+                self._path.pop()
+                yield self.prefix, END_MAP if is_map else END_ARRAY, None
+                self._end_value()
+                pos += 1
+            elif char == ":":
+                if self._expect != _COLON:
+                    self._fail(char)
+                self._expect = _VALUE
+                pos += 1
+            elif char == ",":
+                if self._expect != _COMMA_OR_END:
+                    self._fail(char)
+                self._expect = _KEY if self._containers[-1] else _VALUE
+                pos += 1
+            else:
+                if self._expect not in (_VALUE, _VALUE_OR_END):
+                    self._fail(char)
+                match = _SCALAR_RE.match(text, pos)
+                if match is None:
+                    self._fail(char)
+                if match.end() >= end:
+                    # The scalar might go on in the next chunk
+                    self._pending = match.group()
+                    if len(self._pending) > self.max_string_length:
+                        raise JSONStreamError("scalar too long")
+                    break
+                yield self._scalar(match.group())
+                self._end_value()
+                pos = match.end()
+
+    def close(self) -> Iterator[Event]:
+        """ Flushes a trailing scalar and checks the document is complete
+
+        :raises JSONStreamError
+        """
+        if self._pending:
+            pending, self._pending = self._pending, ""
+            yield self._scalar(pending)
+            self._end_value()
+        if self._in_string or self._expect != _DONE:
+            raise JSONStreamError("unexpected end of document")
+
+    def _read_string(self, text: str, pos: int):
+        end = len(text)
+        while pos < end:
+            if self._escaped:
+                self._escaped = False
+                self._keep(text[pos])
+                pos += 1
+                continue
+            match = _STRING_SPECIAL_RE.search(text, pos)
+            if match is None:
+                self._keep(text[pos:])
+                return end, _INCOMPLETE
+            special = match.start()
+            self._keep(text[pos:special])
+            if text[special] == '"':
+                self._in_string = False
+                return special + 1, self._take_string()
+            self._keep("\\")
+            self._escaped = True
+            pos = special + 1
+        return pos, _INCOMPLETE
+
+    def _keep(self, part: str) -> None:
+        self._string_length += len(part)
+        if self._string_length <= self.max_string_length:
+            self._string_parts.append(part)
+        elif self._string_parts:
+            self._string_parts = []
+
+    def _take_string(self) -> Optional[str]:
+        parts, self._string_parts = self._string_parts, []
+        if self._string_length > self.max_string_length:
+            return None
+        raw = "".join(parts)
+        if "\\" not in raw:
+            return raw
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError as e:
+            raise JSONStreamError("invalid string escape") from e
+
+    def _emit_string(self, value: Optional[str]) -> Iterator[Event]:
+        if self._expect in (_KEY, _KEY_OR_END):
+            self._path[-1] = value or ""
+            self._expect = _COLON
+            yield ".".join(self._path[:-1]), MAP_KEY, value
+        else:
+            yield self.prefix, STRING, value
+            self._end_value()
+
+    def _scalar(self, token: str) -> Event:
+        if token in _LITERALS:
+            event, value = _LITERALS[token]
+            return self.prefix, event, value
+        match = _NUMBER_RE.fullmatch(token)
+        if match is None:
+            raise JSONStreamError(f"unexpected token {token[:32]!r}")
+        if match.group(1) or match.group(2):
+            return self.prefix, NUMBER, float(token)
+        return self.prefix, NUMBER, int(token)
+
+    def _end_value(self) -> None:
+        self._expect = _COMMA_OR_END if self._containers else _DONE
+
+    def _fail(self, char: str):
+        raise JSONStreamError(f"unexpected character {char!r}")
+
+
+def parse_chunks(chunks, **kwargs) -> Iterator[Event]:
+    """ Parses a whole document given as an iterable of text chunks """
+    parser = JSONStreamParser(**kwargs)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -0,0 +1,160 @@
+import math
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .conf import settings
+from .exceptions import TargetConnectionError, TargetTimeout
+from .models import HandResult
+
+# Finger failures telling that the link, rather than the target, gave up
+CONGESTION_ERRORS = (TargetTimeout, TargetConnectionError)
+# Limit adaptive batch scans start with, unless lower than the ceiling
+INITIAL_LIMIT = 8
+
+
+def is_congested(result: HandResult) -> bool:
+    """ Whether any finger of the scan timed out or could not connect """
+    for poke in getattr(result, "pokes", None) or ():
+        error_type = getattr(poke, "error_type", None)
+        if error_type is not None and issubclass(error_type, CONGESTION_ERRORS):
+            return True
+    return False
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """ Nearest rank percentile of `values`, which must be sorted """
+    if not values:
+        return 0.0
+    index = max(0, math.ceil(rank / 100 * len(values)) - 1)
+    return values[index]
+
+
+@dataclass
+class LimiterStats:
+    limit: int = 0
+    in_flight: int = 0
+    samples: int = 0
+    increases: int = 0
+    decreases: int = 0
+    # Figures of the last window evaluated
+    latency_p50: float = 0.0
+    latency_p90: float = 0.0
+    error_rate: float = 0.0
+
+
+class AdaptiveLimiter:
+    """ Number of targets scanned at once, adjusted as scans finish following
+    an AIMD scheme, the one TCP congestion control follows:
+
+    - every window of finished scans, at least as many as the current
+      limit, is compared against the best figures seen so far. The limit is
+      cut down by `backoff` when the rate of timeouts and connection errors
+      rises `error_threshold` above its floor, or when the 90th percentile
+      latency exceeds its floor `latency_tolerance` times
+    - otherwise, if the limit has actually been reached during the window,
+      it grows: doubling until the first cut down, then by its square root
+
+    Floors drift upwards a little every window, so that a link which became
+    slower for good, or a batch of targets which are down, is eventually
+    taken as the new normal rather than throttled forever.
+    """
+
+    def __init__(
+        self,
+        initial: int = INITIAL_LIMIT,
+        min_limit: int = 1,
+        max_limit: int = 1000,
+        window: int = 20,
+        backoff: float = 0.7,
+        error_threshold: float = 0.1,
+        latency_tolerance: float = 2.0,
+        drift: float = 0.05,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.window = window
+        self.backoff = backoff
+        self.error_threshold = error_threshold
+        self.latency_tolerance = latency_tolerance
+        self.drift = drift
+        self.stats = LimiterStats(limit=self._clamp(initial))
+        self._latencies: List[float] = []
+        self._errors = 0
+        self._saturated = False
+        self._slow_start = True
+        # Scans started before the last cut down, whose outcome is ignored
+        self._stale = 0
+        self._latency_floor: Optional[float] = None
+        self._error_floor: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls) -> "AdaptiveLimiter":
+        """ `settings.concurrency` is the ceiling of the limit """
+        return cls(
+            initial=min(INITIAL_LIMIT, settings.concurrency),
+            max_limit=settings.concurrency,
+        )
+
+    @property
+    def limit(self) -> int:
+        return self.stats.limit
+
+    def _clamp(self, limit: int) -> int:
+        return max(self.min_limit, min(self.max_limit, limit))
+
+    def started(self) -> None:
+        """ To be called whenever a scan starts """
+        self.stats.in_flight += 1
+        if self.stats.in_flight >= self.stats.limit:
+            self._saturated = True
+
+    def finished(self, latency: float, congested: bool) -> None:
+        """ To be called whenever a scan finishes, taking `latency` seconds """
+        self.stats.in_flight = max(0, self.stats.in_flight - 1)
+        if self._stale:
+            self._stale -= 1
+            return
+        self.stats.samples += 1
+        self._latencies.append(latency)
+        self._errors += congested
+        if len(self._latencies) >= max(self.window, self.stats.limit):
+            self._evaluate()
+
+    def _evaluate(self) -> None:
+        latencies = sorted(self._latencies)
+        stats = self.stats
+        stats.latency_p50 = percentile(latencies, 50)
+        stats.latency_p90 = percentile(latencies, 90)
+        stats.error_rate = self._errors / len(latencies)
+
+        if self._latency_floor is None:
+            self._latency_floor = stats.latency_p90
+            self._error_floor = stats.error_rate
+        congested = (
+            stats.error_rate > self._error_floor + self.error_threshold
+            or stats.latency_p90 > self._latency_floor * self.latency_tolerance
+        )
+        self._latency_floor = min(
+            stats.latency_p90, self._latency_floor * (1 + self.drift)
+        )
+        self._error_floor = min(stats.error_rate, self._error_floor + self.drift)
+
+        if congested:
+            limit = self._clamp(int(stats.limit * self.backoff))
+            if limit < stats.limit:
+                stats.decreases += 1
+            self._slow_start = False
+            self._stale = stats.in_flight
+        elif self._saturated:
+            if self._slow_start:
+                limit = self._clamp(stats.limit * 2)
+            else:
+                limit = self._clamp(stats.limit + round(math.sqrt(stats.limit)))
+            if limit > stats.limit:
+                stats.increases += 1
+        else:
+            limit = stats.limit
+        stats.limit = limit
+        self._latencies = []
+        self._errors = 0
+        self._saturated = stats.in_flight >= limit
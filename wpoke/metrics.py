@@ -0,0 +1,470 @@
+""" Live metrics of long running scans, in the Prometheus text format.
+
+Metrics are kept by a process wide registry and updated from the event
+loop without locks: labelled series are bound once, e.g
+`REQUEST_PHASES.labels("dns")`, and updating them then allocates nothing.
+Readers, the exporters below, work on copies taken under the GIL.
+
+Figures already tracked elsewhere, such as TLS handshakes, are not
+duplicated: metrics can read them from a function when rendered, see
+`set_function`.
+
+Exporters run on threads of their own, next to the event loop of the scan:
+
+- `MetricsServer` serves the registry over HTTP at `/metrics`
+- `MetricsFileWriter` writes it to a file every few seconds, as the
+  textfile collector of the node exporter expects
+
+Only the registry of the exporting process is exported. Workers of sharded
+scans keep registries of their own, which never reach the parent: of those
+scans, only targets finished are exported, as counted by the parent. Request
+phases, bytes, connections and every other figure of the workers are lost.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .conf import settings
+from .exceptions import DuplicatedMetricException
+
+# Seconds, from a cached DNS lookup up to a scan hitting every timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # One more than bounds, for +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._series: Dict[LabelValues, object] = {}
+        self._function: Optional[Callable] = None
+
+    def _new_value(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        """ Series of the given label values, created on first use. Bind it
+        once and keep it around on hot paths """
+        try:
+            return self._series[values]
+        except KeyError:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            series = self._series[values] = self._new_value()
+            return series
+
+    def set_function(self, function: Callable) -> None:
+        """ Reads the value when rendered instead. The function returns a
+        number or, for labelled metrics, a dict of numbers by label values """
+        self._function = function
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        if self._function is not None:
+            values = self._function()
+            if not isinstance(values, dict):
+                values = {(): values}
+            for label_values, value in values.items():
+                yield self.name, label_values, value
+            return
+        for label_values, series in list(self._series.items()):
+            yield self.name, label_values, series.value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, label_values, value in self.samples():
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        names = self.label_names + ("le",)
+        for label_values, series in list(self._series.items()):
+            counts = list(series.counts)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(names, label_values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise DuplicatedMetricException(f"{metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels=(), **kwargs):
+        return self.register(Histogram(name, documentation, labels, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+TARGETS_STARTED = registry.counter(
+    "wpoke_targets_started_total", "Scans of targets started"
+)
+TARGETS_FINISHED = registry.counter(
+    "wpoke_targets_finished_total",
+    "Scans of targets finished, by outcome as journaled: ok, failed or error",
+    ["outcome"],
+)
+SCANS_IN_FLIGHT = registry.gauge("wpoke_scans_in_flight", "Scans of targets ongoing")
+SCAN_DURATION = registry.histogram(
+    "wpoke_scan_duration_seconds", "Seconds every scan of a target took"
+)
+FINGER_OUTCOMES = registry.counter(
+    "wpoke_finger_outcomes_total",
+    "Runs of fingers, by finger and outcome: ok, or the exception raised",
+    ["finger", "outcome"],
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "wpoke_requests_in_flight", "Requests sent and waiting for their response"
+)
+REQUEST_PHASES = registry.histogram(
+    "wpoke_request_phase_seconds",
+    "Seconds spent per phase of requests: queued for a connection, dns, "
+    "connect (TLS included) and headers, from sending up to the response head",
+    ["phase"],
+)
+REQUEST_ERRORS = registry.counter(
+    "wpoke_request_errors_total", "Requests failed, by exception", ["error"]
+)
+BYTES_DOWNLOADED = registry.counter(
+    "wpoke_downloaded_bytes_total", "Bytes of response bodies received"
+)
+CONNECTIONS = registry.counter(
+    "wpoke_connections_total",
+    "Connections requests went through, by kind: new or reused",
+    ["kind"],
+)
+DNS_CACHE = registry.counter(
+    "wpoke_dns_cache_total", "Lookups of the DNS cache, by result", ["result"]
+)
+RESULT_CACHE = registry.counter(
+    "wpoke_result_cache_total",
+    "Lookups of the result cache, by result: hit, stale, miss or coalesced "
+    "into an ongoing scan",
+    ["result"],
+)
+HTTP_CACHE = registry.counter(
+    "wpoke_http_cache_total",
+    "Responses of the HTTP cache, by result: stored, or not_modified when "
+    "revalidated",
+    ["result"],
+)
+HTTP_CACHE_SAVED_BYTES = registry.counter(
+    "wpoke_http_cache_saved_bytes_total",
+    "Bytes of bodies served by the HTTP cache instead of being downloaded",
+)
+THEME_FINGERPRINTS = registry.counter(
+    "wpoke_theme_fingerprints_total",
+    "Lookups of themes seen before, by kind: theme, by style.css content, or "
+    "screenshot, by theme slug and version; and result: hit or miss",
+    ["kind", "result"],
+)
+TLS_HANDSHAKES = registry.counter(
+    "wpoke_tls_handshakes_total", "TLS handshakes, by kind: full or resumed", ["kind"],
+)
+# Set by whoever bounds concurrency. Settings are context variables, which
+# the exporter threads would not see
+CONCURRENCY_LIMIT = registry.gauge(
+    "wpoke_concurrency_limit", "Max number of scans allowed in flight"
+)
+
+
+def _tls_handshakes() -> Dict[LabelValues, float]:
+    from .tls import tls_stats
+
+    stats = tls_stats()
+    return {("full",): stats.full_handshakes, ("resumed",): stats.resumed}
+
+
+TLS_HANDSHAKES.set_function(_tls_handshakes)
+
+
+def is_exporting() -> bool:
+    return bool(settings.metrics_port or settings.metrics_file)
+
+
+def request_trace_config():
+    """ aiohttp trace config feeding the request metrics """
+    from aiohttp import TraceConfig
+
+    queued = REQUEST_PHASES.labels("queued")
+    dns = REQUEST_PHASES.labels("dns")
+    connect = REQUEST_PHASES.labels("connect")
+    headers = REQUEST_PHASES.labels("headers")
+    in_flight = REQUESTS_IN_FLIGHT.labels()
+    downloaded = BYTES_DOWNLOADED.labels()
+    new_connections = CONNECTIONS.labels("new")
+    reused_connections = CONNECTIONS.labels("reused")
+    dns_hits = DNS_CACHE.labels("hit")
+    dns_misses = DNS_CACHE.labels("miss")
+    clock = time.perf_counter
+
+    async def on_request_start(session, context, params):
+        context.started_at = clock()
+        in_flight.inc()
+
+    async def on_request_end(session, context, params):
+        headers.observe(clock() - context.started_at)
+        in_flight.dec()
+
+    async def on_request_exception(session, context, params):
+        REQUEST_ERRORS.labels(type(params.exception).__name__).inc()
+        in_flight.dec()
+
+    # Resolving a host happens while creating a connection, hence every
+    # phase keeps its own start time
+    def on_phase_start(phase):
+        async def callback(session, context, params):
+            setattr(context, phase, clock())
+
+        return callback
+
+    def on_phase_end(phase, series):
+        async def callback(session, context, params):
+            series.observe(clock() - getattr(context, phase))
+
+        return callback
+
+    async def on_connection_create_end(session, context, params):
+        connect.observe(clock() - context.connect)
+        new_connections.inc()
+
+    async def on_connection_reuseconn(session, context, params):
+        reused_connections.inc()
+
+    async def on_response_chunk_received(session, context, params):
+        downloaded.inc(len(params.chunk))
+
+    async def on_dns_cache_hit(session, context, params):
+        dns_hits.inc()
+
+    async def on_dns_cache_miss(session, context, params):
+        dns_misses.inc()
+
+    trace_config = TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    trace_config.on_connection_queued_start.append(on_phase_start("queued"))
+    trace_config.on_connection_queued_end.append(on_phase_end("queued", queued))
+    trace_config.on_dns_resolvehost_start.append(on_phase_start("dns"))
+    trace_config.on_dns_resolvehost_end.append(on_phase_end("dns", dns))
+    trace_config.on_connection_create_start.append(on_phase_start("connect"))
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace_config
+
+
+def _handler_class(registry: MetricsRegistry):
+    import http.server
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    """ Serves the registry at http://host:port/metrics from a thread """
+
+    def __init__(self, port: int, host: str = "127.0.0.1", registry=registry):
+        # Only loaded by processes serving metrics
+        import http.server
+
+        self._server = http.server.ThreadingHTTPServer(
+            (host, port), _handler_class(registry)
+        )
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="wpoke-metrics", daemon=True
+        )
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsFileWriter:
+    """ Writes the registry to `path` every `interval` seconds from a
+    thread, and once more when stopped. Files are replaced atomically """
+
+    def __init__(self, path: str, interval: float = 15.0, registry=registry):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="wpoke-metrics", daemon=True
+        )
+
+    def write(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as fd:
+            fd.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self) -> "MetricsFileWriter":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.write()
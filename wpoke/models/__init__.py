@@ -1,8 +1,11 @@
 from datetime import datetime
-from typing import AnyStr, Dict, List, Optional
+from typing import AnyStr, Dict, List, Optional, Type, TYPE_CHECKING
 
 import serpy
 
+if TYPE_CHECKING:  # pragma: nocover
+    from wpoke.profiling import StageTimings
+
 
 class TimeitResultMixin:
     started_at: datetime
@@ -31,7 +34,13 @@ class FingerResult(TimeitResultMixin):
     status: int
     finger_origin: AnyStr
     data: Dict
-    errors: Optional[List[AnyStr]] = []
+    errors: Optional[List[AnyStr]]
+    # Class of the exception the finger failed with, if any
+    error_type: Optional[Type[BaseException]]
+
+    def __init__(self):
+        self.errors = []
+        self.error_type = None
 
 
 class FingerResultSerializer(serpy.Serializer, TimeitResultSerializerMixin):
@@ -43,13 +52,19 @@ class FingerResultSerializer(serpy.Serializer, TimeitResultSerializerMixin):
 
 
 class HandResult(TimeitResultMixin):
+    target: AnyStr
+    status: int
     loaded_fingers: List[str]
     serial_runtime: float
     parallel_runtime: float
     pokes: List[FingerResult]
+    # Seconds spent per stage of the scan, when profiled
+    stage_timings: Optional["StageTimings"] = None
 
 
 class HandResultSerializer(serpy.Serializer, TimeitResultSerializerMixin):
+    target = serpy.StrField(required=False)
+    status = serpy.IntField(required=True)
     loaded_fingers = serpy.Field(required=True)
     serial_runtime = serpy.FloatField(required=True)
     parallel_runtime = serpy.FloatField(required=True)
@@ -0,0 +1,227 @@
+""" Where the time of a scan goes.
+
+Scans run with `settings.profile` on record how long each of their stages
+takes, e.g fetching the index or parsing style.css, into the
+`stage_timings` of their `HandResult`. Stages are measured wherever the
+work is done, through `stage`, which costs nothing when profiling is off.
+
+On top of that, whole runs can be profiled with cProfile or by sampling
+the stacks of every thread, see `run_profiler`.
+"""
+import contextlib
+import contextvars as ctxv
+import cProfile
+import sys
+import threading
+import time
+from collections import Counter
+from enum import Enum
+from typing import Dict, Iterator, Mapping, Optional
+
+from . import tracing
+
+
+class Stages(Enum):
+    INDEX_FETCH = "index_fetch"
+    HTML_PARSE = "html_parse"
+    CANDIDATE_EXTRACTION = "candidate_extraction"
+    STYLE_CSS_FETCH = "style_css_fetch"
+    CSS_PARSE = "css_parse"
+    SCREENSHOT_PROBE = "screenshot_probe"
+    SERIALIZATION = "serialization"
+
+
+STAGES = tuple(stage_.value for stage_ in Stages)
+
+
+class Profilers(Enum):
+    CPROFILE = "cprofile"
+    # Stacks of every thread sampled at intervals, as folded stacks
+    SAMPLE = "sample"
+
+
+PROFILERS = tuple(profiler.value for profiler in Profilers)
+
+
+class StageTimings(Dict[str, float]):
+    """ Seconds spent per stage of a scan. Stages entered several times,
+    e.g fetching the style.css of every candidate theme, add up """
+
+    def add(self, name: str, seconds: float) -> None:
+        self[name] = self.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(seconds, 6) for name, seconds in self.items()}
+
+
+_timings: ctxv.ContextVar = ctxv.ContextVar("stage_timings", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "timings", "span", "started_at")
+
+    def __init__(self, name: str, timings: StageTimings, span):
+        self.name = name
+        self.timings = timings
+        self.span = span
+
+    def __enter__(self):
+        self.span.__enter__()
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, time.perf_counter() - self.started_at)
+        return self.span.__exit__(*exc_info)
+
+
+def stage(name: Stages):
+    """ Context manager measuring a stage of the ongoing scan, if it is
+    being profiled or traced. Await within it to include waiting on I/O """
+    span = tracing.span(name.value, "stage")
+    timings = _timings.get()
+    if timings is None:
+        return span
+    return _Stage(name.value, timings, span)
+
+
+@contextlib.contextmanager
+def record_stages() -> Iterator[StageTimings]:
+    """ Stages measured within the block, and asyncio tasks it creates,
+    are recorded into the timings yielded """
+    timings = StageTimings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def serialize_result(result) -> Dict:
+    """ Serialized `HandResult`. The stage timings of profiled scans are
+    added as `stage_timings`, serialization included """
+    from .models import HandResultSerializer
+
+    timings = getattr(result, "stage_timings", None)
+    if timings is None:
+        return HandResultSerializer(result).data
+    name = Stages.SERIALIZATION.value
+    with _Stage(name, timings, tracing.span(name, "stage")):
+        data = HandResultSerializer(result).data
+    data["stage_timings"] = timings.as_dict()
+    return data
+
+
+class StageProfile:
+    """ Stage timings aggregated across the scans of a batch """
+
+    def __init__(self):
+        self.scans = 0
+        self.totals = StageTimings()
+        self.maximums = StageTimings()
+
+    def add(self, timings: Optional[Mapping[str, float]]) -> None:
+        if timings is None:
+            return
+        self.scans += 1
+        for name, seconds in timings.items():
+            self.totals.add(name, seconds)
+            self.maximums[name] = max(self.maximums.get(name, 0.0), seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        overall = sum(self.totals.values())
+        return {
+            name: {
+                "total": round(self.totals[name], 6),
+                "mean": round(self.totals[name] / self.scans, 6),
+                "max": round(self.maximums[name], 6),
+                "share": round(self.totals[name] / overall, 4) if overall else 0.0,
+            }
+            for name in STAGES
+            if name in self.totals
+        }
+
+    def format(self) -> str:
+        lines = [
+            f"stage timings of {self.scans} scans",
+            f"{'stage':<22}{'total s':>12}{'mean s':>12}{'max s':>12}{'share':>8}",
+        ]
+        for name, figures in self.summary().items():
+            lines.append(
+                f"{name:<22}{figures['total']:>12.4f}{figures['mean']:>12.4f}"
+                f"{figures['max']:>12.4f}{figures['share']:>8.1%}"
+            )
+        return "\n".join(lines)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+class StackSampler:
+    """ Samples the stacks of every other thread every `interval` seconds,
+    the event loop's included. Samples are counted as folded stacks, one
+    line each, as flame graph tools expect them:
+
+        MainThread;module:outer;module:inner 42
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_name(frame))
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._sample, name="wpoke-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as fd:
+            for stack, count in self.stacks.most_common():
+                fd.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def run_profiler(kind: str, path: str, interval: float = 0.005):
+    """ Profiles the block, saving the profile to `path`: pstats data for
+    cProfile, folded stacks for sampling """
+    if kind == Profilers.SAMPLE.value:
+        sampler = StackSampler(interval)
+        sampler.start()
+        try:
+            yield sampler
+        finally:
+            sampler.stop()
+            sampler.dump(path)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
@@ -0,0 +1,331 @@
+import asyncio
+import hashlib
+import multiprocessing
+import queue
+import signal
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .client import URL
+from .conf import settings
+from .fingers.loading import FingerSpec
+
+# Seconds between checks of worker liveness and shutdown requests
+POLL_INTERVAL = 0.2
+# Seconds workers are given to cancel their scans before being killed
+SHUTDOWN_TIMEOUT = 5
+
+
+@dataclass
+class ShardResult:
+    """ A finished target, as reported by the worker which scanned it """
+
+    seq: int
+    target: str
+    status: int
+    # Serialized `HandResult`
+    data: Dict[str, Any]
+    worker: int
+
+
+def shard_key(target: str) -> str:
+    """ Targets sharing a host always land in the same shard, so that
+    per-host politeness holds within a single worker """
+    try:
+        host = URL(target).host
+    except ValueError:
+        host = None
+    return (host or target).lower()
+
+
+def shard_for(target: str, shards: int) -> int:
+    digest = hashlib.blake2b(shard_key(target).encode("utf8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little") % shards
+
+
+def _failed_data(target: str, now: datetime) -> Dict[str, Any]:
+    from .batch import _failed_result
+    from .models import HandResultSerializer
+
+    return HandResultSerializer(_failed_result(target, now)).data
+
+
+async def _scan_shard(specs, in_queue, out_queue, stop, index, concurrency):
+    from .batch import _poke_one
+    from .client import make_session
+    from .hand import Hand
+    from .limiter import AdaptiveLimiter, is_congested
+    from .profiling import serialize_result
+
+    loop = asyncio.get_event_loop()
+    limiter = AdaptiveLimiter.from_settings() if settings.adaptive else None
+    async with make_session() as session:
+        hand = Hand(session=session)
+        for spec in specs:
+            hand.add_finger_spec(spec)
+
+        pending: Dict[asyncio.Future, tuple] = {}
+        started_at: Dict[asyncio.Future, float] = {}
+        getter = None
+        exhausted = False
+        try:
+            while not stop.is_set():
+                limit = limiter.limit if limiter is not None else concurrency
+                if getter is None and not exhausted and len(pending) < limit:
+                    # Queue reads block, thus they are done from a thread
+                    getter = loop.run_in_executor(
+                        None, in_queue.get, True, POLL_INTERVAL
+                    )
+                waiting = set(pending)
+                if getter is not None:
+                    waiting.add(getter)
+                if not waiting:
+                    break
+                done, _ = await asyncio.wait(
+                    waiting, timeout=POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    if future is getter:
+                        getter = None
+                        try:
+                            item = future.result()
+                        except queue.Empty:
+                            continue
+                        if item is None:
+                            exhausted = True
+                            continue
+                        seq, target = item
+                        task = asyncio.ensure_future(_poke_one(hand, target, None))
+                        pending[task] = item
+                        if limiter is not None:
+                            started_at[task] = loop.time()
+                            limiter.started()
+                    else:
+                        seq, target = pending.pop(future)
+                        result = future.result()
+                        if limiter is not None:
+                            latency = loop.time() - started_at.pop(future)
+                            limiter.finished(latency, is_congested(result))
+                        data = serialize_result(result)
+                        out_queue.put(
+                            ShardResult(seq, target, result.status, data, index)
+                        )
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if getter is not None:
+                await asyncio.gather(getter, return_exceptions=True)
+
+
+def _worker_main(index, specs, settings_values, in_queue, out_queue, stop):
+    """ Entry point of every worker process """
+    from . import set_event_loop_policy
+    from .fingers.theme.fingerprints import close_fingerprints
+    from .httpcache import close_http_cache
+    from .tracing import fragment_path, start_tracing, stop_tracing
+
+    # Interruptions are handled by the parent, which asks workers to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    settings.load(settings_values)
+    set_event_loop_policy()
+    if settings.trace:
+        # Merged into the trace by the parent once every worker is done
+        start_tracing(
+            fragment_path(settings.trace, index),
+            fragment=True,
+            process_name=f"wpoke-worker-{index}",
+        )
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(
+            _scan_shard(specs, in_queue, out_queue, stop, index, settings.concurrency)
+        )
+    finally:
+        loop.close()
+        stop_tracing()
+        close_http_cache()
+        close_fingerprints()
+
+
+class _Worker:
+    def __init__(self, index: int, process, in_queue):
+        self.index = index
+        self.process = process
+        self.in_queue = in_queue
+        # Targets handed over and not reported yet, by sequence number
+        self.in_flight: Dict[int, str] = {}
+        self.finished = False
+
+    @property
+    def alive(self) -> bool:
+        return not self.finished and self.process.is_alive()
+
+
+class ShardedRunner:
+    """ Scans targets across `workers` processes, each one running its own
+    event loop, HTTP session and connection pool with `settings.concurrency`
+    scans in flight. Targets are sharded by host.
+
+    Results are yielded in completion order, or in input order when
+    `ordered` is set, in which case a slow target holds back the ones behind
+    it. A worker dying does not take the run down: its unfinished targets
+    are reported as errored, and its shard is taken over by the next worker.
+    """
+
+    def __init__(
+        self,
+        specs: List[FingerSpec],
+        workers: Optional[int] = None,
+        ordered: bool = False,
+        queue_size: Optional[int] = None,
+        start_method: str = "spawn",
+    ):
+        self.specs = list(specs)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.ordered = ordered
+        self.queue_size = queue_size or settings.concurrency * 2
+        self.context = multiprocessing.get_context(start_method)
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._stop = self.context.Event()
+        self._out_queue = None
+
+    def _start(self) -> None:
+        self._out_queue = self.context.Queue()
+        settings_values = settings.as_dict()
+        for index in range(self.workers):
+            in_queue = self.context.Queue(self.queue_size)
+            process = self.context.Process(
+                target=_worker_main,
+                args=(
+                    index,
+                    self.specs,
+                    settings_values,
+                    in_queue,
+                    self._out_queue,
+                    self._stop,
+                ),
+                name=f"wpoke-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._workers.append(_Worker(index, process, in_queue))
+
+    def _pick_worker(self, target: str) -> Optional[_Worker]:
+        shard = shard_for(target, self.workers)
+        for offset in range(self.workers):
+            worker = self._workers[(shard + offset) % self.workers]
+            if worker.alive:
+                return worker
+        return None
+
+    def _feed(self, targets: Iterable[str], failed: "queue.Queue") -> None:
+        """ Hands targets over to workers. Runs on its own thread, blocking
+        whenever the queue of a worker is full """
+        seq = 0
+        for target in targets:
+            while not self._stop.is_set():
+                worker = self._pick_worker(target)
+                if worker is None:
+                    failed.put((seq, target))
+                    break
+                with self._lock:
+                    worker.in_flight[seq] = target
+                try:
+                    worker.in_queue.put((seq, target), timeout=POLL_INTERVAL)
+                    break
+                except queue.Full:
+                    with self._lock:
+                        worker.in_flight.pop(seq, None)
+            if self._stop.is_set():
+                return
+            seq += 1
+        for worker in self._workers:
+            if worker.alive:
+                try:
+                    worker.in_queue.put(None, timeout=SHUTDOWN_TIMEOUT)
+                except queue.Full:
+                    pass
+
+    def _reap(self, dead: List[_Worker]) -> List[ShardResult]:
+        """ Turns targets left behind by dead workers into errored results """
+        results = []
+        for worker in dead:
+            worker.finished = True
+            with self._lock:
+                lost, worker.in_flight = worker.in_flight, {}
+            results.extend(self._error_result(seq, t) for seq, t in lost.items())
+        return results
+
+    def _drain(self, timeout: Optional[float] = None) -> Iterator[ShardResult]:
+        """ Yields every result available, waiting `timeout` for the first """
+        try:
+            result = self._out_queue.get(timeout=timeout) if timeout else None
+            while True:
+                if result is not None:
+                    with self._lock:
+                        self._workers[result.worker].in_flight.pop(result.seq, None)
+                    yield result
+                result = self._out_queue.get_nowait()
+        except queue.Empty:
+            return
+
+    def _error_result(self, seq: int, target: str) -> ShardResult:
+        from .batch import STATUS_ERROR
+
+        data = _failed_data(target, datetime.utcnow())
+        return ShardResult(seq, target, STATUS_ERROR, data, -1)
+
+    def _results(self, targets: Iterable[str]) -> Iterator[ShardResult]:
+        failed: "queue.Queue" = queue.Queue()
+        feeder = threading.Thread(
+            target=self._feed, args=(targets, failed), name="wpoke-feeder", daemon=True
+        )
+        feeder.start()
+        while True:
+            yield from self._drain(POLL_INTERVAL)
+            while not failed.empty():
+                yield self._error_result(*failed.get())
+            dead = [w for w in self._workers if not w.finished and not w.alive]
+            if dead:
+                # Whatever a worker sent before dying is in the queue by now
+                yield from self._drain()
+                yield from self._reap(dead)
+            if not feeder.is_alive() and not any(
+                worker.alive or worker.in_flight for worker in self._workers
+            ):
+                break
+
+    def _ordered(self, results: Iterator[ShardResult]) -> Iterator[ShardResult]:
+        buffer = {}
+        next_seq = 0
+        for result in results:
+            buffer[result.seq] = result
+            while next_seq in buffer:
+                yield buffer.pop(next_seq)
+                next_seq += 1
+        yield from (buffer[seq] for seq in sorted(buffer))
+
+    def run(self, targets: Iterable[str]) -> Iterator[ShardResult]:
+        self._start()
+        try:
+            results = self._results(targets)
+            if self.ordered:
+                results = self._ordered(results)
+            yield from results
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        """ Asks workers to cancel their scans, killing them if they do not
+        exit in time """
+        self._stop.set()
+        for worker in self._workers:
+            worker.process.join(SHUTDOWN_TIMEOUT)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
@@ -0,0 +1,273 @@
+import asyncio
+import socket
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Deque, Optional
+
+from .client import URL
+from .conf import settings
+
+# Host states kept around, most recently used first. Idle ones are evicted
+MAX_TRACKED_HOSTS = 10000
+# Statuses whose Retry-After header is honoured
+THROTTLING_STATUSES = (429, 503)
+
+
+def parse_retry_after(value: Optional[str], now: Optional[datetime] = None) -> float:
+    """ Seconds to wait according to a Retry-After header, given either as
+    seconds or as a HTTP date. Unparseable values yield 0 """
+    if not value:
+        return 0.0
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return 0.0
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class _HostState:
+    __slots__ = ("tokens", "updated_at", "in_flight", "blocked_until", "waiters")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated_at = now
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    def refill(self, now: float, rate: float, burst: float) -> None:
+        if rate:
+            elapsed = now - self.updated_at
+            self.tokens = min(burst, self.tokens + elapsed * rate)
+        self.updated_at = now
+
+    def is_idle(self, now: float) -> bool:
+        return not self.in_flight and not self.waiters and self.blocked_until <= now
+
+
+class HostScheduler:
+    """ Politeness towards every host scanned by this process, whatever the
+    scan requests come from:
+
+    - a token bucket per host allows `rate` requests per second, in bursts of
+      up to `burst` requests. A rate of 0 means no limit
+    - at most `concurrency` requests are in flight against each host. 0
+      means no limit
+    - hosts answering 429 or 503 with Retry-After get no request at all until
+      then
+
+    With `by_ip` set, limits apply to resolved IP addresses instead, so that
+    sites sharing a hosting provider server share their limits too.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        burst: Optional[float] = None,
+        concurrency: int = 0,
+        by_ip: bool = False,
+        max_hosts: int = MAX_TRACKED_HOSTS,
+    ):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.concurrency = concurrency
+        self.by_ip = by_ip
+        self.max_hosts = max_hosts
+        self._states: "OrderedDict[str, _HostState]" = OrderedDict()
+        self._addresses: "OrderedDict[str, str]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "HostScheduler":
+        return cls(
+            rate=settings.host_rate,
+            burst=settings.host_burst,
+            concurrency=settings.host_concurrency,
+            by_ip=settings.politeness_by_ip,
+        )
+
+    @property
+    def is_limited(self) -> bool:
+        return bool(self.rate or self.concurrency)
+
+    def _host(self, url: str) -> str:
+        try:
+            host = URL(url).host
+        except ValueError:
+            host = None
+        return (host or url).lower()
+
+    async def _resolve(self, host: str) -> str:
+        address = self._addresses.get(host)
+        if address is None:
+            loop = asyncio.get_event_loop()
+            try:
+                infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+                address = infos[0][4][0]
+            except (OSError, IndexError):
+                # Requesting will fail alike, and be reported by the crawler
+                address = host
+            self._addresses[host] = address
+            if len(self._addresses) > self.max_hosts:
+                self._addresses.popitem(last=False)
+        return address
+
+    async def key_for(self, url: str) -> str:
+        host = self._host(url)
+        if self.by_ip:
+            return await self._resolve(host)
+        return host
+
+    def _state(self, key: str, now: float, create: bool) -> Optional[_HostState]:
+        state = self._states.get(key)
+        if state is None:
+            if not create:
+                return None
+            # Room is made beforehand, as the new state is idle and would be
+            # the first one evicted otherwise
+            self._evict(now)
+            state = self._states[key] = _HostState(self.burst, now)
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    def _evict(self, now: float) -> None:
+        """ Drops idle hosts, least recently used first, until there is room
+        for one more. Busy hosts are kept, however many they are """
+        if len(self._states) < self.max_hosts:
+            return
+        for key in list(self._states):
+            if len(self._states) < self.max_hosts:
+                return
+            if self._states[key].is_idle(now):
+                del self._states[key]
+
+    def is_throttled(self, url: str) -> bool:
+        """ Whether a request to the url would have to wait right now. Meant
+        to pick work for idle hosts first. It never resolves hosts: under
+        `by_ip`, only already resolved hosts are looked up """
+        if not self._states:
+            return False
+        host = self._host(url)
+        key = self._addresses.get(host, host) if self.by_ip else host
+        state = self._states.get(key)
+        if state is None:
+            return False
+        now = asyncio.get_event_loop().time()
+        if state.blocked_until > now:
+            return True
+        if self.concurrency and state.in_flight >= self.concurrency:
+            return True
+        state.refill(now, self.rate, self.burst)
+        return bool(self.rate) and state.tokens < 1
+
+    async def acquire(self, key: str) -> None:
+        loop = asyncio.get_event_loop()
+        state = self._state(key, loop.time(), create=self.is_limited)
+        if state is None:
+            return
+        while True:
+            now = loop.time()
+            if state.blocked_until > now:
+                await asyncio.sleep(state.blocked_until - now)
+                continue
+            if self.concurrency and state.in_flight >= self.concurrency:
+                waiter = loop.create_future()
+                state.waiters.append(waiter)
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    if waiter.done() and not waiter.cancelled():
+                        # Woken up right before being cancelled: pass it on
+                        self._wake(state)
+                    raise
+                finally:
+                    if waiter in state.waiters:
+                        state.waiters.remove(waiter)
+                continue
+            state.refill(now, self.rate, self.burst)
+            if self.rate and state.tokens < 1:
+                await asyncio.sleep((1 - state.tokens) / self.rate)
+                continue
+            if self.rate:
+                state.tokens -= 1
+            state.in_flight += 1
+            return
+
+    def release(self, key: str) -> None:
+        state = self._states.get(key)
+        if state is None or not state.in_flight:
+            return
+        state.in_flight -= 1
+        self._wake(state)
+
+    def _wake(self, state: _HostState) -> None:
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def block(self, key: str, seconds: float) -> None:
+        """ No request is sent to the host for `seconds` """
+        now = asyncio.get_event_loop().time()
+        state = self._state(key, now, create=True)
+        state.blocked_until = max(state.blocked_until, now + seconds)
+
+    def slot(self, url: str) -> "_Slot":
+        """ Waits for the host of the url to accept one more request:
+
+        .. code-block:: python
+            async with scheduler.slot(url) as slot:
+                response = await session.get(url)
+                slot.throttled(response)
+        """
+        return _Slot(self, url)
+
+
+class _Slot:
+    def __init__(self, scheduler: HostScheduler, url: str):
+        self.scheduler = scheduler
+        self.url = url
+        self.key = None
+        self.retry_after = 0.0
+
+    async def __aenter__(self) -> "_Slot":
+        self.key = await self.scheduler.key_for(self.url)
+        await self.scheduler.acquire(self.key)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.scheduler.release(self.key)
+
+    def throttled(self, response) -> float:
+        """ Honours the Retry-After header of throttling responses. Returns
+        the seconds the host asked to wait, if any """
+        if response.status not in THROTTLING_STATUSES:
+            return 0.0
+        self.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if self.retry_after:
+            self.scheduler.block(self.key, self.retry_after)
+        return self.retry_after
+
+
+_scheduler: Optional[HostScheduler] = None
+
+
+def get_scheduler() -> HostScheduler:
+    """ The scheduler shared by every scan of this process """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = HostScheduler.from_settings()
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[HostScheduler]) -> None:
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,338 @@
+""" Long running scan service, on aiohttp.web.
+
+Scan jobs, one target or a batch of them, are queued and scanned by a pool
+of workers. Workers share a single `ClientSession`, thus its connection
+pool, DNS cache and TLS sessions, and one warm `Hand` per selection of
+fingers. Requests to the service only pay for the scans themselves.
+
+Routes:
+
+- POST /scans: submits a job, `{"targets": [...], "fingers": [...]}` or
+  `{"target": "..."}`. Fingers default to the ones the service was started
+  with. Responds 202 with the job, or waits for it to finish with `?wait=1`
+- GET /scans/{id}: the job, along with the results so far
+- GET /scans/{id}/results: results streamed as soon as each target
+  finishes, one JSON document per line
+- GET /metrics: see `wpoke.metrics`
+"""
+import asyncio
+import contextlib
+import json
+import signal
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+from aiohttp import web
+
+from .batch import _poke_one
+from .cache import CachedHand, ResultCache
+from .client import make_session
+from .conf import settings
+from .exceptions import InvalidJobException, ServiceBusyException, ValidationError
+from .fingers.loading import FingerSpec
+from .hand import Hand
+from .metrics import CONTENT_TYPE, is_exporting, registry, request_trace_config
+from .profiling import serialize_result
+from .validators.url import validate_url
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+
+# Targets waiting to be scanned, across jobs, before new jobs are rejected
+MAX_QUEUED_TARGETS = 10000
+# Finished jobs kept around to be polled, the oldest are forgotten first
+MAX_FINISHED_JOBS = 1000
+# Seconds clients are told to wait before submitting again when busy
+RETRY_AFTER = 5
+
+
+class Job:
+    def __init__(self, targets: Sequence[str], fingers: Tuple[str, ...]):
+        self.id = uuid.uuid4().hex
+        self.targets = list(targets)
+        self.fingers = fingers
+        self.results: List[Dict[str, Any]] = []
+        self.started = False
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return JOB_DONE
+        return JOB_RUNNING if self.started else JOB_QUEUED
+
+    def add_result(self, data: Dict[str, Any]) -> None:
+        self.results.append(data)
+        if len(self.results) == len(self.targets):
+            self.finished_at = datetime.utcnow()
+        # Wakes up everyone waiting, who then waits on a new event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def iter_results(self) -> AsyncIterator[Dict[str, Any]]:
+        """ Results in order of completion, the finished ones first """
+        index = 0
+        while True:
+            while index < len(self.results):
+                yield self.results[index]
+                index += 1
+            if self.finished_at is not None:
+                return
+            await self._changed.wait()
+
+    async def wait(self) -> None:
+        async for _ in self.iter_results():
+            pass
+
+    def as_dict(self, results: bool = True) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "fingers": list(self.fingers),
+            "targets": len(self.targets),
+            "finished": len(self.results),
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at and self.finished_at.isoformat(),
+        }
+        if results:
+            data["results"] = self.results
+        return data
+
+
+class HandPool:
+    """ Warm hands, one per selection of fingers, sharing a session. Hands
+    hold no state of the scans they run, thus every worker shares them """
+
+    def __init__(
+        self,
+        session,
+        fingers: Dict[str, FingerSpec],
+        cache: Optional[ResultCache] = None,
+    ):
+        self.session = session
+        self.fingers = fingers
+        self.cache = cache
+        self._hands: Dict[Tuple[str, ...], Union[Hand, CachedHand]] = {}
+
+    def get(self, names: Tuple[str, ...]) -> Union[Hand, CachedHand]:
+        hand = self._hands.get(names)
+        if hand is None:
+            hand = Hand(session=self.session)
+            for name in names:
+                hand.add_finger_spec(self.fingers[name])
+            if self.cache is not None:
+                hand = CachedHand(hand, self.cache)
+            self._hands[names] = hand
+        return hand
+
+    async def close(self) -> None:
+        for hand in self._hands.values():
+            if isinstance(hand, CachedHand):
+                await hand.aclose()
+
+
+class ScanService:
+    """ Queue of jobs scanned by `workers` coroutines, `settings.concurrency`
+    of them by default. A session is created on start unless one is given,
+    and closed once the service stops. Given a cache, results are looked up
+    in it before scanning """
+
+    def __init__(
+        self,
+        fingers: Dict[str, FingerSpec],
+        default_fingers: Optional[Sequence[str]] = None,
+        workers: Optional[int] = None,
+        max_queued: int = MAX_QUEUED_TARGETS,
+        max_finished: int = MAX_FINISHED_JOBS,
+        session=None,
+        cache: Optional[ResultCache] = None,
+    ):
+        self.session = session
+        self.cache = cache
+        self.fingers = fingers
+        self.default_fingers = tuple(sorted(default_fingers or fingers))
+        self.workers = workers or settings.concurrency
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.pool: Optional[HandPool] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._own_session = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        session = self.session
+        if session is None:
+            # The service serves metrics, thus it always collects them
+            trace_configs = [] if is_exporting() else [request_trace_config()]
+            session = self._own_session = make_session(trace_configs=trace_configs)
+        self.pool = HandPool(session, self.fingers, self.cache)
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.pool is not None:
+            await self.pool.close()
+        if self._own_session is not None:
+            await self._own_session.close()
+            self._own_session = None
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _select_fingers(self, names: Optional[Sequence[str]]) -> Tuple[str, ...]:
+        if not names:
+            return self.default_fingers
+        if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+            raise InvalidJobException("fingers must be a list of names")
+        unknown = [name for name in names if name not in self.fingers]
+        if unknown:
+            raise InvalidJobException(f"unknown fingers: {', '.join(unknown)}")
+        return tuple(sorted(set(names)))
+
+    def submit(
+        self, targets: Sequence[str], fingers: Optional[Sequence[str]] = None
+    ) -> Job:
+        """ Queues a job scanning every target
+        :raises InvalidJobException: also raised by jobs larger than the
+            queue, which would never be accepted
+        :raises ServiceBusyException: too many targets are queued already
+        """
+        if not isinstance(targets, list) or not targets:
+            raise InvalidJobException("targets must be a non empty list")
+        if len(targets) > self.max_queued:
+            raise InvalidJobException(f"jobs must not exceed {self.max_queued} targets")
+        for target in targets:
+            if not isinstance(target, str):
+                raise InvalidJobException("targets must be URLs")
+            try:
+                validate_url(target)
+            except ValidationError as e:
+                raise InvalidJobException(f"{target}: {e.message}") from e
+        names = self._select_fingers(fingers)
+        if self.queued + len(targets) > self.max_queued:
+            raise ServiceBusyException("too many targets queued, retry later")
+
+        job = Job(targets, names)
+        self.jobs[job.id] = job
+        for target in targets:
+            self._queue.put_nowait((job, target))
+        self._forget_finished_jobs()
+        return job
+
+    def _forget_finished_jobs(self) -> None:
+        finished = [job.id for job in self.jobs.values() if job.finished_at]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    async def _work(self) -> None:
+        while True:
+            job, target = await self._queue.get()
+            job.started = True
+            try:
+                result = await _poke_one(self.pool.get(job.fingers), target, None)
+                job.add_result(serialize_result(result))
+            finally:
+                self._queue.task_done()
+
+
+class ServiceRoutes:
+    """ Request handlers of the service """
+
+    def __init__(self, service: ScanService):
+        self.service = service
+
+    def _get_job(self, request: web.Request) -> Job:
+        job = self.service.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text="no such job")
+        return job
+
+    async def submit_job(self, request: web.Request) -> web.Response:
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            raise web.HTTPBadRequest(text="body must be a JSON object")
+        targets = payload.get("targets")
+        if "target" in payload:
+            targets = [payload["target"]]
+        try:
+            job = self.service.submit(targets, payload.get("fingers"))
+        except InvalidJobException as e:
+            raise web.HTTPBadRequest(text=e.message)
+        except ServiceBusyException as e:
+            raise web.HTTPServiceUnavailable(
+                text=e.message, headers={"Retry-After": str(RETRY_AFTER)}
+            )
+        if request.query.get("wait") in ("1", "true"):
+            await job.wait()
+            return web.json_response(job.as_dict())
+        return web.json_response(
+            job.as_dict(results=False),
+            status=202,
+            headers={"Location": f"/scans/{job.id}"},
+        )
+
+    async def get_job(self, request: web.Request) -> web.Response:
+        return web.json_response(self._get_job(request).as_dict())
+
+    async def stream_results(self, request: web.Request) -> web.StreamResponse:
+        job = self._get_job(request)
+        response = web.StreamResponse()
+        response.content_type = "application/x-ndjson"
+        await response.prepare(request)
+        async for data in job.iter_results():
+            await response.write(json.dumps(data).encode("utf8") + b"\n")
+        await response.write_eof()
+        return response
+
+    async def get_metrics(self, request: web.Request) -> web.Response:
+        body = registry.render().encode("utf8")
+        return web.Response(body=body, headers={"Content-Type": CONTENT_TYPE})
+
+
+def make_app(service: ScanService) -> web.Application:
+    routes = ServiceRoutes(service)
+    app = web.Application()
+    app.router.add_post("/scans", routes.submit_job)
+    app.router.add_get("/scans/{job_id}", routes.get_job)
+    app.router.add_get("/scans/{job_id}/results", routes.stream_results)
+    app.router.add_get("/metrics", routes.get_metrics)
+
+    async def on_startup(app):
+        await service.start()
+
+    async def on_cleanup(app):
+        await service.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def serve(app: web.Application, host: str, port: int) -> None:
+    """ Serves the app until SIGINT or SIGTERM """
+    stopping = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stopping.set)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await stopping.wait()
+    finally:
+        await runner.cleanup()
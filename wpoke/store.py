@@ -1,61 +1,202 @@
-from typing import Any, AnyStr, List, Optional
+import contextvars as ctxv
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AnyStr, Callable, Dict, List, Optional, Tuple
 
 from .exceptions import DataStoreAttributeNotFound
 
 
+def sizeof_value(value: Any) -> int:
+    """ Shallow size in bytes of a stored value """
+    return sys.getsizeof(value)
+
+
+@dataclass
+class DataStoreStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
 class DataStore:
+    """ Key-value store whose keys are case insensitive and can be accessed
+    as attributes as well, e.g `store.index_body`.
+
+    Unbounded by default. It can be turned into a cache by bounding it:
+
+    - ``max_size``: max number of keys
+    - ``max_bytes``: max accumulated size of values, as told by ``sizeof``
+    - ``ttl``: default seconds until a key expires. Can be overridden on set
+
+    Least recently used keys are evicted first once any bound is exceeded.
+    """
+
+    # Max number of raw keys whose prefixed version is memoized
+    PREFIXED_KEYS_CACHE_SIZE = 1024
+
+    __attributes__ = frozenset(
+        ("prefix", "max_size", "max_bytes", "ttl", "sizeof", "stats", "nbytes")
+    )
+
     def __init__(self, **kwargs):
-        self.__store__ = dict()
+        self.__store__ = OrderedDict()
+        self._expires_at: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._prefixed_keys: Dict[str, str] = {}
         self.prefix = kwargs.pop("prefix", "").upper()
+        self.max_size: Optional[int] = kwargs.pop("max_size", None)
+        self.max_bytes: Optional[int] = kwargs.pop("max_bytes", None)
+        self.ttl: Optional[float] = kwargs.pop("ttl", None)
+        self.sizeof: Callable[[Any], int] = kwargs.pop("sizeof", sizeof_value)
+        self.stats = DataStoreStats()
+        self.nbytes = 0
+        self._is_bounded = bool(self.max_size or self.max_bytes)
         super().__init__(**kwargs)
 
+    def __len__(self) -> int:
+        return len(self.__store__)
+
     def __getitem__(self, item: str) -> Any:
-        return self.__store__[self.prefix_key(item)]
+        return self._get(self.prefix_key(item))
 
     def __getattr__(self, item):
-        if self.has(item):
-            return self.__getitem__(item)
-        return super().__getattribute__(item)
+        # Only reached when regular attribute lookup fails
+        if item.startswith("_"):
+            return super().__getattribute__(item)
+        try:
+            return self._get(self.prefix_key(item))
+        except KeyError:
+            return super().__getattribute__(item)
 
     def __setitem__(self, key: str, value: Any) -> None:
-        self.__store__[self.prefix_key(key)] = value
+        self._set(self.prefix_key(key), value, self.ttl)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        if key.startswith("_") or key in self.__attributes__:
+            super().__setattr__(key, value)
+        else:
+            self.__setitem__(key, value)
 
     def prefix_key(self, key: str) -> str:
-        return self.prefix + key.upper()
+        try:
+            return self._prefixed_keys[key]
+        except KeyError:
+            if len(self._prefixed_keys) >= self.PREFIXED_KEYS_CACHE_SIZE:
+                self._prefixed_keys.clear()
+            prefixed_key = self._prefixed_keys[key] = self.prefix + key.upper()
+            return prefixed_key
+
+    def _is_expired(self, prefixed_key: str) -> bool:
+        expires_at = self._expires_at.get(prefixed_key)
+        if expires_at is None or expires_at > time.monotonic():
+            return False
+        self._remove(prefixed_key)
+        self.stats.expirations += 1
+        return True
+
+    def _get(self, prefixed_key: str) -> Any:
+        store = self.__store__
+        if prefixed_key not in store or (
+            self._expires_at and self._is_expired(prefixed_key)
+        ):
+            self.stats.misses += 1
+            raise KeyError(prefixed_key)
+        self.stats.hits += 1
+        if self._is_bounded:
+            store.move_to_end(prefixed_key)
+        return store[prefixed_key]
+
+    def _set(self, prefixed_key: str, value: Any, ttl: Optional[float]) -> None:
+        store = self.__store__
+        if prefixed_key in store:
+            self._remove(prefixed_key)
+        store[prefixed_key] = value
+        size = self.sizeof(value)
+        self._sizes[prefixed_key] = size
+        self.nbytes += size
+        if ttl is not None:
+            self._expires_at[prefixed_key] = time.monotonic() + ttl
+        if self._is_bounded:
+            self._evict()
+
+    def _remove(self, prefixed_key: str) -> None:
+        del self.__store__[prefixed_key]
+        self.nbytes -= self._sizes.pop(prefixed_key, 0)
+        self._expires_at.pop(prefixed_key, None)
+
+    def _evict(self) -> None:
+        store = self.__store__
+        max_size, max_bytes = self.max_size, self.max_bytes
+        while store and (
+            (max_size and len(store) > max_size)
+            or (max_bytes and self.nbytes > max_bytes)
+        ):
+            self._remove(next(iter(store)))
+            self.stats.evictions += 1
+
+    def purge_expired(self) -> None:
+        if not self._expires_at:
+            return
+        now = time.monotonic()
+        expired = [k for k, at in self._expires_at.items() if at <= now]
+        for prefixed_key in expired:
+            self._remove(prefixed_key)
+        self.stats.expirations += len(expired)
 
     def has(self, key: str) -> bool:
-        return self.prefix_key(key) in self.__store__
+        prefixed_key = self.prefix_key(key)
+        if prefixed_key not in self.__store__:
+            return False
+        return not (self._expires_at and self._is_expired(prefixed_key))
 
     def keys(self) -> List[AnyStr]:
+        self.purge_expired()
         keys = self.__store__.keys()
         return list(sorted(keys))
 
-    def set(self, key: str, value: Any, lazy: bool = False):
+    def set(
+        self, key: str, value: Any, lazy: bool = False, ttl: Optional[float] = None
+    ):
         if lazy and self.has(key):
             return
-        self.__setitem__(key, value)
+        self._set(self.prefix_key(key), value, self.ttl if ttl is None else ttl)
 
-    def set_lazy(self, key: str, value: Any):
-        self.set(key, value, lazy=True)
+    def set_lazy(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set(key, value, lazy=True, ttl=ttl)
 
-    def get_or_set(self, key: str, value: Any = None) -> Any:
-        if self.has(key):
+    def get_or_set(
+        self, key: str, value: Any = None, ttl: Optional[float] = None
+    ) -> Any:
+        try:
             return self.__getitem__(key)
-        self.set(key, value, lazy=False)
-        return value
+        except KeyError:
+            self.set(key, value, lazy=False, ttl=ttl)
+            return value
 
     def get_safe(self, key: str) -> Any:
-        return self.__store__.get(self.prefix_key(key))
+        try:
+            return self.__getitem__(key)
+        except KeyError:
+            return None
 
     def get_or_raise(self, key: str):
-        if self.has(key):
+        try:
             return self.__getitem__(key)
-        raise DataStoreAttributeNotFound(f"{key} not found")
+        except KeyError:
+            raise DataStoreAttributeNotFound(f"{key} not found") from None
 
     def __delitem__(self, key):
         if not self.has(key):
             return
-        del self.__store__[self.prefix_key(key)]
+        self._remove(self.prefix_key(key))
 
     def __delattr__(self, item):
         self.__delitem__(item)
@@ -65,14 +206,29 @@ class DataStore:
 
     def clear(self) -> None:
         self.__store__.clear()
+        self._expires_at.clear()
+        self._sizes.clear()
+        self.nbytes = 0
 
 
 class StoreAppStack:
-    def __init__(self):
-        self.stack = []
+    """Stack of data stores bound to the current execution context.
+
+    The stack lives in a `contextvars.ContextVar`, so every asyncio task sees
+    the stores pushed by its parent at creation time but pushes and pops of
+    its own never leak into sibling tasks. This is what allows concurrent
+    scans to each own a private store.
+    """
+
+    def __init__(self, *stores: DataStore):
+        self._stack = ctxv.ContextVar("store_stack", default=stores)
+
+    @property
+    def stack(self) -> Tuple[DataStore, ...]:
+        return self._stack.get()
 
     def push(self, store: DataStore) -> None:
-        self.stack.append(store)
+        self._stack.set(self.stack + (store,))
 
     @property
     def size(self):
@@ -89,10 +245,14 @@ class StoreAppStack:
     def pop(self) -> Optional[DataStore]:
         if self.is_empty():
             return None
-        return self.stack.pop()
+        stack = self.stack
+        self._stack.set(stack[:-1])
+        return stack[-1]
 
 
-__store_stack__ = StoreAppStack()  # pragma: nocover
+# The bottom store is the ContextVar default, hence visible from any context
+# regardless of where this module happens to be imported from.
+__store_stack__ = StoreAppStack(DataStore())  # pragma: nocover
 
 
 def push_store(store: DataStore) -> None:
@@ -105,6 +265,3 @@ def pop_store() -> Optional[DataStore]:
 
 def peek_store() -> Optional[DataStore]:
     return __store_stack__.peek()
-
-
-push_store(DataStore())
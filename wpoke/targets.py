@@ -0,0 +1,145 @@
+import hashlib
+import math
+from typing import AnyStr, Iterable, Iterator, Optional, Union
+
+from .client import URL
+from .exceptions import ValidationError
+from .validators.url import validate_url
+
+DEFAULT_SCHEME = "http"
+
+
+def normalize_target(target: AnyStr) -> str:
+    """ Canonicalizes a scan target down to its site root, so that every
+    spelling of the same site yields the same URL:
+
+    - a missing scheme defaults to http, scheme and host are lower-cased
+    - credentials, default ports, path, query and fragment are dropped
+
+    :raises ValidationError: the target is not an URL, or it points to a
+        non-global IP address
+    """
+    target = target.strip()
+    if target.startswith("//"):
+        target = f"{DEFAULT_SCHEME}:{target}"
+    elif "://" not in target:
+        target = f"{DEFAULT_SCHEME}://{target}"
+
+    try:
+        url = URL(target)
+        if not url.has_scheme() or not url.host:
+            raise ValidationError("URL is invalid")
+        canonical = str(url.site_root())
+    except ValueError as e:
+        raise ValidationError("URL is invalid") from e
+
+    validate_url(canonical)
+    return canonical
+
+
+def dedup_key(canonical_url: str) -> str:
+    """ Sites are deemed the same regardless of their scheme and of being
+    served from the www subdomain """
+    url = URL(canonical_url)
+    host = url.host
+    if host.startswith("www."):
+        host = host[4:]
+    if url.is_default_port():
+        return host
+    return f"{host}:{url.port}"
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf8"), digest_size=16).digest()
+
+
+class TargetDeduplicator:
+    """ Exact set of already seen keys. Keys are not kept, only the first 8
+    bytes of their digest as an int, which is plenty to tell apart billions
+    of keys. Along with the overhead of the set, that still costs some 60 to
+    90 bytes per key: large batches are better served by a `BloomFilter` """
+
+    def __init__(self):
+        self._seen = set()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def add(self, key: str) -> bool:
+        """ Returns whether the key had not been seen before """
+        digest = int.from_bytes(_digest(key)[:8], "little")
+        if digest in self._seen:
+            return False
+        self._seen.add(digest)
+        return True
+
+
+class BloomFilter:
+    """ Probabilistic set of already seen keys, sized after the expected
+    number of keys and the acceptable false positive rate. Memory is
+    allocated upfront and never grows: ~1.8 bytes per key at 0.1% errors.
+
+    A false positive makes an unseen key to be reported as seen, hence a
+    deduplication stage built on top may skip a few unique targets.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity < 1:
+            raise ValueError("capacity must be a positive number")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _positions(self, key: str) -> Iterator[int]:
+        # Kirsch-Mitzenmacher: k positions out of two independent hashes
+        digest = _digest(key)
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key: str) -> bool:
+        """ Returns whether the key had not been seen before """
+        bits = self._bits
+        is_new = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                is_new = True
+        if is_new:
+            self._count += 1
+        return is_new
+
+
+def unique_targets(
+    targets: Iterable[AnyStr],
+    seen: Optional[Union[TargetDeduplicator, BloomFilter]] = None,
+    on_invalid=None,
+) -> Iterator[str]:
+    """ Normalizes every target, yielding each site only the first time it
+    shows up. Invalid targets are dropped, optionally notifying ``on_invalid``
+    with the raw target and the validation error. """
+    if seen is None:
+        seen = TargetDeduplicator()
+    for target in targets:
+        try:
+            canonical = normalize_target(target)
+        except ValidationError as e:
+            if on_invalid is not None:
+                on_invalid(target, e)
+            continue
+        if seen.add(dedup_key(canonical)):
+            yield canonical
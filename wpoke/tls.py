@@ -0,0 +1,157 @@
+import ssl
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .conf import settings
+
+# TLS sessions kept around for resumption, most recently used last
+MAX_SESSIONS = 10000
+
+
+@dataclass
+class TLSStats:
+    handshakes: int = 0
+    resumed: int = 0
+    # Seconds from the first handshake step until completion, network
+    # round trips included
+    full_handshake_time: float = 0.0
+    resumed_handshake_time: float = 0.0
+
+    @property
+    def full_handshakes(self) -> int:
+        return self.handshakes - self.resumed
+
+    @property
+    def resumption_rate(self) -> float:
+        return self.resumed / self.handshakes if self.handshakes else 0.0
+
+    @property
+    def time_saved(self) -> float:
+        """ Estimated seconds resumed handshakes saved over full ones """
+        if not self.resumed or not self.full_handshakes:
+            return 0.0
+        full = self.full_handshake_time / self.full_handshakes
+        resumed = self.resumed_handshake_time / self.resumed
+        return max(0.0, (full - resumed) * self.resumed)
+
+
+class _ResumingSSLObject(ssl.SSLObject):
+    """ Records its handshake on the context it was created from, and hands
+    the negotiated session over to it for later connections to resume """
+
+    _handshake_started_at: Optional[float] = None
+    _session_saved = False
+
+    def do_handshake(self) -> None:
+        if self._handshake_started_at is None:
+            self._handshake_started_at = time.perf_counter()
+        # Raises SSLWantReadError until the peer answers
+        super().do_handshake()
+        self.context.handshake_done(self, self._handshake_started_at)
+        self._save_session()
+
+    def read(self, *args, **kwargs):
+        data = super().read(*args, **kwargs)
+        if not self._session_saved:
+            # TLS 1.3 tickets are only sent once the handshake is over
+            self._save_session()
+        return data
+
+    def _save_session(self) -> None:
+        session = self.session
+        if session is not None and session.has_ticket:
+            self.context.save_session(self.server_hostname, session)
+            self._session_saved = True
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """ Client context resuming TLS sessions negotiated with a host before,
+    so that reconnecting to it skips the full handshake. Sessions are kept
+    by server name, up to `max_sessions` of them.
+
+    asyncio offers no way of handing a session over to a connection, thus
+    the context does it itself whenever a connection wraps a socket.
+    """
+
+    sslobject_class = _ResumingSSLObject
+
+    def __init__(self, protocol: int = ssl.PROTOCOL_TLS_CLIENT):
+        # The protocol is taken by `SSLContext.__new__`
+        self.max_sessions = MAX_SESSIONS
+        self.stats = TLSStats()
+        self._sessions: "OrderedDict[str, ssl.SSLSession]" = OrderedDict()
+
+    def wrap_bio(
+        self, incoming, outgoing, server_side=False, server_hostname=None, session=None
+    ):
+        if session is None and server_hostname and not server_side:
+            session = self._sessions.get(server_hostname)
+        return super().wrap_bio(
+            incoming,
+            outgoing,
+            server_side=server_side,
+            server_hostname=server_hostname,
+            session=session,
+        )
+
+    def save_session(self, server_hostname: Optional[str], session) -> None:
+        if not server_hostname:
+            return
+        self._sessions[server_hostname] = session
+        self._sessions.move_to_end(server_hostname)
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def handshake_done(self, sslobj: ssl.SSLObject, started_at: float) -> None:
+        elapsed = time.perf_counter() - started_at
+        self.stats.handshakes += 1
+        if sslobj.session_reused:
+            self.stats.resumed += 1
+            self.stats.resumed_handshake_time += elapsed
+        else:
+            self.stats.full_handshake_time += elapsed
+
+
+def make_ssl_context(verify: bool = True, cafile: Optional[str] = None):
+    """ Client context tuned for scanning: TLS 1.2 at least, no compression,
+    HTTP/1.1 through ALPN and session resumption. Certificates and host names
+    are only checked when `verify` is set """
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.options |= ssl.OP_NO_COMPRESSION
+    context.set_alpn_protocols(["http/1.1"])
+    if cafile:
+        context.load_verify_locations(cafile)
+    elif verify:
+        context.load_default_certs()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_contexts: Dict[bool, ResumingSSLContext] = {}
+
+
+def get_ssl_context(verify: Optional[bool] = None) -> ResumingSSLContext:
+    """ Contexts are created on first use and live as long as the process
+    does, shared by every scan. `verify` defaults to `settings.ssl_enabled` """
+    if verify is None:
+        verify = settings.ssl_enabled
+    context = _contexts.get(verify)
+    if context is None:
+        context = _contexts[verify] = make_ssl_context(verify)
+    return context
+
+
+def tls_stats() -> TLSStats:
+    """ Handshakes done so far by every context of this process """
+    stats = TLSStats()
+    for context in _contexts.values():
+        stats.handshakes += context.stats.handshakes
+        stats.resumed += context.stats.resumed
+        stats.full_handshake_time += context.stats.full_handshake_time
+        stats.resumed_handshake_time += context.stats.resumed_handshake_time
+    return stats
@@ -0,0 +1,278 @@
+""" Trace of a whole run in the Chrome Trace Event format, to be opened
+with Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+
+Every scan is drawn on a lane of its own, reused once the scan is over,
+so that lanes show how many scans were in flight at any time. Within a
+lane, spans cover `Hand.poke`, the run of every finger and the stages of
+`wpoke.profiling`. Requests may overlap within a scan, hence they are
+async spans, drawn on tracks of their own.
+
+Events are buffered and handed over in batches to a thread encoding and
+writing them. With tracing off, which is the default, every entry point
+returns a shared no-op span.
+"""
+import contextvars as ctxv
+import heapq
+import itertools
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# Events buffered before being handed over to the writer thread
+TRACE_BUFFER_SIZE = 4096
+
+_lane: ctxv.ContextVar = ctxv.ContextVar("trace_lane", default=0)
+
+
+class TraceSink:
+    """ Writes trace events to `path`, one per line. Fragments are bare
+    event lines, meant to be merged into a trace by `merge_traces` """
+
+    def __init__(
+        self,
+        path: str,
+        buffer_size: int = TRACE_BUFFER_SIZE,
+        fragment: bool = False,
+        process_name: str = "wpoke",
+    ):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.fragment = fragment
+        self.pid = os.getpid()
+        self.events = 0
+        self._started_at = time.perf_counter()
+        self._buffer: List[Dict[str, Any]] = []
+        self._batches: queue.SimpleQueue = queue.SimpleQueue()
+        self._ids = itertools.count(1)
+        self._free_lanes: List[int] = []
+        self._lanes = 0
+        self._fd = open(path, "w", encoding="utf8")
+        if not fragment:
+            self._fd.write("[\n")
+        self._writer = threading.Thread(
+            target=self._write, name="wpoke-trace", daemon=True
+        )
+        self._writer.start()
+        self.emit(self._metadata("process_name", 0, process_name))
+        self.emit(self._metadata("thread_name", 0, "main"))
+
+    def now(self) -> float:
+        """ Microseconds since the sink was created """
+        return (time.perf_counter() - self._started_at) * 1e6
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def _metadata(self, name: str, tid: int, value: str) -> Dict[str, Any]:
+        return {
+            "name": name,
+            "ph": "M",
+            "pid": self.pid,
+            "tid": tid,
+            "args": {"name": value},
+        }
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        buffer = self._buffer
+        buffer.append(event)
+        if len(buffer) >= self.buffer_size:
+            self._buffer = []
+            self._batches.put(buffer)
+
+    def _write(self) -> None:
+        encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+        while True:
+            events = self._batches.get()
+            if events is None:
+                return
+            self._fd.write("".join(encode(event) + ",\n" for event in events))
+            self.events += len(events)
+
+    def acquire_lane(self) -> int:
+        if self._free_lanes:
+            return heapq.heappop(self._free_lanes)
+        self._lanes += 1
+        self.emit(self._metadata("thread_name", self._lanes, f"scan {self._lanes}"))
+        return self._lanes
+
+    def release_lane(self, lane: int) -> None:
+        heapq.heappush(self._free_lanes, lane)
+
+    def close(self) -> None:
+        self._batches.put(self._buffer)
+        self._buffer = []
+        self._batches.put(None)
+        self._writer.join()
+        if not self.fragment:
+            # Closes the array. Trailing commas are fine for trace viewers,
+            # but not for JSON parsers
+            self._fd.write(json.dumps(self._metadata("thread_name", 0, "main")))
+            self._fd.write("\n]\n")
+        self._fd.close()
+
+
+_sink: Optional[TraceSink] = None
+
+
+def is_tracing() -> bool:
+    return _sink is not None
+
+
+def start_tracing(path: str, **kwargs) -> TraceSink:
+    global _sink
+    if _sink is not None:
+        _sink.close()
+    _sink = TraceSink(path, **kwargs)
+    return _sink
+
+
+def stop_tracing() -> None:
+    global _sink
+    sink, _sink = _sink, None
+    if sink is not None:
+        sink.close()
+
+
+def fragment_path(path: str, index: int) -> str:
+    """ Where worker `index` of a sharded scan writes its part of `path` """
+    return f"{path}.{index}"
+
+
+def merge_traces(path: str, fragments: Iterable[str]) -> None:
+    """ Appends the fragments, deleting them, to the trace at `path` """
+    with open(path, "r+", encoding="utf8") as fd:
+        fd.seek(0, os.SEEK_END)
+        # Right before the closing event and bracket of the trace
+        end = fd.tell()
+        fd.seek(max(0, end - 4096))
+        tail = fd.read()
+        closing_at = tail.rindex("\n{") + 1
+        closing = tail[closing_at:]
+        fd.seek(end - len(closing.encode("utf8")))
+        fd.truncate()
+        for fragment in fragments:
+            if not os.path.exists(fragment):
+                continue
+            with open(fragment, encoding="utf8") as fragment_fd:
+                shutil.copyfileobj(fragment_fd, fd)
+            os.remove(fragment)
+        fd.write(closing)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """ Complete event on the lane of the ongoing scan """
+
+    __slots__ = ("sink", "name", "cat", "args", "lane", "started_at")
+
+    def __init__(self, sink: TraceSink, name: str, cat: str, args: Dict[str, Any]):
+        self.sink = sink
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.lane = _lane.get()
+        self.started_at = self.sink.now()
+        return self
+
+    def set(self, **args) -> None:
+        self.args.update(args)
+
+    def _finish(self, exc_type) -> float:
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        return self.sink.now()
+
+    def __exit__(self, exc_type, exc, tb):
+        finished_at = self._finish(exc_type)
+        self.sink.emit(
+            {
+                "name": self.name,
+                "cat": self.cat,
+                "ph": "X",
+                "ts": self.started_at,
+                "dur": finished_at - self.started_at,
+                "pid": self.sink.pid,
+                "tid": self.lane,
+                "args": self.args,
+            }
+        )
+        return False
+
+
+class AsyncSpan(Span):
+    """ Span which may overlap others of the same scan """
+
+    __slots__ = ()
+
+    def __exit__(self, exc_type, exc, tb):
+        finished_at = self._finish(exc_type)
+        event = {
+            "name": self.name,
+            "cat": self.cat,
+            "id": self.sink.next_id(),
+            "pid": self.sink.pid,
+            "tid": self.lane,
+        }
+        self.sink.emit(dict(event, ph="b", ts=self.started_at, args=self.args))
+        self.sink.emit(dict(event, ph="e", ts=finished_at))
+        return False
+
+
+class ScanSpan(Span):
+    """ Span of a whole scan, holding a lane for as long as it lasts """
+
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        lane = self.sink.acquire_lane()
+        self._token = _lane.set(lane)
+        super().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        self.sink.release_lane(self.lane)
+        _lane.reset(self._token)
+        return False
+
+
+def span(name: str, cat: str, **args):
+    sink = _sink
+    if sink is None:
+        return NULL_SPAN
+    return Span(sink, name, cat, args)
+
+
+def async_span(name: str, cat: str, **args):
+    sink = _sink
+    if sink is None:
+        return NULL_SPAN
+    return AsyncSpan(sink, name, cat, args)
+
+
+def scan_span(target: str):
+    sink = _sink
+    if sink is None:
+        return NULL_SPAN
+    return ScanSpan(sink, "poke", "scan", {"target": target})
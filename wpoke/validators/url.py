@@ -13,8 +13,7 @@ class URLValidator(object):
 
     # IP patterns
     ipv4_re = (
-        r"(?:25[0-5]|2[0-4]\d|[0-1]?\d?\d)(?:\.(?:25[0-5]|2[0-4]\d|["
-        r"0-1]?\d?\d)){3} "
+        r"(?:25[0-5]|2[0-4]\d|[0-1]?\d?\d)(?:\.(?:25[0-5]|2[0-4]\d|[0-1]?\d?\d)){3}"
     )
     ipv6_re = r"\[[0-9a-f:\.]+\]"  # (simple regex, validated later)
 
@@ -47,9 +46,13 @@ class URLValidator(object):
     )
 
     compiled_regex = re.compile(regex, re.IGNORECASE)
+    compiled_host_regex = re.compile(host_re, re.IGNORECASE)
 
     message = "Enter a valid URL."
     schemes = ["http", "https"]
+    # Longer values are rejected before any regex runs on them, which keeps
+    # the cost of hostile input bounded
+    max_length = 2048
 
     def __init__(self, allow_empty=False):
         self.allow_empty = allow_empty
@@ -63,9 +66,7 @@ class URLValidator(object):
         """ Check whether the payload is an ip address by negating that it is
             not an hostname.
         """
-        regex = re.compile(self.host_re, re.IGNORECASE)
-
-        return regex.match(payload) is None
+        return self.compiled_host_regex.match(payload) is None
 
     def is_same_origin(self, payload1, payload2, should_raise=False):
         self.is_not_empty(payload1)
@@ -81,6 +82,9 @@ class URLValidator(object):
         return True
 
     def get_host(self, value):
+        if len(value) > self.max_length:
+            raise ValidationError("URL is too long")
+
         matches = self.compiled_regex.match(value)
 
         if not matches:
@@ -94,7 +98,10 @@ class URLValidator(object):
         host_name = self.get_host(value)
 
         if self.is_ip_address(host_name):
-            address = ipaddress.ip_address(host_name)
+            try:
+                address = ipaddress.ip_address(host_name.strip("[]"))
+            except ValueError:
+                raise ValidationError("Invalid IP address")
 
             if not address.is_global:
                 raise ValidationError("Invalid IP address")
@@ -0,0 +1,322 @@
+import abc
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from .batch import journal_status, poke_many
+from .limiter import AdaptiveLimiter
+
+ITEM_PENDING = 0
+ITEM_LEASED = 1
+ITEM_DONE = 2
+# Leased too many times without being completed
+ITEM_DEAD = 3
+
+
+@dataclass
+class Lease:
+    """ A batch of targets handed over to a single worker until `expires_at`.
+    Its id fences completions: once a lease has expired and its targets
+    have been requeued, late completions of the former holder are void """
+
+    id: str
+    worker: str
+    expires_at: float
+    targets: List[str] = field(default_factory=list)
+
+
+class LeaseQueue(abc.ABC):
+    """ Queue of targets shared by every node of a scan. Workers lease
+    batches of targets for a visibility timeout, which they keep extending
+    with heartbeats while scanning. Targets of leases left to expire, e.g
+    because their worker died, are handed over to other workers.
+
+    Delivery is at least once: a worker stalled past its visibility timeout
+    may still be scanning targets which are already leased again. Its
+    results are then rejected, so that every target is completed once.
+    """
+
+    @abc.abstractmethod
+    def put(self, targets: Iterable[str]) -> int:
+        """ Enqueues targets not enqueued before. Returns how many were """
+
+    @abc.abstractmethod
+    def lease(self, worker: str, size: int, timeout: float) -> Optional[Lease]:
+        """ Leases up to `size` pending targets for `timeout` seconds. Returns
+        None when no target is pending """
+
+    @abc.abstractmethod
+    def heartbeat(self, lease: Lease, timeout: float) -> bool:
+        """ Extends the lease. Returns False when it has been lost """
+
+    @abc.abstractmethod
+    def complete(self, lease: Lease, target: str, status: str) -> bool:
+        """ Marks a leased target as done. Returns False when the lease has
+        been lost, in which case the target will be scanned again """
+
+    @abc.abstractmethod
+    def release(self, lease: Lease) -> None:
+        """ Gives back the targets of the lease which are not done yet """
+
+    @abc.abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """ Number of targets by state: pending, leased, done and dead """
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class SQLiteLeaseQueue(LeaseQueue):
+    """ Lease queue kept in a SQLite database, to be shared by workers of a
+    single host, or of many hosts through a shared volume whose file locks
+    are reliable. Every operation is a short transaction taking the database
+    write lock, hence leasing large batches keeps contention low.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, busy_timeout: float = 30):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                target TEXT NOT NULL UNIQUE,
+                state INTEGER NOT NULL DEFAULT 0,
+                lease_id TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT
+            );
+            CREATE INDEX IF NOT EXISTS items_state ON items (state, id);
+            CREATE INDEX IF NOT EXISTS items_lease ON items (lease_id);
+            CREATE TABLE IF NOT EXISTS leases (
+                id TEXT PRIMARY KEY,
+                worker TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            """
+        )
+
+    def _transaction(self):
+        return _Transaction(self._db, self._lock)
+
+    def put(self, targets: Iterable[str]) -> int:
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO items (target) VALUES (?)",
+                ((target,) for target in targets),
+            )
+            return db.total_changes - before
+
+    def _requeue_expired(self, db, now: float) -> None:
+        expired = "SELECT id FROM leases WHERE expires_at < ?"
+        db.execute(
+            f"UPDATE items SET state = CASE WHEN attempts >= ? THEN {ITEM_DEAD} "
+            f"ELSE {ITEM_PENDING} END, lease_id = NULL "
+            f"WHERE state = {ITEM_LEASED} AND lease_id IN ({expired})",
+            (self.max_attempts, now),
+        )
+        db.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+
+    def lease(self, worker: str, size: int, timeout: float) -> Optional[Lease]:
+        now = time.time()
+        with self._transaction() as db:
+            self._requeue_expired(db, now)
+            rows = db.execute(
+                f"SELECT id, target FROM items WHERE state = {ITEM_PENDING} "
+                "ORDER BY id LIMIT ?",
+                (size,),
+            ).fetchall()
+            if not rows:
+                return None
+            lease = Lease(
+                id=uuid.uuid4().hex,
+                worker=worker,
+                expires_at=now + timeout,
+                targets=[target for _, target in rows],
+            )
+            db.execute(
+                "INSERT INTO leases (id, worker, expires_at) VALUES (?, ?, ?)",
+                (lease.id, lease.worker, lease.expires_at),
+            )
+            db.executemany(
+                f"UPDATE items SET state = {ITEM_LEASED}, lease_id = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                ((lease.id, item_id) for item_id, _ in rows),
+            )
+            return lease
+
+    def heartbeat(self, lease: Lease, timeout: float) -> bool:
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE leases SET expires_at = ? WHERE id = ? AND expires_at >= ?",
+                (now + timeout, lease.id, now),
+            )
+            if cursor.rowcount:
+                lease.expires_at = now + timeout
+                return True
+            return False
+
+    def complete(self, lease: Lease, target: str, status: str) -> bool:
+        with self._transaction() as db:
+            # Items of an expired lease are untied from it once requeued
+            cursor = db.execute(
+                f"UPDATE items SET state = {ITEM_DONE}, lease_id = NULL, status = ? "
+                f"WHERE target = ? AND lease_id = ? AND state = {ITEM_LEASED}",
+                (status, target, lease.id),
+            )
+            return bool(cursor.rowcount)
+
+    def release(self, lease: Lease) -> None:
+        with self._transaction() as db:
+            db.execute(
+                f"UPDATE items SET state = {ITEM_PENDING}, lease_id = NULL, "
+                f"attempts = attempts - 1 WHERE lease_id = ? AND state = {ITEM_LEASED}",
+                (lease.id,),
+            )
+            db.execute("DELETE FROM leases WHERE id = ?", (lease.id,))
+
+    def counts(self) -> Dict[str, int]:
+        names = {
+            ITEM_PENDING: "pending",
+            ITEM_LEASED: "leased",
+            ITEM_DONE: "done",
+            ITEM_DEAD: "dead",
+        }
+        with self._transaction() as db:
+            self._requeue_expired(db, time.time())
+            rows = db.execute("SELECT state, COUNT(*) FROM items GROUP BY state")
+            counts = dict.fromkeys(names.values(), 0)
+            counts.update({names[state]: count for state, count in rows})
+            return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class _Transaction:
+    """ BEGIN IMMEDIATE takes the write lock upfront, so that concurrent
+    workers never read the same pending items before updating them """
+
+    def __init__(self, db: sqlite3.Connection, lock: threading.Lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+class LeaseWorker:
+    """ Scans targets leased from a queue, a batch at a time, until none is
+    pending and no other worker holds a lease which might expire. A limiter,
+    if any, carries its limit over from one batch to the next """
+
+    def __init__(
+        self,
+        hand,
+        work_queue: LeaseQueue,
+        batch_size: int = 100,
+        lease_timeout: float = 300,
+        concurrency: int = 10,
+        poll_interval: float = 5,
+        worker_id: Optional[str] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        self.hand = hand
+        self.queue = work_queue
+        self.batch_size = batch_size
+        self.lease_timeout = lease_timeout
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.limiter = limiter
+
+    async def _call(self, func, *args):
+        # Queue operations may wait for the lock of other nodes
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def _heartbeat(self, lease: Lease, scan: asyncio.Future) -> None:
+        while True:
+            await asyncio.sleep(self.lease_timeout / 3)
+            if not await self._call(self.queue.heartbeat, lease, self.lease_timeout):
+                # Targets of the lease are being handed over to other workers
+                scan.cancel()
+                return
+
+    async def _scan(self, lease: Lease, results: asyncio.Queue) -> None:
+        results_iter = poke_many(
+            self.hand, lease.targets, self.concurrency, limiter=self.limiter
+        )
+        async for result in results_iter:
+            status = journal_status(result)
+            if await self._call(self.queue.complete, lease, result.target, status):
+                await results.put(result)
+
+    async def run(self) -> AsyncIterator:
+        """ Yields the result of every target this worker completes """
+        while True:
+            lease = await self._call(
+                self.queue.lease, self.worker_id, self.batch_size, self.lease_timeout
+            )
+            if lease is None:
+                counts = await self._call(self.queue.counts)
+                if not counts["leased"]:
+                    return
+                # Leases held by other workers may still expire
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            results = asyncio.Queue()
+            scan = asyncio.ensure_future(self._scan(lease, results))
+            heartbeat = asyncio.ensure_future(self._heartbeat(lease, scan))
+            getter = None
+            try:
+                while not scan.done() or not results.empty():
+                    getter = asyncio.ensure_future(results.get())
+                    await asyncio.wait(
+                        {getter, scan}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if getter.done():
+                        yield getter.result()
+                    else:
+                        getter.cancel()
+            finally:
+                for task in (getter, scan, heartbeat):
+                    if task is not None:
+                        task.cancel()
+                await asyncio.gather(scan, heartbeat, return_exceptions=True)
+                if scan.cancelled() or scan.exception() is None:
+                    await self._call(self.queue.release, lease)
+            if not scan.cancelled() and scan.exception() is not None:
+                # The lease is left to expire, so that the failure counts as
+                # an attempt and its targets eventually die
+                raise scan.exception()